@@ -10,22 +10,44 @@
 
 
 from pymodbus.client import ModbusTcpClient
-from pymodbus.payload import BinaryPayloadDecoder
-from pymodbus.payload import BinaryPayloadBuilder
-from pymodbus.constants import Endian
-import pymodbus
+
+from EC_worker import ChamberWorker
+from EC_registers import EC_HOST, EC_PORT
+from BB_transport import SerialLink, LINK_ERRORS, BB_HOST, BB_PORT
+from BB_telemetry import TelemetryLogger
+from BB_sweep import parse_temp
+from nested_sweep import NestedSweep
+from session_log import SessionRecorder, session_path
+from event_log import EventLog
 
 import customtkinter as ctk
-import serial
 import numpy as np
 import time
+import os
 
-import csv #csv stuff at line 727
 
 MAX_TEMP = 180
 MIN_TEMP = -45
 # declare and open a Modbus connection to the EC
-client = ModbusTcpClient("169.254.18.153", port=502, timeout=3)
+client = ModbusTcpClient(EC_HOST, port=EC_PORT, timeout=3)
+# step timing log, written in batches by a background thread
+# EVENT_LOG overrides where it goes
+EVENT_LOG_PATH = os.environ.get("EVENT_LOG", '/home/dirspi/Desktop/times.csv')
+event_log = EventLog(EVENT_LOG_PATH)
+# one session file per run holds chamber snapshots, BB readings and step events on one clock
+recorder = SessionRecorder(session_path())
+# all chamber I/O runs on this thread, the GUI only queues commands and drains snapshots
+worker = ChamberWorker(client, on_snapshot = recorder.chamber)
+# one serial link to the blackbody, opened when a sweep starts and kept until it ends
+# commands fail at once instead of retrying, the GUI retries with after() so it never blocks
+bb_link = SerialLink(retries = 0)
+BB_RETRY = 10 #seconds before retrying after the blackbody link is lost
+# logs the BB temperature to a .bbt file next to the outfile while a sweep runs
+bb_logger = None
+TELEMETRY_RATE = 1 #Hz
+# chamber x blackbody sweep run from one timeline, see nested_sweep.py
+nested = None
+NESTED_REACH = 180 #minutes the chamber gets to reach a temperature before it is held for the settle time
 
 paused = False
 disconnected = False
@@ -145,26 +167,29 @@ def BB_compute():
 		bb_temps = np.append(bb_temps, 25)  # make sure the script leaves the BB at 25C
 		BB_lbl_entry_error.configure(text = f"Temperatures:\n{bb_temps}\nSweep will be done in reverse order, ending on 25C\nHold Time: {delay} minutes\nOutput File Name: {outfile}")
 		BB_btn_startSerial.grid()
+		BB_btn_nested.grid()
 	else:
 		BB_lbl_entry_error.configure(text = bb_error_msg)
     
 
 def BB_serial():
 	global bb_index, bb_temps, bb_start_time, bb_actual_temp, bb_finished, bb_running
-	# initialize a serial instance
-	ser = serial.Serial(
-			port='/dev/ttyS0', # Connect to port
-			baudrate = 115200,   # baud rate per the manual
-			parity=serial.PARITY_NONE,    # parity per the manual
-			stopbits=serial.STOPBITS_ONE, # stop bits per the manual
-			bytesize=serial.EIGHTBITS,    # byte size per the manual
-			timeout=1	
-	)
-	
+	try:
+		BB_serial_step()
+	except LINK_ERRORS as e:
+		#retry this step once the link may be back
+		print("Blackbody connection lost: " + str(e))
+		BB_lbl_dispStartSerial.configure(text = "No Blackbody Connection")
+		if(bb_running or bb_finished):
+			app.after(BB_RETRY * 1000, BB_serial)
+
+def BB_serial_step():
+	global bb_index, bb_temps, bb_start_time, bb_actual_temp, bb_finished, bb_running
 	if(bb_finished): #once cooldown period finished, turn off blackbody control
-		command = ("DOFF\n").encode('ascii')  # turn off blackbody control
-		ser.write(command)
-		ser.close()
+		bb_link.command("DOFF")  # turn off blackbody control
+		recorder.event("bb_sweep_end")
+		BB_stop_telemetry()
+		bb_link.close()
 		BB_lbl_dispStartSerial.configure(text = "Blackbody finished")
 		bb_finished = False #set flag false to confirm cooldown period is over
 		BB_btn_compute.grid()
@@ -176,6 +201,9 @@ def BB_serial():
 	if(bb_index == 1):
 		print("Starting Blackbody in serial mode...")
 		BB_lbl_dispStartSerial.configure(text = "Starting Blackbody in serial mode...")
+		bb_link.open()
+		recorder.event("bb_sweep_start")
+		BB_start_telemetry()
 		bb_start_time = time.ctime()
 		bb_running = True
 		BB_btn_compute.grid_remove() #hide buttons to prevent accidentally starting
@@ -184,10 +212,6 @@ def BB_serial():
 		print(bb_start_time)
 		bb_actual_temp = [] #initialize array for actual BB temps
 	if(bb_running):	
-		#check connection to controller
-		command = ("\n").encode('ascii')
-		print(ser.read_until(command))  # needs to say connected to acc controler
-
 		#for t in range(1, temps.shape[0] + 1):
 		# print(t)
 		# print(temps[-t])
@@ -195,22 +219,21 @@ def BB_serial():
 
 		# DAxx.x sets the absolute temperature
 		# ex: DA25.0 sets the abs. temp. to 25 C
-		command = ("DA" + format(bb_temps[bb_index - 1], '.1f') + "\n").encode('ascii')  # set temp
-		ser.write(command)
+		bb_link.command("DA" + format(bb_temps[bb_index - 1], '.1f'))  # set temp
+		recorder.event("bb_step", bb_temps[bb_index - 1])
+		event_log.log("bb_step", bb_index, format(bb_temps[bb_index - 1], '.1f'))
+		event_log.sync()
 		BB_lbl_dispStartSerial.configure(text = "BB setpoint: " + format(bb_temps[bb_index - 1], '.1f') + "C")
 
 		# hold this temperature for the given amount of minutes
 		#time.sleep(delay*60)  # delay for how ever long you want [s]
 
 		# M2 gets the absolute temperature from the BB
-		command = ("M2\n").encode('ascii')  # get temp
-		ser.write(command)
-
-		command = ("\n").encode('ascii')  # print temp
-		bb_t = ser.read_until(command)
+		bb_t = bb_link.command("M2", reply=True)  # get temp
 
 		print(bb_t)  # check that its reading temps
 		bb_actual_temp.append(bb_t)
+		recorder.blackbody(parse_temp(bb_t), bb_temps[bb_index - 1])
 		
 		#once finished running the other temperatures, set BB to 25C
 		if(bb_index == bb_temps.shape[0]):
@@ -231,7 +254,6 @@ def BB_serial():
 		else:
 			bb_index += 1
 			app.after(delay * 1000 * 60, BB_serial)
-			ser.close()
 
 def BB_ethernet():
 	global bb_index, bb_temps
@@ -240,8 +262,8 @@ def BB_ethernet():
 		BB_lbl_dispStartEthernet.configure(text = "Starting Blackbody in ethernet mode...")
 
 	# host = '192.168.200.161'  # default static IP of BB
-	host = '169.254.18.151'  # ip of bb should not change
-	port = '7788'  # what the manual said to use
+	host = BB_HOST  # ip of bb should not change
+	port = BB_PORT  # what the manual said to use
 
 	print("Creating Telnet instance")
 	tn = telnetlib.Telnet()
@@ -288,35 +310,104 @@ def BB_ethernet():
 	file.close()
 	tn.close()
 
+#log the BB temperature in the background for the length of the sweep
+def BB_start_telemetry():
+	global bb_logger
+	BB_stop_telemetry()
+	bb_logger = TelemetryLogger(bb_link, os.path.splitext(outfile)[0] + ".bbt", rate = TELEMETRY_RATE,
+		set_point = lambda: bb_temps[bb_index - 1] if bb_running else None, recorder = recorder)
+	bb_logger.start()
+
+def BB_stop_telemetry():
+	global bb_logger
+	if(bb_logger is not None):
+		bb_logger.stop()
+		bb_logger.join()
+		bb_logger = None
+
 def BB_stop():
 	global bb_running, bb_index, bb_finished
 	bb_running = False
 	bb_index = 1
-	ser = serial.Serial(
-			port='/dev/ttyS0', # Connect to port
-			baudrate = 115200,   # baud rate per the manual
-			parity=serial.PARITY_NONE,    # parity per the manual
-			stopbits=serial.STOPBITS_ONE, # stop bits per the manual
-			bytesize=serial.EIGHTBITS,    # byte size per the manual
-			timeout=1	
-	)
 	print("stopping blackbody")
 	# DAxx.x sets the absolute temperature
 	# ex: DA25.0 sets the abs. temp. to 25 C
-	command = ("DA" + format(25, '.1f') + "\n").encode('ascii')  # set temp
-	ser.write(command)
-	
-	command = ("DOFF\n").encode('ascii')  # turn off blackbody control
-	ser.write(command)
+	try:
+		bb_link.command("DA" + format(25, '.1f'))  # set temp
+		bb_link.command("DOFF")  # turn off blackbody control
+	except LINK_ERRORS as e:
+		print("Blackbody connection lost: " + str(e))
 		
 	bb_finished = True
+	recorder.event("bb_sweep_end")
 	BB_lbl_dispStartSerial.configure(text = "Blackbody sweep stopped")
 	BB_btn_compute.grid()
 	BB_btn_startSerial.grid_remove()
 	BB_btn_stop.grid_remove()
-	ser.close()
+	BB_stop_telemetry()
+	bb_link.close()
 	
 	
+#run the blackbody sweep at every temperature of the custom program entries
+#each chamber temperature is held until it has been stable for the hold time, then the whole sweep runs
+def nested_button():
+	global nested
+	chamber = ECCustomStep(EC_ent_begin.get(), EC_ent_end.get(), EC_ent_ramp.get(), EC_ent_time.get())
+	if(chamber.validate_EC_inputs()):
+		return
+	try:
+		bb_link.open()
+		#the nested sweep leaves the blackbody at 25C itself
+		nested = NestedSweep(worker, bb_link, chamber.temps, bb_temps[1:-1], delay, outfile, settle = chamber.time,
+			max_settle = chamber.time + NESTED_REACH, recorder = recorder, event_log = event_log)
+		nested.start()
+	except LINK_ERRORS as e:
+		print("Blackbody connection lost: " + str(e))
+		BB_lbl_dispStartSerial.configure(text = "No Blackbody Connection")
+		return
+	BB_btn_nested.configure(text = "Stop Nested Sweep", command = nested_stop_button)
+	#hide buttons to prevent starting anything else
+	BB_btn_compute.grid_remove()
+	BB_btn_startSerial.grid_remove()
+	EC_btn_custom.grid_remove()
+	EC_btn_start_pause.grid_remove()
+	EC_btn_read_file.grid_remove()
+	nested_tick()
+
+def nested_tick():
+	if(nested is None):
+		return
+	try:
+		wait = nested.tick()
+	except LINK_ERRORS as e:
+		#retry the tick once the link may be back
+		print("Blackbody connection lost: " + str(e))
+		BB_lbl_dispStartSerial.configure(text = "No Blackbody Connection")
+		app.after(BB_RETRY * 1000, nested_tick)
+		return
+	BB_lbl_dispStartSerial.configure(text = nested.status())
+	if(wait is None):
+		nested_finished()
+		return
+	app.after(int(wait * 1000), nested_tick)
+
+def nested_stop_button():
+	print("stopping nested sweep")
+	nested.stop()
+	nested_finished()
+
+def nested_finished():
+	global nested
+	BB_lbl_dispStartSerial.configure(text = nested.status())
+	nested = None
+	bb_link.close()
+	BB_btn_nested.configure(text = "Start Nested Sweep", command = nested_button)
+	BB_btn_nested.grid_remove()
+	BB_btn_compute.grid()
+	EC_btn_custom.grid()
+	EC_btn_start_pause.grid()
+	EC_btn_read_file.grid()
+
 #class for EC steps
 class ECCustomStep:
 	def __init__(self, begin_val=23, end_val=25, rate_val = 1, time_val = 1):
@@ -406,42 +497,32 @@ class ECCustomStep:
 	#sets the temperature to the first step
 	def start(self):
 		self.step = 0
+		recorder.event("chamber_program_start")
 		set_temp(self.temps[self.step])
+		recorder.event("chamber_step", self.temps[self.step])
+		event_log.log("chamber_step", self.step, self.temps[self.step])
+		event_log.sync()
 		self.step += 1
 		self.running = True
 		
-		#store time of day
-		read = client.read_holding_registers(address = 14660 ,count = 2)
-		
-		read1 = read.registers[0]
-		read2 = read.registers[1]
-		bin1 = format(read1, '016b')
-		bin2 = bin(read2)
-		str1 = str(bin1)
-		str2 = str(bin2)
-		str_bin = "0"+ str2.replace("0b","") + str1.replace("0b","")
-		self.current_time = int(str_bin, 2)
+		#time of day is filled in from the first snapshot after the write
+		self.current_time = None
         
 
 	def next_step(self):
 		if(self.step == (len(self.temps))):
 			self.running = False
+			recorder.event("chamber_program_end")
 			return True
 		#go to next temperature. If final step, return true
 		set_temp(self.temps[self.step])
+		recorder.event("chamber_step", self.temps[self.step])
+		event_log.log("chamber_step", self.step, self.temps[self.step])
+		event_log.sync()
 		self.step += 1
 		
-		#store time of day
-		read = client.read_holding_registers(address = 14660 ,count = 2)
-		
-		read1 = read.registers[0]
-		read2 = read.registers[1]
-		bin1 = format(read1, '016b')
-		bin2 = bin(read2)
-		str1 = str(bin1)
-		str2 = str(bin2)
-		str_bin = "0"+ str2.replace("0b","") + str1.replace("0b","")
-		self.current_time = int(str_bin, 2)
+		#time of day is filled in from the first snapshot after the write
+		self.current_time = None
 		
 		
 		
@@ -456,13 +537,13 @@ def pause_button():
 		paused = False
 		EC_btn_start_pause.configure(text = "Pause Profile")
 		EC_lbl_entry_error.configure(text = "Running Profile: " + cb_profile_select.get())
-		client.write_registers(16564, 147)
+		worker.resume_profile()
 	else:
 		print("Pausing")
 		paused = True
 		EC_btn_start_pause.configure(text = "Resume Profile")
 		EC_lbl_entry_error.configure(text = "Profile Paused")
-		client.write_registers(16566, 146)
+		worker.pause_profile()
     
 #start program with selected profile
 def start_button():
@@ -481,8 +562,7 @@ def start_button():
 	
 	print(str(EC_cb_profile_select.get()))
 	EC_cb_profile_select.configure(state = "disabled")
-	client.write_registers(16558, int(EC_cb_profile_select.get())) #Load profile number
-	client.write_registers(16562, 1782) #Start process controller
+	worker.start_profile(EC_cb_profile_select.get()) #Load profile number and start
 	
 	#label for telling user the program is running
 	EC_lbl_entry_error.configure(text = "Running Profile: " + cb_profile_select.get())
@@ -502,12 +582,9 @@ def term_button():
 	EC_cb_profile_select.grid()
 	
 	EC_cb_profile_select.configure(state = "normal")
-	client.write_registers(16566, 148)
-	
-	time.sleep(1) #delay to allow termination to finish
+	worker.terminate_profile(25) #terminates, waits, then sets chamber to 25 C
 	
 	EC_lbl_entry_error.configure(text = "Profile Terminated")
-	set_temp(25)
 	
 def custom_button():
 	global custom
@@ -558,17 +635,9 @@ def pause_custom_button():
 		paused = False
 		EC_btn_custom.configure(text = "Pause Custom Program")
 		
-		read = client.read_holding_registers(address = 14660 ,count = 2)
-		
-		#gets full 32 bits from register
-		read1 = read.registers[0]
-		read2 = read.registers[1]
-		bin1 = format(read1, '016b')
-		bin2 = bin(read2)
-		str1 = str(bin1)
-		str2 = str(bin2)
-		str_bin = "0"+ str2.replace("0b","") + str1.replace("0b","")
-		custom.current_time = int(str_bin ,2)
+		#with no chamber reading yet the step restarts from the next one
+		snap = worker.latest
+		custom.current_time = snap.time_of_day if snap is not None else None
 		
 	else:
 		print("Pausing")
@@ -578,19 +647,14 @@ def pause_custom_button():
 		EC_btn_edit_custom.grid()
 		
 		#calculate new remaining time
-		read = client.read_holding_registers(address = 14660 ,count = 2)
-		
-		#gets full 32 bits from register
-		read1 = read.registers[0]
-		read2 = read.registers[1]
-		bin1 = format(read1, '016b')
-		bin2 = format(read2, '016b')
-		str1 = str(bin1)
-		str2 = str(bin2)
-		str_bin = "0"+ str2.replace("0b","") + str1.replace("0b","")
-		#print("str_bin")
-		#print(str_bin)
-		current_time = int(str_bin , 2)
+		snap = worker.latest
+		if(snap is None):
+			#no chamber reading yet or the connection was lost, keep the remaining time
+			return
+		current_time = snap.time_of_day
+		if(custom.current_time is None):
+			#paused before the first snapshot of the step arrived
+			custom.current_time = current_time
 		
 		#print(custom.current_time)
 		
@@ -609,6 +673,7 @@ def terminate_custom_button():
 	#end the custom program
 	custom.step = 0
 	custom.running = False
+	recorder.event("chamber_program_end")
 	EC_btn_custom.configure(text = "Create Custom Program", command = custom_button)
 	for ent in EC_ents_custom:
 		ent.configure(state = "normal")
@@ -640,98 +705,50 @@ def file_button():
 
 def update():
 	global disconnected
-	try:
-		#attempt to reconnect if chamber disconnected
-		if(disconnected):
+	#check for new chamber data every 100 ms
+	EC_lbl_temp.after(100, update)
+	
+	snap = None
+	for kind, payload in worker.drain():
+		if(kind == "snapshot"):
+			snap = payload
+		elif(kind == "connected"):
+			if(disconnected):
+				print("Chamber Reconnected!")
+			disconnected = False
+			EC_lbl_entry_error.configure(text = "Chamber Ready")
+		elif(kind == "disconnected"):
+			disconnected = True
+			snap = None
 			EC_lbl_entry_error.configure(text = "No Chamber Connection")
-			client.connect()
-			if client.is_socket_open():
-				disconnected = False
-				print("Chamber Reconnected!")		
-				EC_lbl_entry_error.configure(text = "Chamber Ready")
-
-		
-		#repeat after a half-second
-		EC_lbl_temp.after(500, update)
-		
-		#update temp label
-		read = client.read_holding_registers(address = 16664 ,count = 4)
-		decoder = BinaryPayloadDecoder.fromRegisters(read.registers, Endian.Big, wordorder=Endian.Little)
-		current_temp = decoder.decode_32bit_float()
-		
-		decoder.reset()
-		read = client.read_holding_registers(address = 2782, count = 4)
-		decoder = BinaryPayloadDecoder.fromRegisters(read.registers, Endian.Big, wordorder=Endian.Little)
-
-		set_point_temp = decoder.decode_32bit_float()
-		EC_lbl_temp.configure(text = "Current Temperature: " + "{:.1f}".format(current_temp) + " C\nSet Point: " + "{:.1f}".format(set_point_temp) + " C")
-		
-		#update humidity label
-		decoder.reset()
-		read = client.read_holding_registers(address = 16666 ,count = 4)
-		decoder = BinaryPayloadDecoder.fromRegisters(read.registers, Endian.Big, wordorder=Endian.Little)
-		current_humidity = decoder.decode_32bit_float()
-		EC_lbl_hum.configure(text = "Current Humidity: " + "{:.1f}".format(current_humidity) + "%")
-
-		#update time
-		update_time()
-	except pymodbus.exceptions.ModbusException as e:
-		EC_lbl_entry_error.configure(text = "No Chamber Connection")
-		print("No Chamber Connection")
-		disconnected = True
-	except  AttributeError:
-		EC_lbl_entry_error.configure(text = "No Chamber Connection")
-		print("No Chamber Connection")
-		disconnected = True
+		elif(kind == "error"):
+			print("Chamber command failed: " + payload)
+	if(snap is None):
+		return
 	
-	#heartbeat print
+	#update temp label
+	EC_lbl_temp.configure(text = "Current Temperature: " + "{:.1f}".format(snap.temperature) + " C\nSet Point: " + "{:.1f}".format(snap.set_point) + " C")
+	
+	#update humidity label
+	EC_lbl_hum.configure(text = "Current Humidity: " + "{:.1f}".format(snap.humidity) + "%")
+
+	#update time
+	update_time(snap)
 
 def set_temp(temp):
-	#create builder, add float to buffer, build, and then write to register
-	builder = BinaryPayloadBuilder(wordorder=Endian.Little, byteorder=Endian.Big)
-	builder.add_32bit_float(np.float32(temp))
-	val_float= builder.build()
-	client.write_registers(2782, val_float, skip_encode = True)
+	#queue the write, the worker thread builds the float and sends it
+	worker.set_temp(temp)
 	
-def update_time():
+def update_time(snap):
 	global remaining_time_total, remaining_time
-	#get hour, minute and second
-	read = client.read_holding_registers(address = 14664 ,count = 1)
-	hour = read.registers[0]
-	if(hour < 10):
-		time_str = "0" + str(hour)
-	else:
-		time_str = str(hour)
-		
-	read = client.read_holding_registers(address = 14666 ,count = 1)
-	minute = read.registers[0]
-	if(minute < 10):
-		time_str += ":0" + str(minute)
-	else:
-		time_str += ":" + str(minute)
-
-	read = client.read_holding_registers(address = 14668 ,count = 1)
-	second = read.registers[0]
-	if(second < 10):
-		time_str += ":0" + str(second)
-	else:
-		time_str += ":" + str(second)
-	#print(time_str)
-	EC_lbl_time.configure(text = time_str)
+	#show chamber clock
+	EC_lbl_time.configure(text = snap.time_str)
 	
 	#check if it is time to go to next step
-	read = client.read_holding_registers(address = 14660 ,count = 2)
-	#gets full 32 bits from register
-	read1 = read.registers[0]
-	read2 = read.registers[1]
-	bin1 = format(read1, '016b')
-	bin2 = bin(read2)
-	str1 = str(bin1)
-	str2 = str(bin2)
-	str_bin = "0"+ str2.replace("0b","") + str1.replace("0b","")
-	#print(custom.current_time)
-	
-	current_time = int(str_bin , 2)
+	current_time = snap.time_of_day
+	if(custom.running and custom.current_time is None):
+		#first snapshot since the step began
+		custom.current_time = current_time
 	if(custom.running and not paused):
 		#print remaining time of step and step number to entry label
 		if(current_time < custom.current_time):
@@ -775,11 +792,7 @@ def update_time():
 					EC_ent_file.grid()
 					set_temp(25)
 		
-		with open('/home/dirspi/Desktop/times.csv', 'a', newline='') as file:
-			writer = csv.writer(file)
-			t = time.localtime()
-			current_time_check = time.strftime("%H:%M:%S", t)
-			writer.writerow([current_time_check, custom.current_time, current_time, elapsed_time, remaining_time, str(custom.step)])
+		event_log.log("chamber_tick", custom.current_time, current_time, elapsed_time, remaining_time, str(custom.step))
 			
 			
 			
@@ -889,6 +902,12 @@ BB_btn_startSerial = ctk.CTkButton(
 	command=BB_serial # run this subroutine when button is pressed
 )
 
+BB_btn_nested = ctk.CTkButton(
+	master=app,
+	text="Start Nested Sweep",
+	command=nested_button # run this subroutine when button is pressed
+)
+
 BB_btn_stop = ctk.CTkButton(
 	master=app,
 	text="Stop",
@@ -898,14 +917,11 @@ BB_btn_stop = ctk.CTkButton(
 #start point of program
 if __name__ == "__main__":
 	print("Running main")
+	recorder.open()
+	print("Recording session to " + recorder.path)
+	event_log.start()
 	print("Connecting to chamber...")
-	try:
-		client.connect()		
-		print("Connected!")
-	except pymodbus.exceptions.ModbusException as e:
-		print("Connection Failed")
-		lbl_entry_error.configure(text = "No Connection to Chamber")
-		disconnected = True
+	worker.start()
 	
 	ctk.set_appearance_mode("dark")
 	ctk.set_default_color_theme("blue")
@@ -986,10 +1002,12 @@ if __name__ == "__main__":
 	BB_btn_compute.grid(row=9, column=1, padx=10, pady=10)
 	BB_lbl_dispSweep.grid(row=10, column=2, columnspan=3, padx=10, pady=10)
 	BB_btn_startSerial.grid(row=10, column=0, columnspan=2, padx=10, pady=10)
+	BB_btn_nested.grid(row=11, column=0, columnspan=2, padx=10, pady=10)
 	BB_btn_stop.grid(row=12, column=0, columnspan=2, padx=10, pady=10)
 	BB_lbl_dispStartSerial.grid(row=12, columnspan=5, padx=10, pady=10)
 	
 	BB_btn_startSerial.grid_remove()
+	BB_btn_nested.grid_remove()
 	BB_btn_stop.grid_remove()
 	bb_index = 1
 	#begin running update
@@ -997,3 +1015,5 @@ if __name__ == "__main__":
 	
 	#open window
 	app.mainloop()
+	recorder.close()
+	event_log.close()
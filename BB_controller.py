@@ -9,11 +9,15 @@
 # Authors: Austin Martinez, Lucy Falcon
 
 import getopt, sys, os, re  # for command line and file IO
-import telnetlib            # for ethernet connection
-import serial               # for serial connection
 import numpy as np          # for array manipulation
 import tkinter as tk        # for the gui
-import time                 # for the delay
+
+from BB_sweep import BlackbodySweep  # for running the sweep
+from BB_transport import make_link, LINK_ERRORS   # for serial or ethernet connection
+from BB_telemetry import TelemetryLogger  # for high-rate temperature logging
+from session_log import SessionRecorder   # for the session file
+from event_log import EventLog            # for the step event log
+from stability import Dwell, SensorTail   # for the adaptive hold
 
 global startTemp
 global endTemp
@@ -21,6 +25,17 @@ global step
 global delay
 global outfile
 global temps
+global poll
+global telemetry
+
+# default number of seconds between blackbody readings during a hold
+POLL_INTERVAL = 10
+# seconds before the gui retries after the blackbody link is lost
+RETRY = 10
+# defaults of the adaptive hold
+WINDOW = 60      # seconds the BB must stay in the band
+KEEP = 2         # minutes held once settled
+FLATNESS = 3.0   # largest variance ratio of the radiometer channels
 
 
 def main():
@@ -30,17 +45,27 @@ def main():
     global delay
     global outfile
     global temps
+    global poll
+    global telemetry
     startTemp = -1000
     endTemp = -1000
     step = -1000
     delay = -1000
     outfile = ""
     temps = []
+    poll = POLL_INTERVAL
+    telemetry = 0
+    tolerance = None
+    window = WINDOW
+    keep = KEEP
+    radiometer = None
+    flatness = FLATNESS
 
    # get user input from input arguments
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hgb:e:s:d:o:m:",
-                                   ["help",  "gui", "begin=", "end=", "step=", "delay=", "outfile=", "mode="])
+        opts, args = getopt.getopt(sys.argv[1:], "hgb:e:s:d:o:m:p:t:a:n:k:r:F:",
+                                   ["help",  "gui", "begin=", "end=", "step=", "delay=", "outfile=", "mode=", "poll=", "telemetry=",
+                                    "adaptive=", "window=", "keep=", "radiometer=", "flatness="])
     except getopt.GetoptError as err:
         # print help information and exit:
         print(err)  # will print something like "option -a not recognized"
@@ -62,6 +87,20 @@ def main():
             outfile = a
         elif o in ("-m", "--mode"):
             mode = a            
+        elif o in ("-p", "--poll"):
+            poll = float(a)
+        elif o in ("-t", "--telemetry"):
+            telemetry = float(a)
+        elif o in ("-a", "--adaptive"):
+            tolerance = float(a)
+        elif o in ("-n", "--window"):
+            window = float(a)
+        elif o in ("-k", "--keep"):
+            keep = float(a)
+        elif o in ("-r", "--radiometer"):
+            radiometer = a
+        elif o in ("-F", "--flatness"):
+            flatness = float(a)
         else:
             assert False, "unhandled option"
             
@@ -80,7 +119,24 @@ def main():
     # confirm temperatures, steps, and delay with user
     print("Temperature values based on your input are:")
     print(temps)
-    print("Holding each temperature for " + str(delay) + " minutes.")
+    dwell = None
+    if tolerance is not None:
+        if tolerance <= 0 or window <= 0 or keep * 60 + window > delay * 60:
+            print("ERROR: Adaptive hold needs a positive tolerance and window, and a delay of at least the window plus the keep time")
+            sys.exit(1)
+        dwell = Dwell(tolerance, window, delay * 60, keep * 60, flatness if radiometer else None,
+                      SensorTail(radiometer) if radiometer else None)
+        # enough readings to tell when the BB is in the band
+        poll = min(poll, window / 5)
+        print("Holding each temperature until it stays within " + str(tolerance) + " C for " + str(window) +
+              " seconds, then " + str(keep) + " minutes more, at most " + str(delay) + " minutes.")
+        if radiometer:
+            print("Also waiting for the radiometer channels in " + radiometer + " to flatten.")
+    else:
+        print("Holding each temperature for " + str(delay) + " minutes.")
+    print("Reading the blackbody temperature every " + str(poll) + " seconds.")
+    if telemetry > 0:
+        print("Logging the blackbody temperature at " + str(telemetry) + " Hz to " + telemetry_file(outfile))
     print("Sweep will be done in reverse order, ending on 25 C.")
 
     user_input = input('Do you accept these values? (y/n): ')
@@ -98,13 +154,11 @@ def main():
     
     # check mode and initiate respective subroutine
     if mode.lower() == 'serial':
-        BB_serial(temps=temps, delay=delay, outfile=outfile)
+        BB_serial(temps=temps, delay=delay, outfile=outfile, poll=poll, telemetry=telemetry, dwell=dwell)
     if mode.lower() == 'ethernet':
-        BB_ethernet(temps=temps, delay=delay, outfile=outfile)
+        BB_ethernet(temps=temps, delay=delay, outfile=outfile, poll=poll, telemetry=telemetry, dwell=dwell)
     
 
-# TODO: maybe format outfile to be CSV
-
 # subroutine to validate the inputs given by the user
 def validate_inputs( begin, end, step, delay, outfile, mode ) :
 
@@ -128,6 +182,12 @@ def validate_inputs( begin, end, step, delay, outfile, mode ) :
     if (mode.lower() != 'serial') and (mode.lower() != 'ethernet'):
         print("ERROR: Invalid mode. Mode must be 'serial' or 'ethernet'")
         sys.exit(1)
+    if (poll <= 0) :        # check poll interval
+        print("ERROR: Poll interval must be greater than 0 seconds")
+        sys.exit(1)
+    if (telemetry < 0 or telemetry > 10) :  # check telemetry rate
+        print("ERROR: Telemetry rate must be between 0 and 10 Hz")
+        sys.exit(1)
     
     print("Validated!")
 
@@ -191,111 +251,76 @@ def compute(lbl_dispSweep):
     temps = np.append(25, temps)  # make sure the script leaves the BB at 25C
     lbl_dispSweep["text"] = f"{temps}\nSweep will be done in reverse order, ending on 25C"
     
-def BB_serial(temps, delay, outfile):
-    print("Starting Blackbody in serial mode...")
-    print(outfile)
-    
-    # initialize a serial instance
-    ser = serial.Serial(
-            port='/dev/ttyS0', # Connect to port
-            baudrate = 115200,   # baud rate per the manual
-            parity=serial.PARITY_NONE,    # parity per the manual
-            stopbits=serial.STOPBITS_ONE, # stop bits per the manual
-            bytesize=serial.EIGHTBITS,    # byte size per the manual
-            timeout=1
-    )
-    
-    command = ("\n").encode('ascii')
-    print(ser.read_until(command))  # needs to say connected to acc controler
-
-    start_time = time.ctime()
-    print(start_time)
-    bb_temp = []
-    for t in range(1, temps.shape[0] + 1):
-        # print(t)
-        # print(temps[-t])
-        print("Temp:" + format(temps[-t], '.1f') + "C")  # keep track of what temp its on
-
-        # DAxx.x sets the absolute temperature
-        # ex: DA25.0 sets the abs. temp. to 25 C
-        command = ("DA" + format(temps[-t], '.1f') + "\n").encode('ascii')  # set temp
-        ser.write(command)
-
-        # hold this temperature for the given amount of minutes
-        time.sleep(delay*60)  # delay for how ever long you want [s]
-
-        # MDA gets the absolute temperature from the BB
-        command = ("MDA\n").encode('ascii')  # get temp
-        ser.write(command)
-
-        command = ("\n").encode('ascii')  # print temp
-        bb_t = ser.read_until(command)
-
-        print(bb_t)  # check that its reading temps
-        bb_temp.append(bb_t)
+# subroutine to open the connection to the BB, 'serial' or 'ethernet'
+def open_link(mode, **kwargs):
+    print("Starting Blackbody in " + mode + " mode...")
+    return make_link(mode, **kwargs).open()
 
-    file = open(outfile, "w")  # change file name each time
-    file.write(start_time + "\n")
-
-    for i in range(len(bb_temp)):
-        split = bb_temp[i].split()
-        file.write(str(np.float64(split[-1])) + "\n")
-
-    file.close()
-    ser.close()
+# subroutine to run a sweep to completion on the given connection
+def run_sweep(link, temps, delay, outfile, poll, telemetry=0, dwell=None):
+    print(outfile)
+    # temps are stored last to first, ending on 25C
+    recorder = SessionRecorder(os.path.splitext(outfile)[0] + ".ses").open()
+    event_log = EventLog(os.path.splitext(outfile)[0] + "_events.csv")
+    event_log.start()
+    sweep = BlackbodySweep(link, temps[::-1], delay, outfile, poll_interval=poll, recorder=recorder, event_log=event_log,
+                           dwell=dwell)
+    logger = None
+    if telemetry > 0:
+        logger = TelemetryLogger(link, telemetry_file(outfile), rate=telemetry, set_point=lambda: sweep.set_point, recorder=recorder)
+        logger.start()
+    try:
+        sweep.run()
+    finally:
+        sweep.stop()
+        if logger is not None:
+            logger.stop()
+            logger.join()
+        recorder.close()
+        event_log.close()
+        link.close()
+
+def BB_serial(temps, delay, outfile, poll=POLL_INTERVAL, telemetry=0, dwell=None):
+    run_sweep(open_link('serial'), temps, delay, outfile, poll, telemetry, dwell)
     
-	
-def BB_ethernet():
-    print("Starting Blackbody in ethernet mode...")
-
-    # host = '192.168.200.161'  # default static IP of BB
-    host = '169.254.18.151'  # ip of bb should not change
-    port = '7788'  # what the manual said to use
-
-    print("Creating Telnet instance")
-    tn = telnetlib.Telnet()
-    print("Opening Telnet connection")
-    tn.open(host, port)
-    print("Telnet connection established")
-
-    command = ("\n").encode('ascii')
-    print(tn.read_until(command))  # needs to say connected to acc controler
-
-    start_time = time.ctime()
-    print(start_time)
-    bb_temp = []
-    for t in range(1, temps.shape[0] + 1):
-        # print(t)
-        # print(temps[-t])
-        print("Temp:" + format(temps[-t], '.1f') + "C")  # keep track of what temp its on
-
-        # DAxx.x sets the absolute temperature
-        # ex: DA25.0 sets the abs. temp. to 25 C
-        command = ("DA" + format(temps[-t], '.1f') + "\n").encode('ascii')  # set temp
-        tn.write(command)
-
-        # hold this temperature for the given amount of minutes
-        time.sleep(delay*60)  # delay for how ever long you want [s]
-
-        # MDA gets the absolute temperature from the BB
-        command = ("MDA\n").encode('ascii')  # get temp
-        tn.write(command)
-
-        command = ("\n").encode('ascii')  # print temp
-        bb_t = tn.read_until(command)
-
-        print(bb_t)  # check that its reading temps
-        bb_temp.append(bb_t)
-
-    file = open(outfile, "w")  # change file name each time
-    file.write(start_time + "\n")
-
-    for i in range(len(bb_temp)):
-        split = bb_temp[i].split()
-        file.write(str(np.float64(split[-1])) + "\n")
-
-    file.close()
-    tn.close()
+def BB_ethernet(temps, delay, outfile, poll=POLL_INTERVAL, telemetry=0, dwell=None):
+    run_sweep(open_link('ethernet'), temps, delay, outfile, poll, telemetry, dwell)
+
+# subroutine to name the telemetry log after the outfile
+def telemetry_file(outfile):
+    return os.path.splitext(outfile)[0] + ".bbt"
+
+# subroutine to run a sweep from the gui without blocking its main loop
+def start_gui_sweep(window, lbl_dispSweep, mode):
+    # commands fail at once instead of retrying, tick() is retried with after() so the gui never blocks
+    link = open_link(mode, retries=0)
+    recorder = SessionRecorder(os.path.splitext(outfile)[0] + ".ses").open()
+    event_log = EventLog(os.path.splitext(outfile)[0] + "_events.csv")
+    event_log.start()
+    sweep = BlackbodySweep(link, temps[::-1], delay, outfile, poll_interval=POLL_INTERVAL, recorder=recorder, event_log=event_log)
+    try:
+        sweep.start()
+    except LINK_ERRORS as e:
+        # tick() keeps trying the first temperature
+        print("Blackbody connection lost: " + str(e))
+
+    def tick():
+        try:
+            wait = sweep.tick()
+        except LINK_ERRORS as e:
+            print("Blackbody connection lost: " + str(e))
+            lbl_dispSweep["text"] = "No Blackbody Connection"
+            window.after(RETRY * 1000, tick)
+            return
+        if wait is None:
+            recorder.close()
+            event_log.close()
+            link.close()
+            lbl_dispSweep["text"] = "Sweep finished"
+            return
+        lbl_dispSweep["text"] = "BB setpoint: " + format(sweep.set_point, '.1f') + "C"
+        window.after(int(wait * 1000), tick)
+    tick()
 
 # subroutine to run the graphical interface for inputting values
 def run_gui() :
@@ -409,13 +434,13 @@ def run_gui() :
     btn_startSerial = tk.Button(
         master=window,
         text="Start Serial",
-        command=lambda: BB_serial(temps=temps, delay=delay, outfile=outfile) # run this subroutine when button is pressed
+        command=lambda: start_gui_sweep(window=window, lbl_dispSweep=lbl_dispSweep, mode='serial') # run this subroutine when button is pressed
     )
 
     btn_startEthernet = tk.Button(
         master=window,
         text="Start Ethernet",
-        command=lambda: BB_ethernet(temps=temps, delay=delay, outfile=outfile) # run this subroutine when button is pressed
+        command=lambda: start_gui_sweep(window=window, lbl_dispSweep=lbl_dispSweep, mode='ethernet') # run this subroutine when button is pressed
     )
 
     # pack everything and position in properly
@@ -463,6 +488,13 @@ def helpexit() :
     print("-d --delay      [int value]      : input delay time in minutes")
     print("-o --outfile    [filename.txt]   : input filename of output file")
     print("-m --mode       [string]         : input BB mode, 'serial' or 'ethernet'")
+    print("-p --poll       [seconds]        : input time between BB readings (default 10)")
+    print("-t --telemetry  [Hz]             : log the BB temperature at this rate to a .bbt file")
+    print("-a --adaptive   [C]              : hold each temp until the BB stays within this band, delay is the longest hold")
+    print("-n --window     [seconds]        : time the BB must stay in the band (default 60)")
+    print("-k --keep       [minutes]        : time each temp is held once settled (default 2)")
+    print("-r --radiometer [file.csv]       : sensor log being captured, settling also waits for its channels to flatten")
+    print("-F --flatness   [float value]    : largest variance ratio between the halves of the window (default 3)")
     print("\n")
     print("Must input begin, end, step, delay, outfile, and mode if not using gui")
     sys.exit(1)
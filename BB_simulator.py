@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+# Stand-in for the SBIR Blackbody Controller
+
+# Answers the commands the controllers send (DAxx.x, M2, MDA and DOFF)
+# from a first-order model of the blackbody temperature, on a pseudo
+# terminal for SerialLink or on a TCP port for TelnetLink. DA and DOFF
+# get no reply, M2 and MDA reply with the command and the temperature,
+# e.g. b'M2 25.03\r\n', which is what BB_sweep.parse_temp reads.
+# Latency and lost replies come from fault_injection.Faults. A serial
+# line cannot be hung up from the device end, so on the pseudo terminal
+# a disconnect makes the blackbody go silent for a while instead.
+#
+# Run it and point the controllers at it with
+#   python BB_simulator.py -m serial         (prints the pseudo terminal to use)
+#   BB_SERIAL_PORT=/dev/pts/3 python BB_controller.py ...
+
+import getopt
+import math
+import os
+import random
+import select
+import socketserver
+import sys
+import threading
+import time
+import tty
+
+from fault_injection import Faults, DROP, DISCONNECT, OPTIONS, LONG_OPTIONS, parse_option, help_lines
+
+BANNER = b"Connected to SBIR ACC controller\r\n"
+# temperature the blackbody drifts to with control off
+AMBIENT = 25.0
+
+
+class BlackbodyModel:
+    def __init__(self, temperature=AMBIENT, tau=30.0, speed=1.0, noise=0.0, seed=None):
+        self.temperature = temperature  # emitter temperature in C
+        self.set_point = temperature
+        self.control = True             # False after DOFF
+        self.tau = tau                  # seconds to cover 63% of a step
+        self.speed = speed              # simulated seconds per real second
+        self.noise = noise              # std. dev of the reported temperature in C
+        self.random = random.Random(seed)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+        self.commands = 0               # commands handled
+
+    def advance(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        dt = (now - self.last) * self.speed
+        self.last = now
+        target = self.set_point if self.control else AMBIENT
+        self.temperature = target + (self.temperature - target) * math.exp(-dt / self.tau)
+
+    # handle one command line, returns the reply or None
+    def handle(self, line):
+        cmd = line.strip().decode('ascii', errors='replace').upper()
+        with self.lock:
+            self.advance()
+            self.commands += 1
+            if cmd.startswith("DA"):
+                try:
+                    self.set_point = float(cmd[2:])
+                    self.control = True
+                except ValueError:
+                    pass
+                return None
+            if cmd == "DOFF":
+                self.control = False
+                return None
+            if cmd in ("M2", "MDA"):
+                reported = self.temperature
+                if self.noise > 0:
+                    reported += self.random.gauss(0, self.noise)
+                return (cmd + " " + format(reported, '.3f') + "\r\n").encode('ascii')
+            return None
+
+
+# blackbody on a pseudo terminal, open `port` with SerialLink
+class PtyBlackbody:
+    def __init__(self, model=None, faults=None, outage=5.0):
+        self.model = model if model is not None else BlackbodyModel()
+        self.faults = faults if faults is not None else Faults()
+        self.outage = outage  # seconds of silence after a disconnect
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.silent_until = 0
+        self.running = False
+        self.thread = None
+        os.write(self.master, BANNER)
+
+    def _reply(self, line):
+        outcome = self.faults.apply()
+        if outcome == DISCONNECT:
+            self.silent_until = time.monotonic() + self.outage
+            return
+        if outcome == DROP or time.monotonic() < self.silent_until:
+            return
+        reply = self.model.handle(line)
+        if reply is not None:
+            os.write(self.master, reply)
+
+    def run(self):
+        buffer = b""
+        while self.running:
+            ready, _, _ = select.select([self.master], [], [], 0.2)
+            if not ready:
+                continue
+            try:
+                buffer += os.read(self.master, 1024)
+            except OSError:
+                break
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                self._reply(line)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="PtyBlackbody", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class BlackbodyHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        sim = self.server.simulator
+        self.wfile.write(BANNER)
+        for line in self.rfile:
+            outcome = sim.faults.apply()
+            if outcome == DISCONNECT:
+                return
+            if outcome == DROP:
+                continue
+            reply = sim.model.handle(line)
+            if reply is not None:
+                self.wfile.write(reply)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+# blackbody on a TCP port, connect with TelnetLink
+class TcpBlackbody:
+    def __init__(self, host="127.0.0.1", port=7788, model=None, faults=None):
+        self.model = model if model is not None else BlackbodyModel()
+        self.faults = faults if faults is not None else Faults()
+        self.server = _Server((host, port), BlackbodyHandler)
+        self.server.simulator = self
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="TcpBlackbody", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    mode = "serial"
+    host = "127.0.0.1"
+    port = 7788
+    outage = 5.0
+    model = {}
+    faults = Faults()
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hm:H:p:T:t:s:n:o:" + OPTIONS,
+                                   ["help", "mode=", "host=", "port=", "temp=", "tau=", "speed=", "noise=", "outage="] + LONG_OPTIONS)
+    except getopt.GetoptError as err:
+        print(err)
+        helpexit()
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            helpexit()
+        elif o in ("-m", "--mode"):
+            mode = a.lower()
+        elif o in ("-H", "--host"):
+            host = a
+        elif o in ("-p", "--port"):
+            port = int(a)
+        elif o in ("-T", "--temp"):
+            model["temperature"] = float(a)
+        elif o in ("-t", "--tau"):
+            model["tau"] = float(a)
+        elif o in ("-s", "--speed"):
+            model["speed"] = float(a)
+        elif o in ("-n", "--noise"):
+            model["noise"] = float(a)
+        elif o in ("-o", "--outage"):
+            outage = float(a)
+        elif not parse_option(faults, o, a):
+            assert False, "unhandled option"
+
+    if mode == "serial":
+        sim = PtyBlackbody(BlackbodyModel(**model), faults, outage)
+        print("Simulated blackbody on " + sim.port + " with " + repr(faults))
+        print("Run the controllers with BB_SERIAL_PORT=" + sim.port)
+    elif mode == "ethernet":
+        sim = TcpBlackbody(host, port, BlackbodyModel(**model), faults)
+        print("Simulated blackbody on " + str(sim.address[0]) + ":" + str(sim.address[1]) + " with " + repr(faults))
+        print("Run the controllers with BB_HOST=" + str(sim.address[0]) + " BB_PORT=" + str(sim.address[1]))
+    else:
+        print("ERROR: Invalid mode. Mode must be 'serial' or 'ethernet'")
+        sys.exit(1)
+    sim.start()
+    try:
+        while True:
+            time.sleep(10)
+            print("Temp: " + format(sim.model.temperature, '.2f') + " C, set point: " + format(sim.model.set_point, '.1f') +
+                  " C, commands: " + str(sim.model.commands))
+    except KeyboardInterrupt:
+        pass
+    sim.stop()
+
+
+def helpexit():
+    print("-h --help                        : display help message")
+    print("-m --mode       [string]         : 'serial' for a pseudo terminal or 'ethernet' for TCP (default serial)")
+    print("-H --host       [address]        : address to listen on in ethernet mode (default 127.0.0.1)")
+    print("-p --port       [int value]      : port to listen on in ethernet mode (default 7788)")
+    print("-T --temp       [float value]    : starting blackbody temperature in C (default 25)")
+    print("-t --tau        [seconds]        : time constant of the blackbody (default 30)")
+    print("-s --speed      [float value]    : simulated seconds per second (default 1)")
+    print("-n --noise      [C]              : std. dev of the reported temperature")
+    print("-o --outage     [seconds]        : silence after a disconnect in serial mode (default 5)")
+    for line in help_lines():
+        print(line)
+    print("\n")
+    print("Point the controllers at the simulator with BB_SERIAL_PORT, or BB_HOST and BB_PORT")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
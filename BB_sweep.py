@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+# Tick-driven temperature sweep engine for the
+# SBIR Blackbody Controller
+
+# The engine never sleeps on its own. Each call to tick() does whatever
+# is due (a reading, a step change) and returns the number of seconds
+# until the next deadline, so the same sweep can be driven by run() from
+# the command line or by tkinter's after() from a GUI. Every reading is
+# written to the outfile as soon as it arrives. With a stability.Dwell
+# each set point is held until the readings have settled plus the
+# dwell's hold time, instead of for a fixed delay.
+
+import time
+
+
+# subroutine to pull the temperature out of a reply such as b'M2 25.03\r\n'
+def parse_temp(reply):
+    try:
+        return float(reply.split()[-1])
+    except (IndexError, ValueError):
+        return None
+
+
+class BlackbodySweep:
+    def __init__(self, link, temps, delay, outfile, poll_interval=10, query="MDA", recorder=None, event_log=None,
+                 dwell=None):
+        self.link = link                    # open BB_transport link
+        self.temps = list(temps)            # set points in the order they are run
+        self.hold = delay * 60              # seconds to hold each set point
+        self.outfile = outfile
+        self.poll_interval = poll_interval  # seconds between readings during a hold
+        self.query = query                  # MDA or M2, both return the absolute temp
+        self.recorder = recorder            # optional session_log recorder for readings and steps
+        self.event_log = event_log          # optional event_log for step transitions
+        self.dwell = dwell                  # optional stability.Dwell, replaces the fixed hold
+
+        self.index = -1
+        self.step_deadline = None
+        self.next_poll = None
+        self.start_time = None
+        self.file = None
+        self.finished = False
+        self.settle_times = []              # seconds each set point took to settle with a dwell, None if it never did
+
+    @property
+    def set_point(self):
+        if 0 <= self.index < len(self.temps):
+            return self.temps[self.index]
+        return None
+
+    # open the outfile and set the first temperature
+    def start(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.start_time = now
+        self.file = open(self.outfile, "w")
+        self.file.write(time.ctime() + "\n")
+        self.file.write("Elapsed (s),Set Point (C),BB Temp (C)\n")
+        self.file.flush()
+        if self.recorder is not None:
+            self.recorder.event("bb_sweep_start")
+        self._next_step(now)
+
+    # move on to the next set point, only once the DA command went through so a failed one can be retried
+    def _next_step(self, now):
+        temp = self.temps[self.index + 1]
+        print("Temp:" + format(temp, '.1f') + "C")  # keep track of what temp its on
+
+        # DAxx.x sets the absolute temperature
+        # ex: DA25.0 sets the abs. temp. to 25 C
+        self.link.command("DA" + format(temp, '.1f'))
+        self.index += 1
+        if self.recorder is not None:
+            self.recorder.event("bb_step", self.set_point)
+        if self.event_log is not None:
+            self.event_log.log("bb_step", self.index, format(self.set_point, '.1f'))
+            self.event_log.sync()
+        self.step_deadline = now + self.hold
+        if self.dwell is not None:
+            self.dwell.reset(now, self.set_point)
+            self.step_deadline = self.dwell.deadline()
+        self.next_poll = now + self.poll_interval
+
+    # feed a reading to the dwell and shorten the hold once the set point has settled
+    def _settle(self, now, bb_t):
+        self.dwell.add(now, bb_t)
+        if not self.dwell.check(now):
+            return
+        self.settle_times.append(now - self.dwell.start)
+        print("Settled at " + format(self.set_point, '.1f') + "C after " + format(now - self.dwell.start, '.0f') + " s")
+        if self.recorder is not None:
+            self.recorder.event("bb_stable", self.set_point)
+        if self.event_log is not None:
+            self.event_log.log("bb_stable", self.index, format(self.set_point, '.1f'))
+            self.event_log.sync()
+        self.step_deadline = self.dwell.deadline()
+
+    def _end_step(self):
+        if self.dwell is not None and self.dwell.timed_out:
+            self.settle_times.append(None)
+            print("Blackbody did not settle at " + format(self.set_point, '.1f') + "C, moving on")
+            if self.event_log is not None:
+                self.event_log.log("bb_settle_timeout", self.index, format(self.set_point, '.1f'))
+
+    # read the blackbody temperature and append it to the outfile
+    def poll(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        reply = self.link.command(self.query, reply=True)
+        bb_t = parse_temp(reply)
+        if bb_t is None:
+            print("Unexpected reply from blackbody: " + str(reply))
+            return None
+        self.file.write(format(now - self.start_time, '.3f') + "," + format(self.set_point, '.1f') + "," + str(bb_t) + "\n")
+        self.file.flush()
+        if self.recorder is not None:
+            self.recorder.blackbody(bb_t, self.set_point)
+        return bb_t
+
+    # do everything that is due and return seconds until the next deadline, None once finished
+    def tick(self, now=None):
+        if self.finished:
+            return None
+        if now is None:
+            now = time.monotonic()
+        if self.step_deadline is None:
+            # the first set point did not go through in start()
+            self._next_step(now)
+        if now >= self.next_poll and self.next_poll < self.step_deadline:
+            bb_t = self.poll(now)
+            if self.dwell is not None:
+                self._settle(now, bb_t)
+            # skip readings that were missed if the tick came late
+            while self.next_poll <= now:
+                self.next_poll += self.poll_interval
+        if now >= self.step_deadline:
+            # always keep the reading at the end of the hold
+            self.poll(now)
+            self._end_step()
+            if self.index + 1 >= len(self.temps):
+                self.stop()
+                return None
+            self._next_step(now)
+        return max(0, min(self.next_poll, self.step_deadline) - now)
+
+    def stop(self):
+        self.finished = True
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            if self.recorder is not None:
+                self.recorder.event("bb_sweep_end")
+
+    # run the whole sweep, sleeping between deadlines
+    def run(self):
+        self.start()
+        wait = self.tick()
+        while wait is not None:
+            time.sleep(wait)
+            wait = self.tick()
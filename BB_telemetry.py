@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+# High-rate temperature logger for the
+# SBIR Blackbody Controller
+
+# Samples the blackbody temperature at a fixed rate over an open
+# BB_transport link and appends fixed-size binary records to a log
+# file. Records are buffered and flushed every few seconds, so the
+# logger uses the same small amount of memory however long it runs.
+#
+# File layout: one JSON header line, then records of
+#   t          float64  seconds on the monotonic clock since the header's start
+#   temp       float32  measured blackbody temperature in C (NaN if no reply)
+#   set_point  float32  blackbody set point in C (NaN if unknown)
+
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from BB_sweep import parse_temp
+from BB_transport import LINK_ERRORS
+
+MAGIC = "BBTLM1"
+RECORD = struct.Struct("<dff")
+RECORD_DTYPE = np.dtype([("t", "<f8"), ("temp", "<f4"), ("set_point", "<f4")])
+
+
+class TelemetryLogger(threading.Thread):
+    def __init__(self, link, path, rate=1.0, flush_interval=5.0, query="M2", set_point=None, recorder=None):
+        threading.Thread.__init__(self, name="TelemetryLogger", daemon=True)
+        self.link = link                      # open BB_transport link, shared with the sweep
+        self.path = path
+        self.period = 1.0 / rate              # seconds between samples
+        self.flush_interval = flush_interval  # seconds between writes to disk
+        self.query = query
+        self.set_point = set_point            # optional function returning the current set point
+        self.recorder = recorder              # optional session_log recorder that also gets each sample
+
+        self.origin = None
+        self.samples = 0
+        self._buffer = bytearray()
+        self._stopped = threading.Event()
+
+    def _write_header(self, file):
+        header = {
+            "format": MAGIC,
+            "start": time.ctime(),
+            "start_epoch": time.time(),  # wall clock at t = 0
+            "rate": 1.0 / self.period,
+            "query": self.query,
+        }
+        file.write((json.dumps(header) + "\n").encode('ascii'))
+
+    def _flush(self, file):
+        if self._buffer:
+            file.write(self._buffer)
+            file.flush()
+            os.fsync(file.fileno())
+            del self._buffer[:]
+
+    # take one reading and add it to the buffer
+    def sample(self, now):
+        try:
+            bb_t = parse_temp(self.link.command(self.query, reply=True))
+        except LINK_ERRORS as e:
+            print("Blackbody telemetry error: " + str(e))
+            bb_t = None
+        sp = self.set_point() if self.set_point is not None else None
+        self._buffer += RECORD.pack(now - self.origin,
+                                    np.nan if bb_t is None else bb_t,
+                                    np.nan if sp is None else sp)
+        self.samples += 1
+        if self.recorder is not None and bb_t is not None:
+            self.recorder.blackbody(bb_t, sp)
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        with open(self.path, "wb") as file:
+            self._write_header(file)
+            self.origin = time.monotonic()
+            next_sample = self.origin
+            next_flush = self.origin + self.flush_interval
+            while not self._stopped.wait(max(0, next_sample - time.monotonic())):
+                now = time.monotonic()
+                self.sample(now)
+                # skip samples that were missed if a reply was slow
+                next_sample = max(next_sample + self.period, now)
+                if now >= next_flush:
+                    self._flush(file)
+                    next_flush = now + self.flush_interval
+            self._flush(file)
+
+
+# subroutine to read a telemetry log, returns the header and a record array
+def load_telemetry(path):
+    with open(path, "rb") as file:
+        header = json.loads(file.readline().decode('ascii'))
+        offset = file.tell()
+    records = np.fromfile(path, dtype=RECORD_DTYPE, offset=offset)
+    return header, records
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+# Long-lived connection to the
+# SBIR Blackbody Controller
+
+# One link is opened per session and reused for every DA, M2, MDA
+# and DOFF command. Serial (UART) and ethernet (Telnet) share the same
+# interface, and a command that fails with an I/O error reopens the
+# connection with an increasing delay before trying again. A GUI opens
+# its link with retries=0 so a lost connection fails at once and the
+# retry is scheduled with after() instead of blocking the main loop.
+
+import abc
+import os
+import threading
+import time
+import telnetlib            # for ethernet connection
+import serial               # for serial connection
+
+# default connection settings for the BB
+# BB_SERIAL_PORT, BB_HOST and BB_PORT override them, e.g. to use BB_simulator.py
+SERIAL_PORT = os.environ.get("BB_SERIAL_PORT", '/dev/ttyS0')
+BB_HOST = os.environ.get("BB_HOST", '169.254.18.151')  # ip of bb should not change
+BB_PORT = int(os.environ.get("BB_PORT", 7788))         # what the manual said to use
+
+# errors that mean the connection needs to be reopened
+LINK_ERRORS = (serial.SerialException, OSError, EOFError)
+
+
+class BlackbodyLink(abc.ABC):
+    def __init__(self, retries=5, backoff=1.0, max_backoff=30.0):
+        self.retries = retries          # attempts before giving up on a command
+        self.backoff = backoff          # seconds to wait before the first reconnect
+        self.max_backoff = max_backoff  # longest wait between reconnects
+        self.conn = None
+        # commands and their replies must not interleave between threads
+        self.lock = threading.RLock()
+
+    # subclasses return a new connection object with write() and read_until()
+    @abc.abstractmethod
+    def _connect(self):
+        pass
+
+    @property
+    def is_open(self):
+        return self.conn is not None
+
+    def open(self):
+        with self.lock:
+            if self.conn is None:
+                self.conn = self._connect()
+                print(self._read_line())  # needs to say connected to acc controler
+        return self
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                try:
+                    self.conn.close()
+                except LINK_ERRORS:
+                    pass
+                self.conn = None
+
+    # read one reply line from the controller
+    def _read_line(self):
+        return self.conn.read_until(("\n").encode('ascii'))
+
+    # send a command such as "DA25.0" and optionally return the reply line
+    # the lock is only held for each attempt, so other threads are not held up by the backoff
+    def command(self, cmd, reply=False):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                with self.lock:
+                    if self.conn is None:
+                        self.open()
+                    self.conn.write((cmd + "\n").encode('ascii'))
+                    if reply:
+                        return self._read_line()
+                    return None
+            except LINK_ERRORS as e:
+                print("Blackbody link error: " + str(e))
+                self.close()
+                if attempt == self.retries:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SerialLink(BlackbodyLink):
+    def __init__(self, port=SERIAL_PORT, **kwargs):
+        BlackbodyLink.__init__(self, **kwargs)
+        self.port = port
+
+    def _connect(self):
+        return serial.Serial(
+                port=self.port,  # Connect to port
+                baudrate = 115200,   # baud rate per the manual
+                parity=serial.PARITY_NONE,    # parity per the manual
+                stopbits=serial.STOPBITS_ONE, # stop bits per the manual
+                bytesize=serial.EIGHTBITS,    # byte size per the manual
+                timeout=1
+        )
+
+
+class TelnetLink(BlackbodyLink):
+    def __init__(self, host=BB_HOST, port=BB_PORT, **kwargs):
+        BlackbodyLink.__init__(self, **kwargs)
+        self.host = host
+        self.port = port
+
+    def _connect(self):
+        tn = telnetlib.Telnet()
+        tn.open(self.host, self.port, timeout=5)
+        return tn
+
+    def _read_line(self):
+        return self.conn.read_until(("\n").encode('ascii'), timeout=1)
+
+
+# subroutine to create the link for 'serial' or 'ethernet' mode
+def make_link(mode, **kwargs):
+    if mode.lower() == 'serial':
+        return SerialLink(**kwargs)
+    if mode.lower() == 'ethernet':
+        return TelnetLink(**kwargs)
+    raise ValueError("Invalid mode. Mode must be 'serial' or 'ethernet'")
@@ -14,16 +14,17 @@ from pymodbus.payload import BinaryPayloadDecoder
 from pymodbus.payload import BinaryPayloadBuilder
 from pymodbus.constants import Endian
 import numpy as np
-import pymodbus
 import sys
 
+from EC_registers import read_snapshot, STATUS_FIELDS, EC_HOST, EC_PORT
+
 #input values
 args = sys.argv[1:]
 rw = str(args[0]) #r = read, w = write
 
 
 # declare and open a Modbus connection to the EC
-client = ModbusTcpClient("169.254.18.153", port=502, timeout=3)
+client = ModbusTcpClient(EC_HOST, port=EC_PORT, timeout=3)
 print("Connecting to chamber...")
 client.connect()
 print("Connected!")
@@ -93,24 +94,14 @@ elif (rw == "-s"):
 	print("Chamber Status")
 	print("----------------------")
 
-	#get chamber temp
-	read = client.read_holding_registers(address = 16664 ,count = 4)
-	decoder = BinaryPayloadDecoder.fromRegisters(read.registers, Endian.Big, wordorder=Endian.Little)
-	print("Current Temperature: " + "{:.1f}".format(decoder.decode_32bit_float()) + " C")
-	
-	#get chamber humidity
-	read = client.read_holding_registers(address = 16666 ,count = 4)
-	print("Current Humidity: " + "{:.1f}".format(decoder.decode_32bit_float()) + "%")
+	#read temperature, humidity and profile status in one batch
+	snap = read_snapshot(client, STATUS_FIELDS)
+	print("Current Temperature: " + "{:.1f}".format(snap.temperature) + " C")
+	print("Current Humidity: " + "{:.1f}".format(snap.humidity) + "%")
 	
-	#read profile status
-	read = client.read_holding_registers(address = 16568 ,count = 1)
-	if(int(read.registers[0]) == 149):
-		#read number of profile currently running
-		read = client.read_holding_registers(address = 16588, count = 1)
-		print("Profile Running: " + str(read.registers))
-		
-		read = client.read_holding_registers(address = 16590, count = 1)
-		print("Current Step: " + str(read.registers))
+	if(snap.profile_running):
+		print("Profile Running: " + str(snap.profile_number))
+		print("Current Step: " + str(snap.profile_step))
 	else:
 		print("Profile running: None")
 	
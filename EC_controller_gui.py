@@ -10,10 +10,9 @@
 
 
 from pymodbus.client import ModbusTcpClient
-from pymodbus.payload import BinaryPayloadDecoder
-from pymodbus.payload import BinaryPayloadBuilder
-from pymodbus.constants import Endian
-import pymodbus
+
+from EC_worker import ChamberWorker
+from EC_registers import EC_HOST, EC_PORT
 
 import customtkinter
 
@@ -25,7 +24,9 @@ import time
 MAX_TEMP = 180
 MIN_TEMP = -45
 # declare and open a Modbus connection to the EC
-client = ModbusTcpClient("169.254.18.153", port=502, timeout=3)
+client = ModbusTcpClient(EC_HOST, port=EC_PORT, timeout=3)
+# all chamber I/O runs on this thread, the GUI only queues commands and drains snapshots
+worker = ChamberWorker(client)
 paused = False
 disconnected = False
 remaining_time = 0 #variable for monitoring how much time is left in step
@@ -123,9 +124,8 @@ class CustomStep:
 		self.step += 1
 		self.running = True
 		
-		#store time of day
-		read = client.read_holding_registers(address = 14660 ,count = 1)
-		self.current_time = read.registers[0]
+		#time of day is filled in from the first snapshot after the write
+		self.current_time = None
 		
 		
 	def next_step(self):
@@ -136,9 +136,8 @@ class CustomStep:
 		set_temp(self.temps[self.step])
 		self.step += 1
 		
-		#store time of day
-		read = client.read_holding_registers(address = 14660 ,count = 1)
-		self.current_time = read.registers[0]
+		#time of day is filled in from the first snapshot after the write
+		self.current_time = None
 		
 		
 		
@@ -153,13 +152,13 @@ def pause_button():
 		paused = False
 		btn_start_pause.configure(text = "Pause Profile")
 		lbl_entry_error.configure(text = "Running Profile: " + cb_profile_select.get())
-		client.write_registers(16564, 147)
+		worker.resume_profile()
 	else:
 		print("Pausing")
 		paused = True
 		btn_start_pause.configure(text = "Resume Profile")
 		lbl_entry_error.configure(text = "Profile Paused")
-		client.write_registers(16566, 146)
+		worker.pause_profile()
     
 	
 #start program with selected profile
@@ -179,8 +178,7 @@ def start_button():
 	
 	print(str(cb_profile_select.get()))
 	cb_profile_select.configure(state = "disabled")
-	client.write_registers(16558, int(cb_profile_select.get())) #Load profile number
-	client.write_registers(16562, 1782) #Start process controller
+	worker.start_profile(cb_profile_select.get()) #Load profile number and start
 	
 	#label for telling user the program is running
 	lbl_entry_error.configure(text = "Running Profile: " + cb_profile_select.get())
@@ -200,12 +198,9 @@ def term_button():
 	cb_profile_select.grid()
 	
 	cb_profile_select.configure(state = "normal")
-	client.write_registers(16566, 148)
-	
-	time.sleep(1) #delay to allow termination to finish
+	worker.terminate_profile(23) #terminates, waits, then sets chamber to 23 C
 	
 	lbl_entry_error.configure(text = "Profile Terminated")
-	set_temp(23)
 	
 def custom_button():
 	global custom
@@ -261,8 +256,9 @@ def pause_custom_button():
 		paused = False
 		btn_custom.configure(text = "Pause Custom Program")
 		
-		read = client.read_holding_registers(address = 14660 ,count = 1)
-		custom.current_time = int(read.registers[0])
+		#with no chamber reading yet the step restarts from the next one
+		snap = worker.latest
+		custom.current_time = snap.time_of_day if snap is not None else None
 	else:
 		print("Pausing")
 		paused = True
@@ -271,8 +267,14 @@ def pause_custom_button():
 		btn_edit_custom.grid()
 		
 		#calculate new remaining time
-		read = client.read_holding_registers(address = 14660 ,count = 1)
-		current_time = int(read.registers[0])
+		snap = worker.latest
+		if(snap is None):
+			#no chamber reading yet or the connection was lost, keep the remaining time
+			return
+		current_time = snap.time_of_day
+		if(custom.current_time is None):
+			#paused before the first snapshot of the step arrived
+			custom.current_time = current_time
 		
 		if(current_time < custom.current_time):
 			#prevents overflow
@@ -323,88 +325,50 @@ def file_button():
 
 def update():
 	global disconnected
-	try:
-		#attempt to reconnect if chamber disconnected
-		if(disconnected):
+	#check for new chamber data every 100 ms
+	lbl_temp.after(100, update)
+	
+	snap = None
+	for kind, payload in worker.drain():
+		if(kind == "snapshot"):
+			snap = payload
+		elif(kind == "connected"):
+			if(disconnected):
+				print("Chamber Reconnected!")
+			disconnected = False
+			lbl_entry_error.configure(text = "Chamber Ready")
+		elif(kind == "disconnected"):
+			disconnected = True
+			snap = None
 			lbl_entry_error.configure(text = "No Chamber Connection")
-			client.connect()
-			if client.is_socket_open():
-				disconnected = False
-				print("Chamber Reconnected!")		
-				lbl_entry_error.configure(text = "Chamber Ready")
-
-		
-		#repeat after a half-second
-		lbl_temp.after(500, update)
-		
-		#update temp label
-		read = client.read_holding_registers(address = 16664 ,count = 4)
-		decoder = BinaryPayloadDecoder.fromRegisters(read.registers, Endian.Big, wordorder=Endian.Little)
-		current_temp = decoder.decode_32bit_float()
-		
-		decoder.reset()
-		read = client.read_holding_registers(address = 2782, count = 4)
-		decoder = BinaryPayloadDecoder.fromRegisters(read.registers, Endian.Big, wordorder=Endian.Little)
-
-		set_point_temp = decoder.decode_32bit_float()
-		lbl_temp.configure(text = "Current Temperature: " + "{:.1f}".format(current_temp) + " C\nSet Point: " + "{:.1f}".format(set_point_temp) + " C")
-		
-		#update humidity label
-		decoder.reset()
-		read = client.read_holding_registers(address = 16666 ,count = 4)
-		decoder = BinaryPayloadDecoder.fromRegisters(read.registers, Endian.Big, wordorder=Endian.Little)
-		current_humidity = decoder.decode_32bit_float()
-		lbl_hum.configure(text = "Current Humidity: " + "{:.1f}".format(current_humidity) + "%")
-
-		#update time
-		update_time()
-	except pymodbus.exceptions.ModbusException as e:
-		lbl_entry_error.configure(text = "No Chamber Connection")
-		print("No Chamber Connection")
-		disconnected = True
-	except  AttributeError:
-		lbl_entry_error.configure(text = "No Chamber Connection")
-		print("No Chamber Connection")
-		disconnected = True
+		elif(kind == "error"):
+			print("Chamber command failed: " + payload)
+	if(snap is None):
+		return
+	
+	#update temp label
+	lbl_temp.configure(text = "Current Temperature: " + "{:.1f}".format(snap.temperature) + " C\nSet Point: " + "{:.1f}".format(snap.set_point) + " C")
 	
-	#heartbeat print
+	#update humidity label
+	lbl_hum.configure(text = "Current Humidity: " + "{:.1f}".format(snap.humidity) + "%")
+
+	#update time
+	update_time(snap)
 
 def set_temp(temp):
-	#create builder, add float to buffer, build, and then write to register
-	builder = BinaryPayloadBuilder(wordorder=Endian.Little, byteorder=Endian.Big)
-	builder.add_32bit_float(np.float32(temp))
-	val_float= builder.build()
-	client.write_registers(2782, val_float, skip_encode = True)
+	#queue the write, the worker thread builds the float and sends it
+	worker.set_temp(temp)
 	
-def update_time():
+def update_time(snap):
 	global remaining_time_total, remaining_time
-	#get hour, minute and second
-	read = client.read_holding_registers(address = 14664 ,count = 1)
-	hour = read.registers[0]
-	if(hour < 10):
-		time_str = "0" + str(hour)
-	else:
-		time_str = str(hour)
-		
-	read = client.read_holding_registers(address = 14666 ,count = 1)
-	minute = read.registers[0]
-	if(minute < 10):
-		time_str += ":0" + str(minute)
-	else:
-		time_str += ":" + str(minute)
-
-	read = client.read_holding_registers(address = 14668 ,count = 1)
-	second = read.registers[0]
-	if(second < 10):
-		time_str += ":0" + str(second)
-	else:
-		time_str += ":" + str(second)
-	#print(time_str)
-	lbl_time.configure(text = time_str)
+	#show chamber clock
+	lbl_time.configure(text = snap.time_str)
 	
 	#check if it is time to go to next step
-	read = client.read_holding_registers(address = 14660 ,count = 1)
-	current_time = int(read.registers[0])
+	current_time = snap.time_of_day
+	if(custom.running and custom.current_time is None):
+		#first snapshot since the step began
+		custom.current_time = current_time
 	if(custom.running and not paused):
 		#print remaining time of step and step number to entry label
 		if(current_time < custom.current_time):
@@ -476,13 +440,7 @@ ents_custom = [ent_begin, ent_end, ent_ramp, ent_time]
 if __name__ == "__main__":
 	print("Running main")
 	print("Connecting to chamber...")
-	try:
-		client.connect()		
-		print("Connected!")
-	except pymodbus.exceptions.ModbusException as e:
-		print("Connection Failed")
-		lbl_entry_error.configure(text = "No Connection to Chamber")
-		disconnected = True
+	worker.start()
 	
 	customtkinter.set_appearance_mode("dark")
 	customtkinter.set_default_color_theme("blue")
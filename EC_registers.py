@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# Register map and batched snapshot reader for the
+# Environmental Chamber's Watlow F4T panel
+
+# Every register the controllers poll is listed once below. The
+# reader merges nearby addresses into as few block reads as
+# possible and decodes every value from the returned words in a
+# single pass, so one poll costs a few round-trips instead of one
+# per value.
+
+import os
+import struct
+from dataclasses import dataclass
+from functools import lru_cache
+
+import pymodbus
+
+# address of the F4T, set EC_HOST and EC_PORT to point the controllers at EC_simulator.py
+EC_HOST = os.environ.get("EC_HOST", "169.254.18.153")
+EC_PORT = int(os.environ.get("EC_PORT", 502))
+
+# F4T limit on the number of registers in one read
+MAX_BLOCK = 125
+# largest run of unused registers worth reading to avoid another round-trip
+MAX_GAP = 8
+
+# name: (address, type)
+# floats and 32 bit words are sent low word first, high byte first in each word
+REGISTERS = {
+	"set_point": (2782, "float"),
+	"time_of_day": (14660, "u32"), #seconds since midnight
+	"hour": (14664, "u16"),
+	"minute": (14666, "u16"),
+	"second": (14668, "u16"),
+	"profile_status": (16568, "u16"),
+	"profile_number": (16588, "u16"),
+	"profile_step": (16590, "u16"),
+	"temperature": (16664, "float"),
+	"humidity": (16666, "float"),
+}
+
+# number of registers used by each type
+WIDTHS = {"float": 2, "u32": 2, "u16": 1}
+
+# profile status value while a profile is running
+PROFILE_RUNNING = 149
+
+# values read by the GUIs every tick
+POLL_FIELDS = ("temperature", "set_point", "humidity", "time_of_day", "hour", "minute", "second")
+# values printed by EC_controller.py -s
+STATUS_FIELDS = ("temperature", "humidity", "profile_status", "profile_number", "profile_step")
+
+
+#one decoded reading of the chamber, fields that were not read are None
+@dataclass(frozen=True)
+class ChamberSnapshot:
+	temperature: float = None
+	set_point: float = None
+	humidity: float = None
+	time_of_day: int = None
+	hour: int = None
+	minute: int = None
+	second: int = None
+	profile_status: int = None
+	profile_number: int = None
+	profile_step: int = None
+
+	#chamber clock as HH:MM:SS
+	@property
+	def time_str(self):
+		return "{:02d}:{:02d}:{:02d}".format(self.hour, self.minute, self.second)
+
+	@property
+	def profile_running(self):
+		return self.profile_status == PROFILE_RUNNING
+
+
+#group the requested fields into contiguous blocks
+#returns a tuple of (start address, count, fields) with fields as (name, offset, type)
+@lru_cache(maxsize=None)
+def plan_blocks(fields, max_gap=MAX_GAP, max_block=MAX_BLOCK):
+	regs = sorted((REGISTERS[name][0], name, REGISTERS[name][1]) for name in fields)
+	blocks = []
+	for address, name, kind in regs:
+		end = address + WIDTHS[kind]
+		if blocks:
+			start, count, members = blocks[-1]
+			#extend the last block if the gap is small and the block stays in range
+			if address - (start + count) <= max_gap and end - start <= max_block:
+				members.append((name, address - start, kind))
+				blocks[-1] = (start, max(count, end - start), members)
+				continue
+		blocks.append((address, WIDTHS[kind], [(name, 0, kind)]))
+	return tuple((start, count, tuple(members)) for start, count, members in blocks)
+
+
+#decode one value starting at offset of a list of registers
+def decode(registers, offset, kind):
+	if kind == "u16":
+		return registers[offset]
+	#swap words to get the high word first, then unpack as big endian
+	raw = struct.pack(">HH", registers[offset + 1], registers[offset])
+	if kind == "float":
+		return struct.unpack(">f", raw)[0]
+	return struct.unpack(">I", raw)[0]
+
+
+#encode one value as the registers the F4T sends, the inverse of decode
+def encode(value, kind):
+	if kind == "u16":
+		return [int(value) & 0xFFFF]
+	if kind == "float":
+		raw = struct.pack(">f", value)
+	else:
+		raw = struct.pack(">I", int(value))
+	high, low = struct.unpack(">HH", raw)
+	return [low, high]
+
+
+#read the given fields from the chamber using the fewest block reads
+def read_snapshot(client, fields=POLL_FIELDS):
+	values = {}
+	for start, count, members in plan_blocks(tuple(fields)):
+		read = client.read_holding_registers(address = start, count = count)
+		if read.isError():
+			raise pymodbus.exceptions.ModbusException("Failed to read registers " + str(start) + "-" + str(start + count - 1))
+		for name, offset, kind in members:
+			values[name] = decode(read.registers, offset, kind)
+	return ChamberSnapshot(**values)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+
+# Stand-in for the Environmental Chamber's Watlow F4T panel
+
+# A Modbus TCP server holding the registers the controllers use, backed
+# by a first-order thermal model of the chamber, so EC_controller.py,
+# the GUIs and ChamberWorker can be run and benchmarked without the
+# chamber. Only function codes 3 (read holding registers), 6 (write
+# single register) and 16 (write multiple registers) are answered.
+# Latency, lost replies and dropped connections can be injected with
+# fault_injection.Faults.
+#
+# Run it and point the controllers at it with
+#   python EC_simulator.py -p 5020 -s 60
+#   EC_HOST=127.0.0.1 EC_PORT=5020 python EC_controller_gui.py
+
+import getopt
+import math
+import random
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+from EC_registers import REGISTERS, MAX_BLOCK, PROFILE_RUNNING, decode, encode
+from fault_injection import Faults, DROP, DISCONNECT, OPTIONS, LONG_OPTIONS, parse_option, help_lines
+
+#profile control registers and the values written to them
+PROFILE_LOAD = 16558
+PROFILE_START = 16562
+PROFILE_RESUME = 16564
+PROFILE_CONTROL = 16566
+START = 1782
+PAUSE = 146
+RESUME = 147
+TERMINATE = 148
+
+#Modbus exception codes
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+ILLEGAL_VALUE = 3
+
+
+class ModbusError(Exception):
+	def __init__(self, code):
+		Exception.__init__(self, "Modbus exception " + str(code))
+		self.code = code
+
+
+#first-order model of the chamber temperature following its set point
+class ChamberModel:
+	def __init__(self, temperature=23.0, tau=600.0, speed=1.0, humidity=40.0, noise=0.0, seed=None):
+		self.temperature = temperature #air temperature in C
+		self.set_point = temperature
+		self.tau = tau #seconds for the temperature to cover 63% of a step
+		self.speed = speed #simulated seconds per real second
+		self.humidity = humidity
+		self.noise = noise #std. dev of the reported temperature in C
+		self.random = random.Random(seed)
+		self.registers = {}
+		self.lock = threading.Lock()
+
+		self.start = time.monotonic()
+		self.last = self.start
+		#chamber clock starts at the local time of day
+		local = time.localtime()
+		self.clock_start = local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec
+		self.profile_number = 0
+		self.set_point_changed = None #monotonic time of the last set point write
+		self._store("set_point", self.set_point)
+		self._store("profile_status", TERMINATE)
+
+	def _store(self, name, value):
+		address, kind = REGISTERS[name]
+		for i, word in enumerate(encode(value, kind)):
+			self.registers[address + i] = word
+
+	#simulated seconds since the model started
+	def elapsed(self, now=None):
+		if now is None:
+			now = time.monotonic()
+		return (now - self.start) * self.speed
+
+	#move the temperature towards the set point, exact for a set point held since the last call
+	def advance(self, now=None):
+		if now is None:
+			now = time.monotonic()
+		dt = (now - self.last) * self.speed
+		self.last = now
+		self.temperature = self.set_point + (self.temperature - self.set_point) * math.exp(-dt / self.tau)
+
+	#refresh the measured values and the clock
+	def _refresh(self):
+		self.advance()
+		reported = self.temperature
+		if self.noise > 0:
+			reported += self.random.gauss(0, self.noise)
+		self._store("temperature", reported)
+		self._store("humidity", self.humidity)
+		clock = int(self.clock_start + self.elapsed()) % 86400
+		self._store("time_of_day", clock)
+		self._store("hour", clock // 3600)
+		self._store("minute", (clock // 60) % 60)
+		self._store("second", clock % 60)
+
+	def read(self, start, count):
+		with self.lock:
+			self._refresh()
+			return [self.registers.get(address, 0) for address in range(start, start + count)]
+
+	def write(self, start, words):
+		with self.lock:
+			self.advance()
+			for i, word in enumerate(words):
+				self.registers[start + i] = word
+			written = range(start, start + len(words))
+			address, kind = REGISTERS["set_point"]
+			if address in written or address + 1 in written:
+				self.set_point = decode([self.registers.get(address, 0), self.registers.get(address + 1, 0)], 0, kind)
+				self.set_point_changed = time.monotonic()
+			if PROFILE_LOAD in written:
+				self.profile_number = self.registers[PROFILE_LOAD]
+			if PROFILE_START in written and self.registers[PROFILE_START] == START:
+				self._store("profile_number", self.profile_number)
+				self._store("profile_step", 1)
+				self._store("profile_status", PROFILE_RUNNING)
+			if PROFILE_RESUME in written and self.registers[PROFILE_RESUME] == RESUME:
+				self._store("profile_status", PROFILE_RUNNING)
+			if PROFILE_CONTROL in written and self.registers[PROFILE_CONTROL] in (PAUSE, TERMINATE):
+				self._store("profile_status", self.registers[PROFILE_CONTROL])
+
+
+#answer one request PDU, returns the response PDU
+def respond(model, pdu):
+	function = pdu[0]
+	try:
+		if function == 3:
+			start, count = struct.unpack(">HH", pdu[1:5])
+			if not 1 <= count <= MAX_BLOCK:
+				raise ModbusError(ILLEGAL_VALUE)
+			if start + count > 0x10000:
+				raise ModbusError(ILLEGAL_ADDRESS)
+			words = model.read(start, count)
+			return struct.pack(">BB" + "H" * count, function, 2 * count, *words)
+		if function == 6:
+			address, value = struct.unpack(">HH", pdu[1:5])
+			model.write(address, [value])
+			return pdu[:5]
+		if function == 16:
+			start, count, size = struct.unpack(">HHB", pdu[1:6])
+			if size != 2 * count or len(pdu) < 6 + size:
+				raise ModbusError(ILLEGAL_VALUE)
+			if start + count > 0x10000:
+				raise ModbusError(ILLEGAL_ADDRESS)
+			model.write(start, struct.unpack(">" + "H" * count, pdu[6:6 + size]))
+			return pdu[:5]
+		raise ModbusError(ILLEGAL_FUNCTION)
+	except struct.error:
+		return bytes([function | 0x80, ILLEGAL_VALUE])
+	except ModbusError as e:
+		return bytes([function | 0x80, e.code])
+
+
+#subroutine to read exactly size bytes, None if the connection closed
+def _recv(sock, size):
+	data = b""
+	while len(data) < size:
+		chunk = sock.recv(size - len(data))
+		if not chunk:
+			return None
+		data += chunk
+	return data
+
+
+class ModbusHandler(socketserver.BaseRequestHandler):
+	def handle(self):
+		sim = self.server.simulator
+		sock = self.request
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		while True:
+			try:
+				header = _recv(sock, 7)
+				if header is None:
+					return
+				transaction, protocol, length, unit = struct.unpack(">HHHB", header)
+				pdu = _recv(sock, length - 1)
+				if pdu is None:
+					return
+			except OSError:
+				return
+			outcome = sim.faults.apply()
+			if outcome == DISCONNECT:
+				sim.disconnects += 1
+				return
+			if outcome == DROP:
+				continue
+			reply = respond(sim.model, pdu)
+			sim.requests += 1
+			try:
+				sock.sendall(struct.pack(">HHHB", transaction, protocol, len(reply) + 1, unit) + reply)
+			except OSError:
+				return
+
+
+class _Server(socketserver.ThreadingTCPServer):
+	allow_reuse_address = True
+	daemon_threads = True
+
+
+class ChamberSimulator:
+	#port=0 picks a free port, see address
+	def __init__(self, host="127.0.0.1", port=5020, model=None, faults=None):
+		self.model = model if model is not None else ChamberModel()
+		self.faults = faults if faults is not None else Faults()
+		self.server = _Server((host, port), ModbusHandler)
+		self.server.simulator = self
+		self.thread = None
+		self.requests = 0 #requests answered
+		self.disconnects = 0 #connections dropped on purpose
+
+	@property
+	def address(self):
+		return self.server.server_address
+
+	def start(self):
+		self.thread = threading.Thread(target=self.server.serve_forever, name="ChamberSimulator", daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+		if self.thread is not None:
+			self.thread.join()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+
+def main():
+	host = "127.0.0.1"
+	port = 5020
+	model = {}
+	faults = Faults()
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hH:p:T:t:s:n:" + OPTIONS,
+			["help", "host=", "port=", "temp=", "tau=", "speed=", "noise="] + LONG_OPTIONS)
+	except getopt.GetoptError as err:
+		print(err)
+		helpexit()
+	for o, a in opts:
+		if o in ("-h", "--help"):
+			helpexit()
+		elif o in ("-H", "--host"):
+			host = a
+		elif o in ("-p", "--port"):
+			port = int(a)
+		elif o in ("-T", "--temp"):
+			model["temperature"] = float(a)
+		elif o in ("-t", "--tau"):
+			model["tau"] = float(a)
+		elif o in ("-s", "--speed"):
+			model["speed"] = float(a)
+		elif o in ("-n", "--noise"):
+			model["noise"] = float(a)
+		elif not parse_option(faults, o, a):
+			assert False, "unhandled option"
+
+	sim = ChamberSimulator(host, port, ChamberModel(**model), faults)
+	print("Simulated chamber on " + str(sim.address[0]) + ":" + str(sim.address[1]) + " with " + repr(faults))
+	sim.start()
+	try:
+		while True:
+			time.sleep(10)
+			print("Temp: " + format(sim.model.temperature, '.2f') + " C, set point: " + format(sim.model.set_point, '.1f') +
+				" C, requests: " + str(sim.requests))
+	except KeyboardInterrupt:
+		pass
+	sim.stop()
+
+
+def helpexit():
+	print("-h --help                        : display help message")
+	print("-H --host       [address]        : address to listen on (default 127.0.0.1)")
+	print("-p --port       [int value]      : port to listen on (default 5020)")
+	print("-T --temp       [float value]    : starting chamber temperature in C (default 23)")
+	print("-t --tau        [seconds]        : time constant of the chamber (default 600)")
+	print("-s --speed      [float value]    : simulated seconds per second (default 1)")
+	print("-n --noise      [C]              : std. dev of the reported temperature")
+	for line in help_lines():
+		print(line)
+	print("\n")
+	print("Point the controllers at the simulator with EC_HOST and EC_PORT")
+	sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
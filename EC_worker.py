@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# Background acquisition thread for the
+# Environmental Chamber's Watlow F4T panel
+
+# The worker owns the Modbus client. It polls the chamber on its own
+# schedule and runs queued writes in between polls, so a slow or
+# disconnected chamber never blocks the GUI thread. Results are
+# published on a queue that the GUI drains from a short after() callback.
+
+import queue
+import threading
+import time
+
+import pymodbus
+
+from EC_registers import read_snapshot, encode, POLL_FIELDS, REGISTERS
+
+#sentinel used to wake the worker up when stopping
+_STOP = object()
+
+
+class ChamberWorker(threading.Thread):
+	def __init__(self, client, period=0.5, fields=POLL_FIELDS, on_snapshot=None):
+		threading.Thread.__init__(self, name="ChamberWorker", daemon=True)
+		self.client = client
+		self.period = period #seconds between polls
+		self.fields = tuple(fields)
+		self.on_snapshot = on_snapshot #optional function called on this thread with each snapshot
+
+		#SimpleQueue has no task tracking and never blocks the producer
+		self.events = queue.SimpleQueue() #(kind, payload) published to the GUI
+		self.commands = queue.SimpleQueue() #(name, function, args) run on this thread
+
+		self.connected = False
+		self.latest = None #most recent snapshot, replaced atomically
+		self._stopped = threading.Event()
+
+	#queue a call to run on the worker thread
+	def submit(self, name, func, *args):
+		self.commands.put((name, func, args))
+
+	def stop(self):
+		self._stopped.set()
+		self.commands.put(_STOP)
+
+	#return every event published since the last drain without blocking
+	def drain(self):
+		events = []
+		while True:
+			try:
+				events.append(self.events.get_nowait())
+			except queue.Empty:
+				return events
+
+	#chamber commands, safe to call from any thread
+	def set_temp(self, temp):
+		self.submit("set_temp", self._write_set_point, temp)
+
+	def start_profile(self, number):
+		self.submit("start_profile", self._start_profile, int(number))
+
+	def pause_profile(self):
+		self.submit("pause_profile", self.client.write_registers, 16566, 146)
+
+	def resume_profile(self):
+		self.submit("resume_profile", self.client.write_registers, 16564, 147)
+
+	def terminate_profile(self, set_point):
+		self.submit("terminate_profile", self._terminate_profile, set_point)
+
+	def _write_set_point(self, temp):
+		#float as two registers, low word first, the same layout the F4T reads back
+		address, kind = REGISTERS["set_point"]
+		self.client.write_registers(address, encode(temp, kind))
+
+	def _start_profile(self, number):
+		self.client.write_registers(16558, number) #Load profile number
+		self.client.write_registers(16562, 1782) #Start process controller
+
+	def _terminate_profile(self, set_point):
+		self.client.write_registers(16566, 148)
+		time.sleep(1) #delay to allow termination to finish
+		self._write_set_point(set_point)
+
+	def _disconnect(self):
+		if self.connected:
+			print("No Chamber Connection")
+		self.connected = False
+		self.events.put(("disconnected", None))
+
+	def _poll(self):
+		#attempt to reconnect if chamber disconnected
+		if not self.connected:
+			self.client.connect()
+			if not self.client.is_socket_open():
+				self._disconnect()
+				return
+			self.connected = True
+			print("Chamber Connected!")
+			self.events.put(("connected", None))
+		try:
+			snap = read_snapshot(self.client, self.fields)
+		except (pymodbus.exceptions.ModbusException, AttributeError):
+			self._disconnect()
+			return
+		self.latest = snap
+		if self.on_snapshot is not None:
+			self.on_snapshot(snap)
+		self.events.put(("snapshot", snap))
+
+	def _execute(self, command):
+		name, func, args = command
+		try:
+			func(*args)
+		except (pymodbus.exceptions.ModbusException, AttributeError):
+			self.events.put(("error", name))
+			self._disconnect()
+
+	def run(self):
+		next_poll = time.monotonic()
+		while not self._stopped.is_set():
+			#run queued commands until the next poll is due
+			try:
+				command = self.commands.get(timeout = max(0, next_poll - time.monotonic()))
+			except queue.Empty:
+				command = None
+			if command is _STOP:
+				break
+			if command is not None:
+				self._execute(command)
+				continue
+			self._poll()
+			#skip polls that were missed while the chamber was unresponsive
+			next_poll = max(next_poll + self.period, time.monotonic())
+		self.client.close()
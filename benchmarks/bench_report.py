@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+# Timing summaries and result files shared by the benchmark scripts
+
+# Each benchmark collects a list of durations per operation, reduces it
+# to percentiles with summarise(), and saves every operation along with
+# the machine, Python and git commit to a JSON file in
+# benchmarks/results. compare() lines a run up against an earlier
+# results file, so a slowdown between versions shows up as a ratio.
+
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+PERCENTILES = [50, 90, 99]
+# slowdown that compare() flags as a regression
+THRESHOLD = 0.2
+
+
+# reduce durations in seconds to milliseconds statistics
+def summarise(samples, errors=0):
+    samples = np.asarray(samples, dtype=np.float64) * 1000
+    summary = {"n": int(len(samples)), "errors": int(errors)}
+    if len(samples):
+        summary["mean_ms"] = float(samples.mean())
+        for p, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+            summary["p" + str(p) + "_ms"] = float(value)
+        summary["max_ms"] = float(samples.max())
+    return summary
+
+
+# CPU time, wall time and peak memory of the process over a with block
+class Usage:
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.cpu = usage.ru_utime + usage.ru_stime
+        return self
+
+    def __exit__(self, *exc):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.result = {
+            "wall_s": time.perf_counter() - self.wall,
+            "cpu_s": usage.ru_utime + usage.ru_stime - self.cpu,
+            "max_rss_mb": usage.ru_maxrss / 1024.0,  # kilobytes on Linux
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def machine():
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+# write results to <out_dir>/<name>_<YYYYMMDD_HHMMSS>.json, returns the path
+def save(name, results, out_dir=RESULTS_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, name + "_" + time.strftime("%Y%m%d_%H%M%S") + ".json")
+    with open(path, "w") as file:
+        json.dump(results, file, indent=1)
+    return path
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+# one line per operation and statistic with the ratio to the baseline, slower ones marked
+def compare(results, baseline, keys=("p50_ms", "p99_ms"), threshold=THRESHOLD):
+    lines = []
+    for op, summary in results["operations"].items():
+        old = baseline.get("operations", {}).get(op)
+        if old is None:
+            continue
+        for key in keys:
+            if key not in summary or not old.get(key):
+                continue
+            ratio = summary[key] / old[key]
+            flag = "  REGRESSION" if ratio > 1 + threshold else ""
+            lines.append(format(op, "<22") + format(key, "<8") + format(old[key], ">12.3f") +
+                         format(summary[key], ">12.3f") + format(ratio, ">8.2f") + "x" + flag)
+    return lines
+
+
+def print_operations(operations):
+    print(format("operation", "<22") + "".join(format(k, ">10") for k in ["n", "mean", "p50", "p90", "p99", "max"]) + "  (ms)")
+    for op, s in operations.items():
+        if not s.get("n"):
+            print(format(op, "<22") + format(0, ">10") + "  errors: " + str(s.get("errors", 0)))
+            continue
+        print(format(op, "<22") + format(s["n"], ">10") +
+              "".join(format(s[k], ">10.3f") for k in ["mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"]) +
+              ("  errors: " + str(s["errors"]) if s["errors"] else ""))
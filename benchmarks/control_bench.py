@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+# Benchmark of the chamber and blackbody control loops
+#
+#   python benchmarks/control_bench.py [-n count] [-s speed] [-k steps] [-m minutes] [-b baseline.json] [fault options]
+#
+# Runs the control code against EC_simulator.py and BB_simulator.py in
+# this process and reports latency percentiles of:
+#   decode           decoding one poll's registers (EC_registers)
+#   modbus_read      one read_snapshot() of the GUI poll fields
+#   modbus_write     one set point write (ChamberWorker)
+#   gui_refresh      the work of one update() tick: draining the worker and formatting the labels
+#   tick_late        how late each update() tick fires after its after() delay
+#   step_transition  from a step's deadline on the chamber clock until the chamber has the new set point
+#   bb_query         one MDA query and reply over the pseudo terminal (BlackbodyLink)
+#   bb_set           one DA command
+# The update() loop runs a simulated multi-hour custom program with the
+# chamber clock sped up, following the same step logic as the GUI's
+# update_time(), so tkinter is not needed. CPU time and peak memory are
+# for the whole process, simulators included. Results are saved to
+# benchmarks/results and can be compared against an earlier file.
+
+import getopt
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymodbus
+from pymodbus.client import ModbusTcpClient
+
+from EC_registers import POLL_FIELDS, plan_blocks, decode, read_snapshot
+from EC_simulator import ChamberSimulator, ChamberModel
+from EC_worker import ChamberWorker
+from fault_injection import Faults, OPTIONS, LONG_OPTIONS, parse_option, help_lines
+from bench_report import Usage, summarise, machine, save, load, compare, print_operations, RESULTS_DIR
+
+# errors the controllers treat as a lost chamber
+CHAMBER_ERRORS = (pymodbus.exceptions.ModbusException, AttributeError)
+
+
+# ---------------------------------------------------------------- chamber
+
+def bench_decode(count):
+    blocks = plan_blocks(POLL_FIELDS)
+    rng = np.random.default_rng(0)
+    words = [rng.integers(0, 0x10000, size=block_count).tolist() for _, block_count, _ in blocks]
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        values = {}
+        for (_, _, members), registers in zip(blocks, words):
+            for name, offset, kind in members:
+                values[name] = decode(registers, offset, kind)
+        samples.append(time.perf_counter() - start)
+    return summarise(samples)
+
+
+def bench_read(address, count):
+    client = ModbusTcpClient(*address, timeout=3)
+    client.connect()
+    samples = []
+    errors = 0
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            read_snapshot(client, POLL_FIELDS)
+        except CHAMBER_ERRORS:
+            errors += 1
+            client.close()
+            client.connect()
+            continue
+        samples.append(time.perf_counter() - start)
+    client.close()
+    return summarise(samples, errors)
+
+
+def bench_write(address, count):
+    client = ModbusTcpClient(*address, timeout=3)
+    client.connect()
+    worker = ChamberWorker(client)  # not started, only its write is timed
+    samples = []
+    errors = 0
+    for i in range(count):
+        start = time.perf_counter()
+        try:
+            worker._write_set_point(20 + i % 10)
+        except CHAMBER_ERRORS:
+            errors += 1
+            client.close()
+            client.connect()
+            continue
+        samples.append(time.perf_counter() - start)
+    client.close()
+    return summarise(samples, errors)
+
+
+# a custom program of `temps` held for `hold` chamber seconds each, driven like the GUI
+# returns summaries of gui_refresh, tick_late and step_transition and the tick drift
+def bench_profile(sim, temps, hold, tick=0.1, poll=0.5):
+    model = sim.model
+    client = ModbusTcpClient(*sim.address, timeout=3)
+    worker = ChamberWorker(client, period=poll)
+    worker.start()
+
+    refresh = []
+    late = []
+    transitions = []
+    pending = None  # (deadline on the monotonic clock, set point) waiting for the chamber
+    step = 0
+    step_start = None  # chamber time of day of the first snapshot in the step
+    shown = None  # label text the GUI would display after the last refresh
+    worker.set_temp(temps[0])
+
+    first = time.monotonic()
+    due = first
+    ticks = 0
+    while True:
+        now = time.monotonic()
+        late.append(max(0, now - due))
+        ticks += 1
+        start = time.perf_counter()
+
+        # update(): keep the newest snapshot and format the labels
+        snap = None
+        for kind, payload in worker.drain():
+            if kind == "snapshot":
+                snap = payload
+        if snap is not None:
+            # formatting the label text is part of the timed refresh, only the configure() calls are left out
+            shown = ("Current Temperature: " + "{:.1f}".format(snap.temperature) + " C\nSet Point: " +
+                      "{:.1f}".format(snap.set_point) + " C", "Current Humidity: " + "{:.1f}".format(snap.humidity) + "%",
+                      snap.time_str)
+            # update_time(): move to the next step once the hold has passed on the chamber clock
+            if step_start is None:
+                step_start = snap.time_of_day
+            elapsed = (snap.time_of_day - step_start) % 86400
+            if elapsed >= hold and pending is None:
+                deadline = model.start + ((step_start + hold - model.clock_start) % 86400) / model.speed
+                step += 1
+                if step == len(temps):
+                    refresh.append(time.perf_counter() - start)
+                    break
+                worker.set_temp(temps[step])
+                pending = (deadline, temps[step])
+                step_start = None
+        refresh.append(time.perf_counter() - start)
+
+        if pending is not None and model.set_point_changed is not None and model.set_point_changed >= pending[0] \
+                and abs(model.set_point - pending[1]) < 1e-3:
+            transitions.append(model.set_point_changed - pending[0])
+            pending = None
+
+        # after(tick, update) is relative to when update() runs, so late ticks push the rest back
+        due = now + tick
+        time.sleep(max(0, due - time.monotonic()))
+
+    worker.stop()
+    worker.join()
+    # from the first tick to the start of the last one
+    total = now - first
+    drift = {
+        "ticks": ticks,
+        "wall_s": total,
+        "expected_s": (ticks - 1) * tick,
+        "drift_s": total - (ticks - 1) * tick,
+        "chamber_hours": (len(temps) * hold) / 3600.0,
+        "transition_chamber_s": [t * model.speed for t in transitions],
+        "last_labels": list(shown) if shown is not None else None,
+    }
+    return summarise(refresh), summarise(late), summarise(transitions), drift
+
+
+# ---------------------------------------------------------------- blackbody
+
+def bench_blackbody(count, faults):
+    from BB_simulator import PtyBlackbody
+    from BB_transport import SerialLink, LINK_ERRORS
+    from BB_sweep import parse_temp
+
+    query = []
+    set_times = []
+    errors = 0
+    with PtyBlackbody(faults=faults) as bb:
+        link = SerialLink(port=bb.port, backoff=0.1)
+        link.open()
+        for i in range(count):
+            start = time.perf_counter()
+            try:
+                link.command("DA" + format(20 + i % 10, '.1f'))
+            except LINK_ERRORS:
+                errors += 1
+                continue
+            set_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            try:
+                reply = link.command("MDA", reply=True)
+            except LINK_ERRORS:
+                errors += 1
+                continue
+            if parse_temp(reply) is None:
+                errors += 1
+                continue
+            query.append(time.perf_counter() - start)
+        link.close()
+    return summarise(query, errors), summarise(set_times)
+
+
+def main():
+    count = 500
+    speed = 360.0
+    steps = 6
+    hold = 30.0  # minutes on the chamber clock
+    poll = 0.5
+    tick = 0.1
+    out_dir = RESULTS_DIR
+    baseline = None
+    blackbody = True
+    faults = Faults(seed=0)
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hn:s:k:m:p:t:o:b:B" + OPTIONS,
+                                   ["help", "count=", "speed=", "steps=", "hold=", "poll=", "tick=", "outdir=",
+                                    "baseline=", "no-blackbody"] + LONG_OPTIONS)
+    except getopt.GetoptError as err:
+        print(err)
+        helpexit()
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            helpexit()
+        elif o in ("-n", "--count"):
+            count = int(a)
+        elif o in ("-s", "--speed"):
+            speed = float(a)
+        elif o in ("-k", "--steps"):
+            steps = int(a)
+        elif o in ("-m", "--hold"):
+            hold = float(a)
+        elif o in ("-p", "--poll"):
+            poll = float(a)
+        elif o in ("-t", "--tick"):
+            tick = float(a)
+        elif o in ("-o", "--outdir"):
+            out_dir = a
+        elif o in ("-b", "--baseline"):
+            baseline = a
+        elif o in ("-B", "--no-blackbody"):
+            blackbody = False
+        elif not parse_option(faults, o, a):
+            assert False, "unhandled option"
+
+    results = {
+        "benchmark": "control",
+        "machine": dict(machine(), pymodbus=pymodbus.__version__),
+        "options": {"count": count, "speed": speed, "steps": steps, "hold_min": hold, "poll_s": poll, "tick_s": tick,
+                    "faults": repr(faults)},
+        "operations": {},
+        "usage": {},
+    }
+    ops = results["operations"]
+    temps = [25 + 5 * (i % 4) for i in range(steps)]
+
+    with Usage() as usage:
+        ops["decode"] = bench_decode(count * 10)
+    results["usage"]["decode"] = usage.result
+
+    with ChamberSimulator(port=0, model=ChamberModel(tau=600, speed=speed), faults=faults) as sim:
+        with Usage() as usage:
+            ops["modbus_read"] = bench_read(sim.address, count)
+            ops["modbus_write"] = bench_write(sim.address, count)
+        results["usage"]["modbus"] = usage.result
+        print("Running a " + format(steps * hold / 60, '.1f') + " hour program at " + format(speed, 'g') + "x...")
+        with Usage() as usage:
+            ops["gui_refresh"], ops["tick_late"], ops["step_transition"], results["drift"] = \
+                bench_profile(sim, temps, hold * 60, tick, poll)
+        results["usage"]["profile"] = usage.result
+        results["simulator"] = {"requests": sim.requests, "disconnects": sim.disconnects, "faults": dict(faults.counts)}
+
+    if blackbody:
+        with Usage() as usage:
+            ops["bb_query"], ops["bb_set"] = bench_blackbody(count, faults)
+        results["usage"]["blackbody"] = usage.result
+
+    print_operations(ops)
+    drift = results["drift"]
+    print("Tick drift: " + format(drift["drift_s"], '.3f') + " s over " + str(drift["ticks"]) + " ticks (" +
+          format(drift["wall_s"], '.1f') + " s)")
+    for section, usage in results["usage"].items():
+        print(format(section, "<12") + "cpu " + format(usage["cpu_s"], '.2f') + " s of " + format(usage["wall_s"], '.2f') +
+              " s, peak memory " + format(usage["max_rss_mb"], '.1f') + " MB")
+    print("Saved " + save("control", results, out_dir))
+
+    if baseline is not None:
+        print("\n" + format("operation", "<22") + format("stat", "<8") + format("baseline", ">12") + format("now", ">12") + format("ratio", ">9"))
+        for line in compare(results, load(baseline)):
+            print(line)
+    return 0
+
+
+def helpexit():
+    print("-h --help                        : display help message")
+    print("-n --count      [int value]      : repetitions of each timed operation (default 500)")
+    print("-s --speed      [float value]    : chamber clock speed-up for the program (default 360)")
+    print("-k --steps      [int value]      : steps in the program (default 6)")
+    print("-m --hold       [minutes]        : chamber minutes each step is held (default 30)")
+    print("-p --poll       [seconds]        : ChamberWorker poll period (default 0.5)")
+    print("-t --tick       [seconds]        : update() tick (default 0.1)")
+    print("-o --outdir     [folder]         : where results are saved (default benchmarks/results)")
+    print("-b --baseline   [file.json]      : compare against earlier results")
+    print("-B --no-blackbody                : skip the blackbody benchmark")
+    for line in help_lines():
+        print(line)
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+# Benchmark of the radiometer analysis pipeline on synthetic captures
+#
+#   python benchmarks/pipeline_bench.py [-H hours,...] [-r rates,...] [-n repeats] [-w folder] [-b baseline.json]
+#
+# Writes a synthetic sensor log (radiometer.synthetic) for every
+# combination of capture length and sample rate, then times each stage
+# of radiometer.pipeline on it:
+#   load_cold     parsing the CSV into the memory-mapped column cache
+#   load_warm     opening the cache
+#   segment       cutting the log into hold windows
+#   smooth        rolling average of every window
+#   stats         per window statistics of the channels and thermistors
+#   fit           BB temp against voltage for every chamber temp
+#   planck        band radiance over the lookup table grid (load_lut without its cache)
+#   convert       voltages to temperatures with the fits and thermistor drift
+#   artifact      writing the run's .npz
+#   figures       decimating the series and rendering the report figures
+#   csv           the notebook's csv files, with -c
+# Each stage is repeated -n times for its timing and then run once more
+# under tracemalloc for its peak memory. Memory-mapped columns are not
+# counted by tracemalloc, the process peak RSS of each capture is
+# reported as well. Results are saved to benchmarks/results and can be
+# compared against an earlier file.
+
+import getopt
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from radiometer import CHANNELS, THERMISTORS
+from radiometer import pipeline
+from radiometer.loader import cache_dir
+from radiometer.lut import load_lut
+from radiometer.report import Renderer, submit_figures
+from radiometer.synthetic import SyntheticSensor, synthetic_config
+from bench_report import Usage, summarise, machine, save, load, compare, RESULTS_DIR
+
+# chamber temps cycled every 12 hours in captures longer than one chamber step
+CHAMBER_TEMPS = (25, 10, 40)
+
+
+# time func over repeats calls, setup runs untimed before each one
+# returns the summary, with peak_mb from one more call under tracemalloc, and the last result
+def measure(func, repeats=1, memory=True, setup=None):
+    samples = []
+    result = None
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    summary = summarise(samples)
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            result = func()
+            summary["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return summary, result
+
+
+def case_name(hours, rate):
+    return format(hours, 'g') + "h_" + format(rate, 'g') + "hz"
+
+
+# generate one capture in the working folder, reusing one already written with the same settings
+def generate(config, rate, hours, seed):
+    sensor = SyntheticSensor(config, rate, seed, duration_ms=hours * 3600000)
+    stamp = config.sensor_file + ".rows"
+    if os.path.exists(config.sensor_file) and os.path.exists(stamp):
+        with open(stamp) as file:
+            if file.read().strip() == str(sensor.rows):
+                return sensor.rows, None
+    start = time.perf_counter()
+    sensor.write(config.sensor_file)
+    with open(stamp, "w") as file:
+        file.write(str(sensor.rows))
+    return sensor.rows, time.perf_counter() - start
+
+
+# every stage of one capture, returns {stage: summary}
+def bench_case(config, repeats, memory, csv, figures):
+    ops = {}
+
+    def clear_cache():
+        shutil.rmtree(cache_dir(config.sensor_file), ignore_errors=True)
+
+    ops["load_cold"], _ = measure(lambda: pipeline.stage_load(config), repeats, memory, clear_cache)
+    ops["load_warm"], data = measure(lambda: pipeline.stage_load(config), repeats, memory)
+    schedule = pipeline.build_schedule(config)
+    ops["segment"], labelled = measure(lambda: pipeline.stage_segment(config, data, schedule), repeats, memory)
+    ops["smooth"], smoothed = measure(lambda: pipeline.stage_smooth(config, labelled, CHANNELS), repeats, memory)
+    ops["stats"], voltage_stats = measure(lambda: pipeline.stage_stats(config, labelled, CHANNELS + THERMISTORS),
+                                          repeats, memory)
+    ops["fit"], fits = measure(lambda: pipeline.stage_fit(config, voltage_stats), repeats, memory)
+
+    lut_dir = os.path.join("Data", "lut_bench")
+    ops["planck"], lut = measure(lambda: load_lut(pipeline.FILTER_FILE, CHANNELS, cache_dir=lut_dir), repeats, memory,
+                                 lambda: shutil.rmtree(lut_dir, ignore_errors=True))
+    ops["convert"], converted = measure(lambda: pipeline.stage_convert(config, data, fits), repeats, memory)
+
+    # the report stages take the same inputs process() gives them
+    converted_labelled = pipeline.stage_segment(config, converted, schedule)
+    tables = {
+        "schedule": schedule,
+        "voltage_stats": voltage_stats,
+        "smoothed_stats": pipeline.stage_stats(config, smoothed, CHANNELS),
+        "temp_stats": pipeline.stage_stats(config, converted_labelled, CHANNELS),
+        "fits": fits,
+    }
+    series = {"raw": labelled, "smoothed": smoothed, "converted": converted_labelled}
+    os.makedirs(config.out_dir, exist_ok=True)
+    ops["artifact"], _ = measure(lambda: pipeline.stage_artifact(config, schedule, tables, series, {}), repeats, memory)
+
+    if figures:
+        def render():
+            plots = pipeline.stage_plot_data(config, data, labelled, converted)
+            with Renderer(1) as renderer:
+                submit_figures(renderer, config.out_dir, config.name, config.chamber_temps, plots,
+                               config.temp_ranges, lut)
+        ops["figures"], _ = measure(render, repeats, memory)
+    if csv:
+        ops["csv"], _ = measure(lambda: pipeline.stage_csv(config, tables, series), repeats, memory)
+    return ops
+
+
+def print_stages(operations):
+    print(format("stage", "<24") + "".join(format(k, ">11") for k in ["n", "p50 (ms)", "max (ms)", "peak (MB)"]))
+    for op, s in operations.items():
+        print(format(op, "<24") + format(s["n"], ">11") + format(s["p50_ms"], ">11.1f") + format(s["max_ms"], ">11.1f") +
+              (format(s["peak_mb"], ">11.1f") if "peak_mb" in s else ""))
+
+
+def main():
+    hours_list = [12.0, 168.0]
+    rates = [1.0]
+    repeats = 1
+    work_dir = None
+    out_dir = RESULTS_DIR
+    baseline = None
+    memory = True
+    csv = False
+    figures = True
+    seed = 0
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hH:r:n:w:o:b:s:cFM",
+                                   ["help", "hours=", "rates=", "repeats=", "workdir=", "outdir=", "baseline=", "seed=",
+                                    "csv", "no-figures", "no-memory"])
+    except getopt.GetoptError as err:
+        print(err)
+        helpexit()
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            helpexit()
+        elif o in ("-H", "--hours"):
+            hours_list = [float(h) for h in a.split(",")]
+        elif o in ("-r", "--rates"):
+            rates = [float(r) for r in a.split(",")]
+        elif o in ("-n", "--repeats"):
+            repeats = int(a)
+        elif o in ("-w", "--workdir"):
+            work_dir = os.path.abspath(a)
+        elif o in ("-o", "--outdir"):
+            out_dir = os.path.abspath(a)
+        elif o in ("-b", "--baseline"):
+            baseline = os.path.abspath(a)
+        elif o in ("-s", "--seed"):
+            seed = int(a)
+        elif o in ("-c", "--csv"):
+            csv = True
+        elif o in ("-F", "--no-figures"):
+            figures = False
+        elif o in ("-M", "--no-memory"):
+            memory = False
+        else:
+            assert False, "unhandled option"
+
+    # the pipeline works relative to the current folder, as it does in the repo
+    keep = work_dir is not None
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    os.makedirs(os.path.join(work_dir, "Data"), exist_ok=True)
+    shutil.copy(os.path.join(ROOT, pipeline.FILTER_FILE), os.path.join(work_dir, pipeline.FILTER_FILE))
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+
+    results = {
+        "benchmark": "pipeline",
+        "machine": machine(),
+        "options": {"hours": hours_list, "rates": rates, "repeats": repeats, "seed": seed, "csv": csv,
+                    "figures": figures, "memory": memory},
+        "operations": {},
+        "captures": {},
+    }
+    try:
+        for hours in hours_list:
+            for rate in rates:
+                name = case_name(hours, rate)
+                config = synthetic_config(hours, CHAMBER_TEMPS, name="synthetic_" + name)
+                print("Generating " + name + "...")
+                rows, generate_s = generate(config, rate, hours, seed)
+                print("Benchmarking " + name + " (" + str(rows) + " rows, chamber temps " +
+                      str(sorted(set(config.chamber_temps))) + ")...")
+                with Usage() as usage:
+                    ops = bench_case(config, repeats, memory, csv, figures)
+                results["captures"][name] = dict(usage.result, rows=rows, hours=hours, rate_hz=rate,
+                                                 csv_mb=os.path.getsize(config.sensor_file) / 2 ** 20,
+                                                 generate_s=generate_s)
+                for stage, summary in ops.items():
+                    results["operations"][name + "/" + stage] = summary
+    finally:
+        os.chdir(cwd)
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_stages(results["operations"])
+    for name, capture in results["captures"].items():
+        print(format(name, "<12") + format(capture["rows"], ">10") + " rows, " + format(capture["csv_mb"], '.0f') +
+              " MB csv, cpu " + format(capture["cpu_s"], '.1f') + " s of " + format(capture["wall_s"], '.1f') +
+              " s, peak memory " + format(capture["max_rss_mb"], '.0f') + " MB")
+    print("Saved " + save("pipeline", results, out_dir))
+
+    if baseline is not None:
+        print("\n" + format("operation", "<22") + format("stat", "<8") + format("baseline", ">12") + format("now", ">12") + format("ratio", ">9"))
+        for line in compare(results, load(baseline), keys=("p50_ms", "peak_mb")):
+            print(line)
+    return 0
+
+
+def helpexit():
+    print("-h --help                        : display help message")
+    print("-H --hours      [h1,h2,...]      : capture lengths in hours (default 12,168)")
+    print("-r --rates      [r1,r2,...]      : sample rates in Hz (default 1)")
+    print("-n --repeats    [int value]      : timed repetitions of each stage (default 1)")
+    print("-w --workdir    [folder]         : keep the synthetic captures here and reuse them (default a temporary folder)")
+    print("-o --outdir     [folder]         : where results are saved (default benchmarks/results)")
+    print("-b --baseline   [file.json]      : compare against earlier results")
+    print("-s --seed       [int value]      : random seed of the synthetic captures (default 0)")
+    print("-c --csv                         : also time writing the csv files")
+    print("-F --no-figures                  : skip rendering the report figures")
+    print("-M --no-memory                   : skip the tracemalloc runs")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
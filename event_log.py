@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+# Buffered CSV event log for the chamber and blackbody controllers
+
+# Rows are handed to a background thread through a queue, so logging
+# never touches the disk on the caller's thread. The thread keeps rows
+# in a write buffer and flushes and fsyncs them on a timer, or right
+# away when sync() is called at a step transition. Once the file grows
+# past max_bytes it is rotated to path.1, path.2, ...
+
+import csv
+import os
+import queue
+import threading
+import time
+
+#sentinels sent through the queue
+_SYNC = object()
+_STOP = object()
+
+
+class EventLog(threading.Thread):
+    def __init__(self, path, flush_interval=10.0, max_bytes=10 * 1024 * 1024, backups=5):
+        threading.Thread.__init__(self, name="EventLog", daemon=True)
+        self.path = path
+        self.flush_interval = flush_interval  # seconds between writes to disk
+        self.max_bytes = max_bytes            # size that triggers a rotation
+        self.backups = backups                # number of rotated files to keep
+        self.rows = queue.SimpleQueue()
+        self.file = None
+        self.writer = None
+
+    # add a row of the event name and its fields, stamped with the local time of day
+    # safe to call from any thread
+    def log(self, event, *fields):
+        self.rows.put((time.strftime("%H:%M:%S"), event) + fields)
+
+    # write everything logged so far to disk, used at step transitions
+    def sync(self):
+        self.rows.put(_SYNC)
+
+    def close(self):
+        self.rows.put(_STOP)
+        self.join()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.file = open(self.path, "a", newline="", buffering=64 * 1024)
+        self.writer = csv.writer(self.file)
+
+    def _flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        if self.file.tell() >= self.max_bytes:
+            self._rotate()
+
+    # shift path -> path.1 -> path.2 ..., dropping the oldest
+    def _rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(self.path + "." + str(i)):
+                os.replace(self.path + "." + str(i), self.path + "." + str(i + 1))
+        if self.backups > 0:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def run(self):
+        self._open()
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                row = self.rows.get(timeout = max(0, next_flush - time.monotonic()))
+            except queue.Empty:
+                row = None
+            if row is _STOP:
+                break
+            if row is not None and row is not _SYNC:
+                self.writer.writerow(row)
+                if time.monotonic() < next_flush:
+                    continue
+            self._flush()
+            next_flush = time.monotonic() + self.flush_interval
+        self._flush()
+        self.file.close()
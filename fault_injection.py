@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+# Link faults for the chamber and blackbody simulators
+
+# Each request a simulator receives is first passed through a Faults
+# object, which can delay the reply, drop it as if the packet was lost,
+# or drop the whole connection. Faults are drawn from a seeded random
+# generator, so a benchmark run with the same settings sees the same
+# sequence of faults every time.
+
+import random
+import threading
+import time
+
+# what a simulator should do with a request
+REPLY = "reply"
+DROP = "drop"
+DISCONNECT = "disconnect"
+
+
+class Faults:
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, disconnect=0.0, seed=None):
+        self.latency = latency        # seconds added to every reply
+        self.jitter = jitter          # extra seconds, uniform between 0 and jitter
+        self.loss = loss              # chance a request gets no reply
+        self.disconnect = disconnect  # chance a request drops the connection instead
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()  # connections are served from several threads
+        self.counts = {REPLY: 0, DROP: 0, DISCONNECT: 0}
+
+    # decide the fate of one request, sleeping for the latency if it is answered
+    def apply(self):
+        with self.lock:
+            draw = self.random.random()
+            delay = self.latency + self.jitter * self.random.random()
+            if draw < self.disconnect:
+                outcome = DISCONNECT
+            elif draw < self.disconnect + self.loss:
+                outcome = DROP
+            else:
+                outcome = REPLY
+            self.counts[outcome] += 1
+        if outcome == REPLY and delay > 0:
+            time.sleep(delay)
+        return outcome
+
+    def __repr__(self):
+        return ("Faults(latency=" + str(self.latency) + ", jitter=" + str(self.jitter) +
+                ", loss=" + str(self.loss) + ", disconnect=" + str(self.disconnect) + ")")
+
+
+# options shared by the simulator command lines, as getopt short and long options
+OPTIONS = "l:j:x:d:r:"
+LONG_OPTIONS = ["latency=", "jitter=", "loss=", "disconnect=", "seed="]
+
+
+# subroutine to fill in a Faults from parsed getopt options, returns True if the option was one of them
+def parse_option(faults, o, a):
+    if o in ("-l", "--latency"):
+        faults.latency = float(a) / 1000
+    elif o in ("-j", "--jitter"):
+        faults.jitter = float(a) / 1000
+    elif o in ("-x", "--loss"):
+        faults.loss = float(a)
+    elif o in ("-d", "--disconnect"):
+        faults.disconnect = float(a)
+    elif o in ("-r", "--seed"):
+        faults.random.seed(int(a))
+    else:
+        return False
+    return True
+
+
+def help_lines():
+    return [
+        "-l --latency    [ms]             : delay added to every reply",
+        "-j --jitter     [ms]             : random extra delay, up to this much",
+        "-x --loss       [0-1]            : chance a request gets no reply",
+        "-d --disconnect [0-1]            : chance a request drops the connection",
+        "-r --seed       [int value]      : seed for the fault sequence",
+    ]
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+
+# Nested chamber x blackbody sweep on one timeline
+#
+#   python nested_sweep.py -c 10,25,40 -b 5 -e 55 -s 5 -d 5 -o sweep.txt [-m mode] [-t tolerance] [-w minutes] [-W minutes]
+#                          [-a tolerance] [-n seconds] [-k minutes] [-r radiometer.csv] [-F ratio]
+#
+# For each chamber set point the chamber is set and the scheduler waits
+# until its temperature has stayed within the tolerance band for the
+# settle time (or until the longest settle time has passed), then runs
+# the whole blackbody sweep with BB_sweep.BlackbodySweep, then moves on.
+# Settling is decided by a stability.Dwell, which can also wait for the
+# radiometer signal to flatten. With -a the blackbody steps use one as
+# well, so each is held until it settles plus -k minutes, at most -d.
+# The blackbody is sent to the first temperature of the sweep while the
+# chamber settles. Like BlackbodySweep, the engine never sleeps on its
+# own: tick() does whatever is due and returns the seconds until it
+# wants to be called again, so it runs from run() on the command line or
+# from after() in a GUI. Every chamber and blackbody step is written to
+# the session file, which radiometer.pipeline reads for the exact hold
+# and chamber windows instead of fixed chamber hold times.
+
+import getopt
+import os
+import sys
+import time
+
+import numpy as np
+
+from BB_sweep import BlackbodySweep
+from BB_transport import make_link, LINK_ERRORS
+from stability import Dwell, SensorTail
+
+# phases of each chamber step
+SETTLING = "settling"
+SWEEPING = "sweeping"
+
+
+class NestedSweep:
+    def __init__(self, worker, link, chamber_temps, bb_temps, delay, outfile, tolerance=0.5, settle=10,
+                 max_settle=180, poll_interval=10, query="MDA", final_temp=25, check_interval=1.0,
+                 recorder=None, event_log=None, bb_dwell=None, flatness=None, signal=None):
+        self.worker = worker                  # started EC_worker.ChamberWorker
+        self.link = link                      # open BB_transport link
+        self.chamber_temps = list(chamber_temps)
+        self.bb_temps = list(bb_temps)        # blackbody set points run at every chamber temp
+        self.delay = delay                    # minutes each blackbody temp is held
+        self.outfile = outfile                # blackbody readings go to <outfile>_<chamber temp>C.txt
+        # chamber within tolerance C of its set point for settle minutes, sweeping anyway after max_settle
+        # with flatness and signal the radiometer channels have to have flattened too
+        self.dwell = Dwell(tolerance, settle * 60, max_settle * 60, flatness=flatness, signal=signal)
+        self.bb_dwell = bb_dwell              # optional stability.Dwell for every blackbody step
+        self.poll_interval = poll_interval
+        self.query = query
+        self.final_temp = final_temp          # chamber set point once finished, None leaves it
+        self.check_interval = check_interval  # seconds between looks at the chamber while it settles
+        self.recorder = recorder              # optional session_log recorder
+        self.event_log = event_log            # optional event_log
+
+        self.index = -1
+        self.phase = None
+        self.sweep = None
+        self.last_snap = None                 # chamber reading already given to the dwell
+        self.settle_times = []                # seconds each chamber temp took to settle, None if it timed out
+        self.start_time = None
+        self.finished = False
+
+    @property
+    def chamber_set_point(self):
+        if 0 <= self.index < len(self.chamber_temps):
+            return self.chamber_temps[self.index]
+        return None
+
+    def _log(self, event, *fields):
+        if self.event_log is not None:
+            self.event_log.log(event, *fields)
+            self.event_log.sync()
+
+    def start(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.start_time = now
+        if self.recorder is not None:
+            self.recorder.event("chamber_program_start")
+        self._next_chamber(now)
+
+    def _next_chamber(self, now):
+        self.index += 1
+        if self.index >= len(self.chamber_temps):
+            self._finish()
+            return
+        temp = self.chamber_set_point
+        print("Chamber:" + format(temp, '.1f') + "C")
+        self.worker.set_temp(temp)
+        if self.recorder is not None:
+            self.recorder.event("chamber_step", temp)
+        self._log("chamber_step", self.index, format(temp, '.1f'))
+        self.phase = SETTLING
+        self.dwell.reset(now, temp)
+        # get the blackbody to its first temperature while the chamber settles
+        # the sweep sets it again, so a lost link only costs the head start
+        try:
+            self.link.command("DA" + format(self.bb_temps[0], '.1f'))
+        except LINK_ERRORS as e:
+            print("Blackbody connection lost: " + str(e))
+
+    # True once the chamber has settled
+    def _chamber_settled(self, now):
+        snap = self.worker.latest
+        # readings from before the set point reached the chamber do not count
+        if not self.worker.connected or snap is None or snap.set_point is None or \
+                abs(snap.set_point - self.chamber_set_point) > 0.05:
+            self.dwell.add(now, None)
+        elif snap is not self.last_snap:
+            self.dwell.add(now, snap.temperature)
+        self.last_snap = snap
+        return self.dwell.check(now)
+
+    def _start_sweep(self, now, settled):
+        temp = self.chamber_set_point
+        if settled:
+            self.settle_times.append(now - self.dwell.start)
+            print("Chamber settled at " + format(temp, '.1f') + "C after " + format((now - self.dwell.start) / 60, '.1f') + " minutes")
+            if self.recorder is not None:
+                self.recorder.event("chamber_stable", temp)
+            self._log("chamber_stable", self.index, format(temp, '.1f'))
+        else:
+            self.settle_times.append(None)
+            print("Chamber did not settle at " + format(temp, '.1f') + "C within " + format(self.dwell.max_dwell / 60, 'g') +
+                  " minutes, sweeping anyway")
+            self._log("chamber_settle_timeout", self.index, format(temp, '.1f'))
+        base, ext = os.path.splitext(self.outfile)
+        self.sweep = BlackbodySweep(self.link, self.bb_temps, self.delay, base + "_" + format(temp, 'g') + "C" + (ext or ".txt"),
+                                    poll_interval=self.poll_interval, query=self.query, recorder=self.recorder,
+                                    event_log=self.event_log, dwell=self.bb_dwell)
+        self.phase = SWEEPING
+        # if the link is lost here the sweep's next tick sets its first temperature
+        self.sweep.start(now)
+
+    # do everything that is due and return seconds until the next deadline, None once finished
+    def tick(self, now=None):
+        if self.finished:
+            return None
+        if now is None:
+            now = time.monotonic()
+        if self.phase == SETTLING:
+            if self._chamber_settled(now):
+                self._start_sweep(now, True)
+            elif self.dwell.done(now):
+                self._start_sweep(now, False)
+            else:
+                return self.check_interval
+        wait = self.sweep.tick(now)
+        if wait is not None:
+            return wait
+        self.sweep = None
+        self._next_chamber(now)
+        if self.finished:
+            return None
+        return 0
+
+    # leave both instruments in a safe state
+    def _finish(self):
+        self.finished = True
+        self.phase = None
+        try:
+            self.link.command("DA" + format(25, '.1f'))
+            self.link.command("DOFF")  # turn off blackbody control
+        except LINK_ERRORS as e:
+            print("Blackbody connection lost: " + str(e))
+        if self.final_temp is not None:
+            self.worker.set_temp(self.final_temp)
+        if self.recorder is not None:
+            self.recorder.event("chamber_program_end")
+        self._log("chamber_program_end", self.index)
+
+    # stop early, safe to call once finished
+    def stop(self):
+        if self.finished:
+            return
+        if self.sweep is not None:
+            self.sweep.stop()
+            self.sweep = None
+        self._finish()
+
+    # one line describing where the sweep is, for labels and the console
+    def status(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if self.finished:
+            return "Nested sweep finished"
+        if self.phase is None:
+            return "Nested sweep ready"
+        text = "Chamber " + format(self.chamber_set_point, '.1f') + "C (" + str(self.index + 1) + " of " + \
+               str(len(self.chamber_temps)) + "): "
+        if self.phase == SETTLING:
+            text += "settling " + format((now - self.dwell.start) / 60, '.1f') + " minutes"
+            if self.dwell.in_band_since is not None:
+                text += ", in band " + format((now - self.dwell.in_band_since) / 60, '.1f') + " of " + \
+                    format(self.dwell.window / 60, 'g')
+            return text
+        return text + "BB " + format(self.sweep.set_point, '.1f') + "C (" + str(self.sweep.index + 1) + " of " + \
+            str(len(self.bb_temps)) + ")"
+
+    # run the whole plan, sleeping between deadlines
+    def run(self):
+        self.start()
+        wait = self.tick()
+        while wait is not None:
+            time.sleep(wait)
+            wait = self.tick()
+
+
+def main():
+    from pymodbus.client import ModbusTcpClient
+
+    from EC_registers import EC_HOST, EC_PORT
+    from EC_worker import ChamberWorker
+    from session_log import SessionRecorder
+    from event_log import EventLog
+
+    chamber_temps = None
+    begin = end = step = delay = None
+    outfile = ""
+    mode = "serial"
+    tolerance = 0.5
+    settle = 10
+    max_settle = 180
+    poll = 10
+    final_temp = 25
+    bb_tolerance = None
+    window = 60
+    keep = 2
+    radiometer = None
+    flatness = 3.0
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hc:b:e:s:d:o:m:t:w:W:p:f:a:n:k:r:F:",
+                                   ["help", "chamber=", "begin=", "end=", "step=", "delay=", "outfile=", "mode=",
+                                    "tolerance=", "settle=", "max-settle=", "poll=", "final=", "adaptive=", "window=",
+                                    "keep=", "radiometer=", "flatness="])
+    except getopt.GetoptError as err:
+        print(err)
+        helpexit()
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            helpexit()
+        elif o in ("-c", "--chamber"):
+            chamber_temps = [float(t) for t in a.split(",")]
+        elif o in ("-b", "--begin"):
+            begin = float(a)
+        elif o in ("-e", "--end"):
+            end = float(a)
+        elif o in ("-s", "--step"):
+            step = float(a)
+        elif o in ("-d", "--delay"):
+            delay = float(a)
+        elif o in ("-o", "--outfile"):
+            outfile = a
+        elif o in ("-m", "--mode"):
+            mode = a
+        elif o in ("-t", "--tolerance"):
+            tolerance = float(a)
+        elif o in ("-w", "--settle"):
+            settle = float(a)
+        elif o in ("-W", "--max-settle"):
+            max_settle = float(a)
+        elif o in ("-p", "--poll"):
+            poll = float(a)
+        elif o in ("-f", "--final"):
+            final_temp = float(a)
+        elif o in ("-a", "--adaptive"):
+            bb_tolerance = float(a)
+        elif o in ("-n", "--window"):
+            window = float(a)
+        elif o in ("-k", "--keep"):
+            keep = float(a)
+        elif o in ("-r", "--radiometer"):
+            radiometer = a
+        elif o in ("-F", "--flatness"):
+            flatness = float(a)
+        else:
+            assert False, "unhandled option"
+
+    if chamber_temps is None or None in (begin, end, step, delay) or not outfile:
+        print("Invalid input. Please try again.")
+        helpexit()
+    if end <= begin or step <= 0 or delay <= 0 or tolerance <= 0 or settle < 0 or max_settle < settle:
+        print("ERROR: Need begin < end, a positive step, delay and tolerance, and a max settle time of at least the settle time")
+        sys.exit(1)
+
+    # hottest first, the same order as the notebook's temp_ranges
+    bb_temps = np.arange(end, begin - step / 2, -step)
+    print("Chamber temperatures: " + str(chamber_temps))
+    print("Blackbody temperatures at each: " + str(bb_temps) + ", held " + format(delay, 'g') + " minutes each")
+    print("Each chamber temperature is held within " + format(tolerance, 'g') + "C for " + format(settle, 'g') +
+          " minutes (at most " + format(max_settle, 'g') + ") before its sweep")
+    signal = None
+    if radiometer is not None:
+        signal = SensorTail(radiometer)
+        print("Waiting for the variance of the radiometer channels in " + radiometer + " to flatten (ratio " +
+              format(flatness, 'g') + ")")
+    else:
+        flatness = None
+    bb_dwell = None
+    if bb_tolerance is not None:
+        if keep * 60 + window > delay * 60 or bb_tolerance <= 0 or window <= 0:
+            print("ERROR: Adaptive dwell needs a positive tolerance and window, and a delay of at least the window plus the keep time")
+            sys.exit(1)
+        bb_dwell = Dwell(bb_tolerance, window, delay * 60, keep * 60, flatness, signal)
+        print("Blackbody temperatures are held until within " + format(bb_tolerance, 'g') + "C for " + format(window, 'g') +
+              " s, then " + format(keep, 'g') + " minutes more (at most " + format(delay, 'g') + " minutes)")
+        if poll > window / 5:
+            poll = window / 5
+            print("Reading the blackbody every " + format(poll, 'g') + " seconds")
+    longest = len(chamber_temps) * (max_settle + len(bb_temps) * delay)
+    print("Longest run time: " + format(longest / 60, '.1f') + " hours")
+
+    base = os.path.splitext(outfile)[0]
+    recorder = SessionRecorder(base + ".ses").open()
+    event_log = EventLog(base + "_events.csv")
+    event_log.start()
+    worker = ChamberWorker(ModbusTcpClient(EC_HOST, port=EC_PORT, timeout=3), on_snapshot=recorder.chamber)
+    worker.start()
+    link = make_link(mode).open()
+    sweep = NestedSweep(worker, link, chamber_temps, bb_temps, delay, outfile, tolerance, settle, max_settle,
+                        poll_interval=poll, final_temp=final_temp, recorder=recorder, event_log=event_log,
+                        bb_dwell=bb_dwell, flatness=flatness, signal=signal)
+    try:
+        sweep.run()
+    except KeyboardInterrupt:
+        print("Stopping")
+    finally:
+        sweep.stop()
+        time.sleep(2 * worker.period)  # let the worker send the final set point
+        worker.stop()
+        worker.join()
+        link.close()
+        recorder.close()
+        event_log.close()
+    print("Session written to " + recorder.path)
+    return 0
+
+
+def helpexit():
+    print("-h --help                        : display help message")
+    print("-c --chamber    [t1,t2,...]      : chamber temperatures, in the order they are run")
+    print("-b --begin      [float value]    : lowest blackbody temperature")
+    print("-e --end        [float value]    : highest blackbody temperature, the sweep starts here")
+    print("-s --step       [float value]    : blackbody temperature step")
+    print("-d --delay      [minutes]        : time each blackbody temperature is held")
+    print("-o --outfile    [file.txt]       : blackbody readings, one file per chamber temperature")
+    print("-m --mode       [string]         : blackbody connection, 'serial' or 'ethernet' (default serial)")
+    print("-t --tolerance  [C]              : band around the chamber set point (default 0.5)")
+    print("-w --settle     [minutes]        : time the chamber must stay in the band (default 10)")
+    print("-W --max-settle [minutes]        : longest wait for the chamber before sweeping anyway (default 180)")
+    print("-p --poll       [seconds]        : time between blackbody readings (default 10)")
+    print("-f --final      [float value]    : chamber set point once finished (default 25)")
+    print("-a --adaptive   [C]              : hold each blackbody temp until its readings stay within this band, -d is the longest hold")
+    print("-n --window     [seconds]        : time the blackbody must stay in the band (default 60)")
+    print("-k --keep       [minutes]        : time each blackbody temp is held once settled (default 2)")
+    print("-r --radiometer [file.csv]       : sensor log being captured, settling also waits for its channels to flatten")
+    print("-F --flatness   [float value]    : largest variance ratio between the halves of the window (default 3)")
+    print("\n")
+    print("The session file (outfile with .ses) holds the exact step times, process the capture with")
+    print("session_file set to it so the windows come from the steps instead of fixed hold times")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
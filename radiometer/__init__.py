@@ -0,0 +1,7 @@
+# Analysis code for radiometer captures, shared by radiometer_jupyter.ipynb
+# and the command line tools in this package
+
+# Column names written by the sensor board
+CHANNELS = ["T1CA(v)", "T1CB(v)", "T1CC(v)", "T1CD(v)", "T2CA(v)", "T2CB(v)", "T2CC(v)", "T2CD(v)"]
+THERMISTORS = ["T1Therm(c)", "T2Therm(c)"]
+TIME = "Time(ms)"
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+# Batch re-processing of radiometer runs
+#
+#   python -m radiometer [-j jobs] [-W workers] [-m manifest.json] [-f] [-c cache | -n] [-s] [-w] [-k catalog | -K] [run names...]
+#
+# With no run names or manifest every run in Reports with a sensor csv in
+# Data is processed. Runs whose inputs, config and code are unchanged since
+# their last processing are skipped, and changed runs reuse every cached
+# stage their change does not affect. Runs are processed -j at a time,
+# and each run can render its figures in a pool of -W processes. Processed runs are then added to
+# the cross-run catalog (see catalog.py).
+
+import getopt
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from radiometer.cache import CACHE_DIR, code_version
+from radiometer.catalog import CATALOG, Catalog
+from radiometer.pipeline import run_config, load_manifest, report_runs, process_if_changed
+
+
+# worker function, returns (name, status, seconds)
+def _run(config, force, version, cache_dir, plots, csv, workers):
+    start = time.time()
+    try:
+        status = process_if_changed(config, force, version, cache_dir, plots, csv, workers)
+    except Exception as e:
+        status = "failed: " + type(e).__name__ + ": " + str(e)
+    return config.name, status, time.time() - start
+
+
+def main():
+    jobs = os.cpu_count() or 1
+    workers = 1
+    manifest = None
+    force = False
+    cache_dir = CACHE_DIR
+    plots = True
+    csv = False
+    catalog = CATALOG
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hj:W:m:fc:nswk:K",
+                                   ["help", "jobs=", "render-workers=", "manifest=", "force", "cache=", "no-cache", "skip-plots", "csv",
+                                    "catalog=", "no-catalog"])
+    except getopt.GetoptError as err:
+        print(err)
+        helpexit()
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            helpexit()
+        elif o in ("-j", "--jobs"):
+            jobs = int(a)
+        elif o in ("-W", "--render-workers"):
+            workers = max(1, int(a))
+        elif o in ("-m", "--manifest"):
+            manifest = a
+        elif o in ("-f", "--force"):
+            force = True
+        elif o in ("-c", "--cache"):
+            cache_dir = a
+        elif o in ("-n", "--no-cache"):
+            cache_dir = None
+        elif o in ("-s", "--skip-plots"):
+            plots = False
+        elif o in ("-w", "--csv"):
+            csv = True
+        elif o in ("-k", "--catalog"):
+            catalog = a
+        elif o in ("-K", "--no-catalog"):
+            catalog = None
+        else:
+            assert False, "unhandled option"
+
+    configs = load_manifest(manifest) if manifest is not None else []
+    names = args if (args or manifest is not None) else report_runs()
+    listed = set(c.name for c in configs)
+    for name in names:
+        if name in listed:
+            continue
+        try:
+            configs.append(run_config(name))
+        except ValueError as e:
+            print(name + ": skipped, " + str(e))
+
+    missing = [c for c in configs if not os.path.exists(c.sensor_file)]
+    for config in missing:
+        print(config.name + ": skipped, no sensor file " + config.sensor_file)
+    configs = [c for c in configs if os.path.exists(c.sensor_file)]
+    if not configs:
+        print("Nothing to process")
+        return 0
+
+    version = code_version()
+    failed = 0
+    processed = []
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [pool.submit(_run, config, force, version, cache_dir, plots, csv, workers) for config in configs]
+        for future in as_completed(futures):
+            name, status, seconds = future.result()
+            print(name + ": " + status + " (" + format(seconds, ".1f") + " s)")
+            failed += status.startswith("failed")
+            if status.startswith("processed"):
+                processed.append(name)
+    if catalog is not None and processed:
+        with Catalog(catalog) as cat:
+            cat.update(processed)
+        print(str(len(processed)) + " runs added to " + catalog)
+    return 1 if failed else 0
+
+
+def helpexit():
+    print("-h --help                        : display help message")
+    print("-j --jobs       [int value]      : number of runs processed at once (default: cpu count)")
+    print("-W --render-workers [int value]  : processes rendering the figures of each run (default 1, in the run's process)")
+    print("-m --manifest   [file.json]      : JSON list of runs, {\"name\": ..., other settings}")
+    print("-f --force                       : reprocess runs even if nothing changed")
+    print("-c --cache      [folder]         : folder for cached pipeline stages (default " + CACHE_DIR + ")")
+    print("-n --no-cache                    : recompute every stage")
+    print("-s --skip-plots                  : write the report without the figures")
+    print("-w --csv                         : also write the tables and cleaned data as csv files")
+    print("-k --catalog    [file]           : catalog the processed runs are added to (default " + CATALOG + ")")
+    print("-K --no-catalog                  : leave the catalog alone")
+    print("\n")
+    print("Run names not in the manifest are parsed from the naming convention,")
+    print("with no names every run in Reports is processed")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# Compressed per-run artifact holding every pipeline output
+
+# One .npz file (a zip of .npy members, each compressed on its own) per
+# run replaces the folder of CSVs. Members are:
+#   meta                         JSON: run config, schedule, stage keys, table and series layout
+#   table/<name>/<column>        small tables such as the statistics and fits, one array per column
+#   series/<stage>/<step>/<col>  time series of a stage for one hold window and one column
+# np.load only reads and decompresses the members that are asked for, so
+# one channel of one step can be pulled out of a week-long capture
+# without touching the rest. Value columns of the series are float32, the
+# time column keeps full precision.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from radiometer import TIME
+
+FORMAT = "RADRUN1"
+# columns of a labelled log that describe the window rather than hold data
+LABEL_COLUMNS = ["BB Temp", "Chamber Temp", "Segment"]
+
+
+# subroutine to turn a column into an array np.load can read back without pickle
+def _column(values):
+    values = np.asarray(values)
+    if values.dtype == object:
+        return values.astype(str)
+    return values
+
+
+# write a run artifact
+# tables: {name: DataFrame}, series: {stage: labelled DataFrame with a Segment column}
+def write_artifact(path, meta, tables=None, series=None, time_col=TIME):
+    members = {}
+    layout = {"tables": {}, "series": {}}
+    for name, table in (tables or {}).items():
+        layout["tables"][name] = list(table.columns)
+        for col in table.columns:
+            members["table/" + name + "/" + col] = _column(table[col].to_numpy())
+
+    for stage, frame in (series or {}).items():
+        ids = frame["Segment"].to_numpy()
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(ids)) + 1, [len(ids)]])
+        columns = [col for col in frame.columns if col not in LABEL_COLUMNS]
+        steps = []
+        for a, b in zip(starts[:-1], starts[1:]):
+            if b == a:
+                continue
+            step = int(ids[a])
+            steps.append(step)
+            for col in columns:
+                values = frame[col].to_numpy()[a:b]
+                if col != time_col and values.dtype == np.float64:
+                    values = values.astype(np.float32)
+                members["series/" + stage + "/" + str(step) + "/" + col] = values
+        layout["series"][stage] = {"columns": columns, "steps": steps}
+
+    meta = dict(meta, format=FORMAT, layout=layout)
+    members["meta"] = np.frombuffer(json.dumps(meta, default=str).encode('utf-8'), dtype=np.uint8)
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    # np.savez adds .npz to names without it, so write under a name that already has it
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, **members)
+    os.replace(tmp, path)
+    return path
+
+
+class RunArtifact:
+    def __init__(self, path):
+        self.path = path
+        self.npz = np.load(path, allow_pickle=False)
+        self.meta = json.loads(self.npz["meta"].tobytes().decode('utf-8'))
+        if self.meta.get("format") != FORMAT:
+            raise ValueError(path + " is not a run artifact")
+        self.layout = self.meta["layout"]
+
+    def tables(self):
+        return list(self.layout["tables"])
+
+    def table(self, name):
+        return pd.DataFrame({col: self.npz["table/" + name + "/" + col] for col in self.layout["tables"][name]})
+
+    def stages(self):
+        return list(self.layout["series"])
+
+    def steps(self, stage):
+        return list(self.layout["series"][stage]["steps"])
+
+    def columns(self, stage):
+        return list(self.layout["series"][stage]["columns"])
+
+    # one hold window of a stage, optionally only some columns
+    def step(self, stage, step, columns=None):
+        if columns is None:
+            columns = self.columns(stage)
+        return pd.DataFrame({col: self.npz["series/" + stage + "/" + str(step) + "/" + col] for col in columns})
+
+    # one column of a stage across every window, or the given windows
+    def channel(self, stage, column, steps=None):
+        if steps is None:
+            steps = self.steps(stage)
+        return np.concatenate([self.npz["series/" + stage + "/" + str(s) + "/" + column] for s in steps])
+
+    # a whole stage as a labelled frame, with BB Temp, Chamber Temp and Segment from the schedule
+    def frame(self, stage, columns=None):
+        schedule = pd.DataFrame(self.meta["schedule"])
+        parts = []
+        for s in self.steps(stage):
+            part = self.step(stage, s, columns)
+            part.insert(loc = 1, column = "BB Temp", value = schedule["BB Temp"].iloc[s])
+            part["Chamber Temp"] = schedule["Chamber Temp"].iloc[s]
+            part["Segment"] = s
+            parts.append(part)
+        return pd.concat(parts, ignore_index=True)
+
+    def close(self):
+        self.npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_artifact(path):
+    return RunArtifact(path)
@@ -0,0 +1,107 @@
+# Content-addressed cache for the analysis pipeline stages
+
+# Each stage's output is stored under a key that hashes everything it
+# depends on: the stage name, the package source, the stage parameters
+# and the keys of the stages it reads from. Input files enter through
+# the hash of their contents. Changing a parameter changes the key of the
+# stage that uses it and of everything downstream, while the stages
+# upstream keep their keys and are read back from disk.
+#
+# Layout: <root>/<stage>/<key>.pkl, plus <root>/files/ remembering the
+# content hash of each input file for its size and modification time.
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+
+CACHE_DIR = ".stage_cache"
+
+
+def file_hash(path, block=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(block), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# hash of the package source, so a code change invalidates every stage
+def code_version():
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py"))):
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# subroutine to write a file under a temporary name and move it into place
+def _atomic_write(path, data):
+    tmp = path + "." + str(os.getpid()) + ".tmp"
+    with open(tmp, "wb") as file:
+        file.write(data)
+    os.replace(tmp, path)
+
+
+class StageCache:
+    # root=None keeps results for the current run only
+    def __init__(self, root=CACHE_DIR, version=None):
+        self.root = root
+        self.version = version if version is not None else code_version()
+        self.log = []  # (stage, "hit" or "miss") in the order stages ran
+
+    # key for a stage from its parameters and upstream keys, parts must be JSON serializable
+    def key(self, stage, *parts):
+        text = json.dumps([stage, self.version, list(parts)], sort_keys=True, default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    # content hash of an input file, remembered until its size or modification time changes
+    def file_digest(self, path):
+        stat = os.stat(path)
+        source = [os.path.abspath(path), stat.st_size, stat.st_mtime]
+        if self.root is None:
+            return file_hash(path)
+        folder = os.path.join(self.root, "files")
+        entry = os.path.join(folder, hashlib.sha1(source[0].encode('utf-8')).hexdigest() + ".json")
+        if os.path.exists(entry):
+            with open(entry) as file:
+                saved = json.load(file)
+            if saved["source"] == source:
+                return saved["sha1"]
+        digest = file_hash(path)
+        os.makedirs(folder, exist_ok=True)
+        _atomic_write(entry, json.dumps({"source": source, "sha1": digest}).encode('utf-8'))
+        return digest
+
+    def _path(self, stage, key):
+        return os.path.join(self.root, stage, key + ".pkl")
+
+    # value of a stage, computed with func() and stored only if the key is not in the cache
+    def run(self, stage, key, func, store=True):
+        if self.root is not None and store:
+            path = self._path(stage, key)
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    value = pickle.load(file)
+                self.log.append((stage, "hit"))
+                return value
+        value = func()
+        self.log.append((stage, "miss"))
+        if self.root is not None and store:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        return value
+
+    # function returning the stage value, run at most once and only if something asks for it
+    def lazy(self, stage, key, func, store=True):
+        result = []
+
+        def value():
+            if not result:
+                result.append(self.run(stage, key, func, store))
+            return result[0]
+        return value
+
+    def hits(self):
+        return sum(1 for _, status in self.log if status == "hit")
@@ -0,0 +1,121 @@
+# Least-squares calibration of every channel at once
+
+# The voltage -> temperature and temperature -> radiance conversions are
+# polynomials in one variable, so each channel's fit is a linear least
+# squares problem with a Vandermonde design matrix. Instead of calling
+# curve_fit once per channel, the channels are stacked into one
+# (channels x points x terms) problem and solved with a batched QR
+# decomposition, which also gives the covariance of the coefficients the
+# same way curve_fit does (scaled by the residual variance). Applying a
+# calibration to a (samples x channels) array is one Horner evaluation
+# over all channels.
+#
+# Coefficients are ordered highest power first, the same as linear_fit
+# (slope, b) and quadratic_fit (a, b, c) in the notebook and np.polyfit.
+
+import numpy as np
+import pandas as pd
+
+# names of the coefficients for each degree, as the notebook's fit functions call them
+COEFFICIENTS = {1: ["Slope", "Intercept"], 2: ["a", "b", "c"]}
+
+
+# subroutine to turn x and y into (channels x points) arrays, either may be shared by every channel
+def _stack(x, y):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.ndim == 1 and y.ndim == 1:
+        return x[None, :], y[None, :]
+    width = x.shape[1] if x.ndim == 2 else y.shape[1]
+    if x.ndim == 1:
+        x = np.repeat(x[:, None], width, axis=1)
+    if y.ndim == 1:
+        y = np.repeat(y[:, None], width, axis=1)
+    if x.shape != y.shape:
+        raise ValueError("x and y must have the same number of points and channels")
+    return x.T, y.T
+
+
+def coefficient_names(degree):
+    return COEFFICIENTS.get(degree, ["p" + str(i) for i in range(degree, -1, -1)])
+
+
+class Calibration:
+    # coefficients: (channels x terms), covariance: (channels x terms x terms)
+    def __init__(self, coefficients, channels=None, covariance=None, rms=None, r2=None):
+        self.coefficients = np.atleast_2d(np.asarray(coefficients, dtype=np.float64))
+        self.degree = self.coefficients.shape[1] - 1
+        self.channels = list(channels) if channels is not None else list(range(len(self.coefficients)))
+        self.covariance = covariance
+        self.rms = rms    # root mean square residual of each channel
+        self.r2 = r2      # coefficient of determination of each channel
+
+    # standard error of each coefficient
+    @property
+    def errors(self):
+        return np.sqrt(np.diagonal(self.covariance, axis1=1, axis2=2))
+
+    # evaluate every channel's polynomial on a (samples x channels) array
+    def apply(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        out = np.broadcast_to(self.coefficients[:, 0], values.shape).copy()
+        for j in range(1, self.degree + 1):
+            out *= values
+            out += self.coefficients[:, j]
+        return out
+
+    # copy of a frame with the calibrated channels converted
+    def apply_frame(self, frame):
+        converted = frame.copy()
+        converted[self.channels] = self.apply(frame[self.channels].to_numpy(dtype=np.float64))
+        return converted
+
+    # one row per channel: the coefficients, their standard errors and the residual statistics
+    def table(self):
+        names = coefficient_names(self.degree)
+        table = pd.DataFrame(self.coefficients, columns=names)
+        table.insert(loc = 0, column = "Channel", value = self.channels)
+        if self.covariance is not None:
+            for name, err in zip(names, self.errors.T):
+                table[name + " Err"] = err
+        if self.rms is not None:
+            table["RMS Residual"] = self.rms
+        if self.r2 is not None:
+            table["R2"] = self.r2
+        return table
+
+    # rebuild a calibration from the coefficients of table()
+    @classmethod
+    def from_table(cls, table, degree=None):
+        if degree is None:
+            degree = max(d for d, names in COEFFICIENTS.items() if all(n in table.columns for n in names))
+        return cls(table[coefficient_names(degree)].to_numpy(), table["Channel"].tolist())
+
+
+# fit a polynomial of `degree` to every channel at once
+# x and y are (points,) or (points x channels), a 1-D array is shared by every channel,
+# e.g. x = average voltage of each channel and y = BB temp, or x = temperature and y = band radiance
+def fit_calibration(x, y, degree=1, channels=None):
+    if isinstance(x, pd.DataFrame) and channels is None:
+        channels = list(x.columns)
+    if isinstance(y, pd.DataFrame) and channels is None:
+        channels = list(y.columns)
+    xs, ys = _stack(x, y)
+    points = xs.shape[1]
+    terms = degree + 1
+
+    # design matrices (channels x points x terms), highest power first
+    design = xs[:, :, None] ** np.arange(degree, -1, -1)
+    q, r = np.linalg.qr(design)
+    coefficients = np.linalg.solve(r, np.einsum('cpt,cp->ct', q, ys)[:, :, None])[:, :, 0]
+
+    residuals = ys - np.einsum('cpt,ct->cp', design, coefficients)
+    rss = np.sum(residuals ** 2, axis=1)
+    dof = points - terms
+    variance = rss / dof if dof > 0 else np.full(len(rss), np.inf)
+    r_inv = np.linalg.inv(r)
+    covariance = variance[:, None, None] * (r_inv @ np.swapaxes(r_inv, 1, 2))
+    tss = np.sum((ys - ys.mean(axis=1, keepdims=True)) ** 2, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = 1 - rss / tss
+    return Calibration(coefficients, channels, covariance, np.sqrt(rss / points), r2)
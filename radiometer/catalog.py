@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+
+# Cross-run catalog of the processed runs in Reports
+#
+#   python -m radiometer.catalog [-d catalog.sqlite] [-r Reports] [-q sql] [-t metric [-c channel] [-C chamber] [-U unit] [-o out.png]]
+#
+# One SQLite file indexes the step statistics of every run, read from the
+# run's artifact (<run>.npz) or, for runs processed before the artifact
+# existed, from its voltage_avg / voltage_std_dev / temp_std_dev csv files,
+# either in the run folder or in the per chamber temp folders. Tables:
+#   runs      run, unit, date (YYYY-MM-DD), capture, BB range, source and a signature of the source files
+#   steps     run, chamber temp, BB temp, channel, average voltage, voltage std dev, converted temp std dev
+#   channels  run, chamber temp, channel, sensitivity (V/C), std dev (V), SNR (sensitivity / std dev, 1/C),
+#             temp std dev (C), number of steps
+# Sensitivity and SNR are worked out the way the notebook does it, from the
+# average voltages, so old and new runs are comparable. update() only
+# re-reads runs whose source files changed since they were catalogued.
+
+import getopt
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+from radiometer import CHANNELS
+from radiometer.artifact import load_artifact
+from radiometer.pipeline import REPORTS_DIR, parse_run_name, report_runs
+
+CATALOG = os.path.join(REPORTS_DIR, "catalog.sqlite")
+METRICS = ["sensitivity", "std_dev", "snr", "temp_std"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run TEXT PRIMARY KEY, unit INTEGER, date TEXT, capture INTEGER,
+    bb_low REAL, bb_high REAL, source TEXT, signature TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run TEXT, chamber_temp REAL, bb_temp REAL, channel TEXT,
+    voltage_avg REAL, voltage_std REAL, temp_std REAL
+);
+CREATE TABLE IF NOT EXISTS channels (
+    run TEXT, chamber_temp REAL, channel TEXT,
+    sensitivity REAL, std_dev REAL, snr REAL, temp_std REAL, steps INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_unit ON runs (unit, date);
+CREATE INDEX IF NOT EXISTS steps_run ON steps (run);
+CREATE INDEX IF NOT EXISTS steps_channel ON steps (channel, chamber_temp, bb_temp);
+CREATE INDEX IF NOT EXISTS channels_run ON channels (run);
+CREATE INDEX IF NOT EXISTS channels_channel ON channels (channel, chamber_temp);
+"""
+
+STEP_COLUMNS = ["chamber_temp", "bb_temp", "channel", "voltage_avg", "voltage_std", "temp_std"]
+CHANNEL_COLUMNS = ["chamber_temp", "channel", "sensitivity", "std_dev", "snr", "temp_std", "steps"]
+
+
+# ---------------------------------------------------------------- reading runs
+
+# subroutine to turn MMDDYY from a run name into YYYY-MM-DD
+def _iso_date(date):
+    if not date:
+        return None
+    return "20" + date[4:6] + "-" + date[0:2] + "-" + date[2:4]
+
+
+# run name parameters, empty for names that do not follow the convention
+def _run_params(name):
+    try:
+        return parse_run_name(name)
+    except ValueError:
+        return {}
+
+
+# the files a run is catalogued from, returns (source, [paths])
+# the artifact wins, otherwise the statistics csv files of each chamber temp folder or of the run folder
+def run_sources(run_dir, name):
+    artifact = os.path.join(run_dir, name + ".npz")
+    if os.path.exists(artifact):
+        return "artifact", [artifact]
+    paths = []
+    for entry in sorted(os.listdir(run_dir)):
+        if entry.isdigit():
+            path = os.path.join(run_dir, entry, entry + "_voltage_avg_" + name + ".csv")
+            if os.path.exists(path):
+                paths.append(path)
+    if not paths:
+        path = os.path.join(run_dir, "voltage_avg_" + name + ".csv")
+        if os.path.exists(path):
+            paths.append(path)
+    for path in list(paths):
+        for kind in ("voltage_std_dev", "temp_std_dev"):
+            other = path.replace("voltage_avg_" + name, kind + "_" + name)
+            if os.path.exists(other):
+                paths.append(other)
+    return "csv", sorted(paths)
+
+
+# size and modification time of each source, a change in any of them re-catalogues the run
+def signature(paths):
+    return json.dumps([[os.path.basename(p), os.path.getsize(p), os.stat(p).st_mtime_ns] for p in paths])
+
+
+# subroutine to read one of the wide statistics csv files as (BB Temp, channel, value) rows
+def _read_wide(path, value):
+    table = pd.read_csv(path, index_col=0)
+    if "BB Temp" in table.columns:
+        bb = table["BB Temp"]
+    elif "Temp" in table.columns:
+        bb = table["Temp"]
+    else:
+        bb = table.index.to_series()
+    channels = [ch for ch in CHANNELS if ch in table.columns]
+    rows = table[channels].assign(bb_temp=bb.to_numpy(dtype=np.float64))
+    return rows.melt(id_vars="bb_temp", var_name="channel", value_name=value)
+
+
+# step rows of a run catalogued from csv files
+def _csv_steps(name, paths):
+    params = _run_params(name)
+    chamber_temps = params.get("chamber_temps", [])
+    parts = []
+    for path in paths:
+        if not path.endswith("voltage_avg_" + name + ".csv"):
+            continue
+        folder = os.path.basename(os.path.dirname(path))
+        if folder.isdigit():
+            chamber_temp = float(folder)
+        elif len(chamber_temps) == 1:
+            chamber_temp = float(chamber_temps[0])
+        else:
+            chamber_temp = np.nan
+        steps = _read_wide(path, "voltage_avg")
+        for kind, value in (("voltage_std_dev", "voltage_std"), ("temp_std_dev", "temp_std")):
+            other = path.replace("voltage_avg_" + name, kind + "_" + name)
+            if other in paths:
+                steps = steps.merge(_read_wide(other, value), on=["bb_temp", "channel"], how="left")
+            else:
+                steps[value] = np.nan
+        steps.insert(loc = 0, column = "chamber_temp", value = chamber_temp)
+        parts.append(steps)
+    if not parts:
+        return pd.DataFrame(columns=STEP_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[STEP_COLUMNS]
+
+
+# step rows of a run catalogued from its artifact, and the run parameters it was processed with
+def _artifact_steps(path):
+    with load_artifact(path) as artifact:
+        config = artifact.meta.get("config", {})
+        voltage = artifact.table("voltage_stats")
+        temp = artifact.table("temp_stats") if "temp_stats" in artifact.tables() else None
+    keys = ["Chamber Temp", "BB Temp", "Channel"]
+
+    def values(stats, stat, value):
+        rows = stats[(stats["Stat"] == stat) & stats["Channel"].isin(CHANNELS)]
+        return rows[keys + ["Value"]].rename(columns={"Value": value})
+
+    steps = values(voltage, "mean", "voltage_avg").merge(values(voltage, "std", "voltage_std"), on=keys, how="left")
+    if temp is not None:
+        steps = steps.merge(values(temp, "std", "temp_std"), on=keys, how="left")
+    else:
+        steps["temp_std"] = np.nan
+    steps = steps.rename(columns={"Chamber Temp": "chamber_temp", "BB Temp": "bb_temp", "Channel": "channel"})
+    return steps[STEP_COLUMNS].reset_index(drop=True), config
+
+
+# per channel sensitivity, std dev and SNR of each chamber temp, as in the notebook:
+# sensitivity is the average change in voltage per degree between neighbouring BB temps
+def summarise(steps):
+    rows = []
+    for (chamber_temp, channel), group in steps.groupby(["chamber_temp", "channel"], sort=False, dropna=False):
+        group = group.sort_values("bb_temp")
+        dv = np.diff(group["voltage_avg"].to_numpy(dtype=np.float64))
+        dt = np.diff(group["bb_temp"].to_numpy(dtype=np.float64))
+        sensitivity = np.mean(dv / dt) if len(dt) else np.nan
+        std_dev = group["voltage_std"].mean()
+        snr = sensitivity / std_dev if std_dev else np.nan
+        rows.append((chamber_temp, channel, sensitivity, std_dev, snr, group["temp_std"].mean(), len(group)))
+    return pd.DataFrame(rows, columns=CHANNEL_COLUMNS)
+
+
+# subroutine to turn NaN into NULL for sqlite
+def _records(frame):
+    return [tuple(None if isinstance(v, float) and np.isnan(v) else v for v in row)
+            for row in frame.itertuples(index=False, name=None)]
+
+
+# ---------------------------------------------------------------- catalog
+
+class Catalog:
+    def __init__(self, path=CATALOG, reports_dir=REPORTS_DIR):
+        self.path = path
+        self.reports_dir = reports_dir
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def signatures(self):
+        return dict(self.db.execute("SELECT run, signature FROM runs"))
+
+    # catalogue the given runs, or every run in Reports, skipping the unchanged ones
+    # returns the names of the runs that were (re)catalogued
+    def update(self, runs=None, force=False):
+        full = runs is None
+        if full:
+            runs = report_runs(self.reports_dir)
+        known = self.signatures()
+        updated = []
+        for name in runs:
+            run_dir = os.path.join(self.reports_dir, name)
+            if not os.path.isdir(run_dir):
+                continue
+            source, paths = run_sources(run_dir, name)
+            if not paths:
+                continue
+            sig = signature(paths)
+            if not force and known.get(name) == sig:
+                continue
+            self.add(name, run_dir, source, paths, sig)
+            updated.append(name)
+        if full:
+            for name in set(known) - set(runs):
+                self.remove(name)
+        return updated
+
+    # read one run and replace its rows
+    def add(self, name, run_dir, source, paths, sig):
+        params = _run_params(name)
+        if source == "artifact":
+            steps, config = _artifact_steps(paths[0])
+            params = dict(params, **{k: config[k] for k in ("unit", "date", "capture", "low_temp", "high_temp")
+                                     if config.get(k) is not None})
+        else:
+            steps = _csv_steps(name, paths)
+        run = (name, params.get("unit"), _iso_date(params.get("date")), params.get("capture"),
+               params.get("low_temp"), params.get("high_temp"), source, sig)
+        with self.db:
+            self._delete(name)
+            self.db.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", run)
+            self.db.executemany("INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                [(name,) + row for row in _records(steps)])
+            self.db.executemany("INSERT INTO channels VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                [(name,) + row for row in _records(summarise(steps))])
+
+    def remove(self, name):
+        with self.db:
+            self._delete(name)
+
+    def _delete(self, name):
+        for table in ("runs", "steps", "channels"):
+            self.db.execute("DELETE FROM " + table + " WHERE run = ?", (name,))
+
+    # ------------------------------------------------------------ queries
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.db, params=params)
+
+    # subroutine to build a WHERE clause from the filters that are set
+    @staticmethod
+    def _where(**filters):
+        clauses = []
+        params = []
+        for column, value in filters.items():
+            if value is not None:
+                clauses.append(column + " = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    # per channel results joined with the run, oldest run first
+    def channels(self, channel=None, chamber_temp=None, unit=None):
+        where, params = self._where(**{"c.channel": channel, "c.chamber_temp": chamber_temp, "r.unit": unit})
+        columns = ", ".join("c." + col for col in CHANNEL_COLUMNS)
+        return self.query("SELECT r.run, r.unit, r.date, r.capture, r.bb_low, r.bb_high, " + columns +
+                          " FROM channels c JOIN runs r ON r.run = c.run" + where +
+                          " ORDER BY r.date, r.run, c.chamber_temp, c.channel", params)
+
+    # step rows joined with the run, e.g. the std dev at one BB temp across every run
+    def steps(self, channel=None, chamber_temp=None, bb_temp=None, unit=None):
+        where, params = self._where(**{"s.channel": channel, "s.chamber_temp": chamber_temp,
+                                       "s.bb_temp": bb_temp, "r.unit": unit})
+        columns = ", ".join("s." + col for col in STEP_COLUMNS)
+        return self.query("SELECT r.run, r.unit, r.date, r.capture, " + columns +
+                          " FROM steps s JOIN runs r ON r.run = s.run" + where +
+                          " ORDER BY r.date, r.run, s.chamber_temp, s.bb_temp, s.channel", params)
+
+    # one metric of each channel against run date, runs in rows and channels in columns
+    def trend(self, metric="snr", channel=None, chamber_temp=None, unit=None):
+        if metric not in METRICS:
+            raise ValueError("Metric must be one of " + ", ".join(METRICS))
+        rows = self.channels(channel, chamber_temp, unit)
+        return rows.pivot_table(index=["date", "run"], columns="channel", values=metric, aggfunc="mean")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# metric against run date for each channel of a trend() table
+def trend_figure(trend, metric):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 5))
+    ax = fig.add_subplot(1, 1, 1)
+    dates = pd.to_datetime(trend.index.get_level_values("date"))
+    for ch in trend.columns:
+        ax.plot(dates, trend[ch].to_numpy(), marker = '.', linestyle = '-')
+    ax.set_xlabel("Run date")
+    ax.set_ylabel(metric)
+    ax.set_title(metric + " per run")
+    ax.grid(color='gray', linestyle='-', linewidth=0.3)
+    ax.legend(list(trend.columns), fontsize = 5)
+    fig.autofmt_xdate()
+    return fig
+
+
+def main():
+    path = CATALOG
+    reports_dir = REPORTS_DIR
+    sql = None
+    metric = None
+    channel = None
+    chamber_temp = None
+    unit = None
+    out = None
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hd:r:q:t:c:C:U:o:",
+                                   ["help", "catalog=", "reports=", "query=", "trend=", "channel=",
+                                    "chamber=", "unit=", "output="])
+    except getopt.GetoptError as err:
+        print(err)
+        helpexit()
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            helpexit()
+        elif o in ("-d", "--catalog"):
+            path = a
+        elif o in ("-r", "--reports"):
+            reports_dir = a
+        elif o in ("-q", "--query"):
+            sql = a
+        elif o in ("-t", "--trend"):
+            metric = a
+        elif o in ("-c", "--channel"):
+            channel = a
+        elif o in ("-C", "--chamber"):
+            chamber_temp = float(a)
+        elif o in ("-U", "--unit"):
+            unit = int(a)
+        elif o in ("-o", "--output"):
+            out = a
+        else:
+            assert False, "unhandled option"
+
+    with Catalog(path, reports_dir) as catalog:
+        updated = catalog.update(args or None)
+        print(str(len(updated)) + " runs catalogued")
+        with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 200):
+            if sql is not None:
+                print(catalog.query(sql))
+            if metric is not None:
+                trend = catalog.trend(metric, channel, chamber_temp, unit)
+                print(trend)
+                if out is not None:
+                    from radiometer.report import save
+                    save(trend_figure(trend, metric), out)
+    return 0
+
+
+def helpexit():
+    print("-h --help                        : display help message")
+    print("-d --catalog    [file]           : catalog database (default " + CATALOG + ")")
+    print("-r --reports    [folder]         : folder of processed runs (default " + REPORTS_DIR + ")")
+    print("-q --query      [sql]            : run a query against the runs, steps and channels tables")
+    print("-t --trend      [metric]         : print a metric per run and channel, one of " + ", ".join(METRICS))
+    print("-c --channel    [column]         : only this channel, e.g. T2CA(v)")
+    print("-C --chamber    [float value]    : only this chamber temp")
+    print("-U --unit       [int value]      : only this radiometer")
+    print("-o --output     [file.png]       : save the trend as a figure")
+    print("\n")
+    print("The catalog is brought up to date first, run names limit the update to those runs")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
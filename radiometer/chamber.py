@@ -0,0 +1,88 @@
+# Reading the Environmental Chamber's exported logs
+
+# The F4T export has separate Date (MDY) and Time columns. They are
+# parsed together with one format-specific to_datetime call and turned
+# into epoch seconds in local time (the panel clock is local). The parsed
+# log is cached next to the export and reused until the export changes.
+# align_chamber attaches chamber readings to each sensor sample with an
+# as-of merge on the shared time base.
+
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from radiometer import TIME
+from radiometer.loader import _source
+
+DATE = "Date (MDY)"
+CLOCK = "Time"
+TEMPERATURE = "TEMPERTURE (Deg C)"  # spelled as in the export
+CHAMBER_TIME = "Time (ms)"
+FORMATS = ["%m/%d/%Y %H:%M:%S", "%m/%d/%y %H:%M:%S"]
+CACHE_SUFFIX = ".chamber.pkl"
+
+
+# subroutine to convert naive local datetimes to epoch seconds, the same as datetime.timestamp()
+# the UTC offset is looked up once per distinct hour so daylight saving changes are handled
+def _local_epoch(naive):
+    seconds = naive.values.astype("datetime64[s]").astype(np.int64)
+    hours, index = np.unique(seconds // 3600 * 3600, return_inverse=True)
+    offsets = np.array([time.mktime(time.gmtime(h)[:8] + (-1,)) - h for h in hours])
+    return seconds + offsets[index]
+
+
+# epoch seconds of every row from the date and time columns
+def parse_timestamps(dates, times):
+    stamps = pd.Series(dates, dtype=str).str.strip() + " " + pd.Series(times, dtype=str).str.strip()
+    for fmt in FORMATS:
+        try:
+            return _local_epoch(pd.DatetimeIndex(pd.to_datetime(stamps, format=fmt)))
+        except ValueError:
+            continue
+    raise ValueError("Chamber dates must be MM/DD/YYYY or MM/DD/YY with HH:MM:SS times")
+
+
+# read a chamber export, keeping the date/time columns, the given columns and an Epoch column
+def read_chamber(path, columns=(TEMPERATURE,), cache=True):
+    columns = list(columns)
+    cache_path = path + CACHE_SUFFIX
+    if cache and os.path.exists(cache_path):
+        with open(cache_path, "rb") as file:
+            cached = pickle.load(file)
+        if cached["source"] == _source(path) and cached["columns"] == columns:
+            return cached["frame"]
+
+    chamber = pd.read_csv(path, usecols=[DATE, CLOCK] + columns)
+    chamber = chamber[[DATE, CLOCK] + columns]
+    chamber["Epoch"] = parse_timestamps(chamber[DATE], chamber[CLOCK])
+
+    if cache:
+        with open(cache_path, "wb") as file:
+            pickle.dump({"source": _source(path), "columns": columns, "frame": chamber}, file)
+    return chamber
+
+
+# chamber times in ms on the sensor time base
+# start_epoch is the wall clock time of sensor Time(ms) = 0, e.g. the start_epoch of a session file,
+# and defaults to the first chamber row
+def chamber_time_ms(chamber, start_epoch=None):
+    epoch = chamber["Epoch"].to_numpy(dtype=np.float64)
+    if start_epoch is None:
+        start_epoch = epoch[0]
+    return (epoch - start_epoch) * 1000
+
+
+# copy of the sensor data with the latest chamber reading at or before each sample
+# tolerance_ms leaves samples with no chamber reading that recent as NaN
+def align_chamber(data, chamber, columns=(TEMPERATURE,), start_epoch=None, tolerance_ms=None, time_col=TIME):
+    right = pd.DataFrame({time_col: chamber_time_ms(chamber, start_epoch)})
+    for col in columns:
+        right[col] = chamber[col].to_numpy()
+    right = right.sort_values(time_col, kind="stable")
+    merged = pd.merge_asof(data.astype({time_col: np.float64}), right, on=time_col,
+                           direction="backward", tolerance=tolerance_ms)
+    merged.index = data.index
+    return merged
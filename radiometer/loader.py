@@ -0,0 +1,143 @@
+# Sensor log loading with a memory-mapped column cache
+
+# The first load parses the CSV in chunks with fixed dtypes (float64 for
+# the time column, float32 for everything else) and appends every column
+# to its own raw binary file in a cache folder next to the CSV. Later
+# loads map those files straight into memory, so reopening a capture
+# takes milliseconds. The cache records the CSV's size and modification
+# time and is rebuilt whenever they change. The time column is sorted,
+# so a time range is found with a binary search and only those rows are
+# read.
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from radiometer import TIME
+
+CHUNK_ROWS = 1000000
+CACHE_SUFFIX = ".cache"
+META = "meta.json"
+FORMAT = "RADCACHE1"
+
+
+def cache_dir(path):
+    return path + CACHE_SUFFIX
+
+
+# subroutine to describe the source file, a cache is valid only for the same description
+def _source(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _dtype(column, time_col):
+    return np.float64 if column == time_col else np.float32
+
+
+# parse the csv into a new cache folder, returns the cache metadata
+def build_cache(path, time_col=TIME, chunk_rows=CHUNK_ROWS):
+    folder = cache_dir(path)
+    tmp = folder + ".tmp"
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+
+    source = _source(path)
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    dtypes = {col: _dtype(col, time_col) for col in columns}
+    files = {col: "col" + str(i) + ".bin" for i, col in enumerate(columns)}
+    handles = {col: open(os.path.join(tmp, files[col]), "wb") for col in columns}
+    rows = 0
+    try:
+        for chunk in pd.read_csv(path, dtype=dtypes, chunksize=chunk_rows):
+            for col in columns:
+                handles[col].write(chunk[col].to_numpy(dtype=dtypes[col]).tobytes())
+            rows += len(chunk)
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    meta = {
+        "format": FORMAT,
+        "source": source,
+        "rows": rows,
+        "time": time_col,
+        "columns": [{"name": col, "file": files[col], "dtype": np.dtype(dtypes[col]).str} for col in columns],
+    }
+    with open(os.path.join(tmp, META), "w") as file:
+        json.dump(meta, file)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.replace(tmp, folder)
+    return meta
+
+
+# metadata of a valid cache for the csv, or None
+def read_cache_meta(path):
+    meta_path = os.path.join(cache_dir(path), META)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as file:
+        meta = json.load(file)
+    if meta.get("format") != FORMAT or meta["source"] != _source(path):
+        return None
+    return meta
+
+
+class SensorLog:
+    def __init__(self, path, meta):
+        self.path = path
+        self.rows = meta["rows"]
+        self.time_col = meta["time"]
+        folder = cache_dir(path)
+        # read-only memory maps, nothing is read until it is used
+        self.columns = {}
+        for col in meta["columns"]:
+            if self.rows:
+                self.columns[col["name"]] = np.memmap(os.path.join(folder, col["file"]), dtype=col["dtype"],
+                                                      mode="r", shape=(self.rows,))
+            else:
+                self.columns[col["name"]] = np.zeros(0, dtype=col["dtype"])
+
+    def __len__(self):
+        return self.rows
+
+    # row range holding t_start <= time < t_end, either end may be None
+    def time_range(self, t_start=None, t_end=None):
+        times = self.columns[self.time_col]
+        lo = 0 if t_start is None else int(np.searchsorted(times, t_start, side='left'))
+        hi = self.rows if t_end is None else int(np.searchsorted(times, t_end, side='left'))
+        return lo, max(lo, hi)
+
+    # DataFrame of the given columns for rows lo:hi
+    def frame(self, columns=None, lo=0, hi=None):
+        if columns is None:
+            columns = list(self.columns)
+        elif self.time_col not in columns:
+            columns = [self.time_col] + list(columns)
+        return pd.DataFrame({col: np.array(self.columns[col][lo:hi]) for col in columns})
+
+    # DataFrames of chunk_rows rows at a time, for the streaming statistics and smoothing
+    def chunks(self, columns=None, chunk_rows=CHUNK_ROWS, t_start=None, t_end=None):
+        lo, hi = self.time_range(t_start, t_end)
+        for start in range(lo, hi, chunk_rows):
+            yield self.frame(columns, start, min(start + chunk_rows, hi))
+
+
+# open the cache for a sensor csv, building it first if it is missing or out of date
+def open_sensor(path, time_col=TIME, chunk_rows=CHUNK_ROWS):
+    meta = read_cache_meta(path)
+    if meta is None or meta["time"] != time_col:
+        meta = build_cache(path, time_col, chunk_rows)
+    return SensorLog(path, meta)
+
+
+# load a sensor csv as a DataFrame, optionally only columns and rows with t_start <= time < t_end
+def load_sensor(path, columns=None, t_start=None, t_end=None, time_col=TIME):
+    log = open_sensor(path, time_col)
+    lo, hi = log.time_range(t_start, t_end)
+    return log.frame(columns, lo, hi)
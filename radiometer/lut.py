@@ -0,0 +1,98 @@
+# Radiance <-> temperature lookup tables for the radiometer channels
+
+# The band radiance of every channel is tabulated once on a dense
+# temperature grid and cached on disk as a .npz file. The cache file name
+# is a hash of the filter response file and the grid settings, so a new
+# filter file or grid builds a new table and an old one is never reused
+# by mistake. Band radiance rises monotonically with temperature, so both
+# directions are a searchsorted plus linear interpolation.
+
+import hashlib
+import os
+
+import numpy as np
+
+from radiometer import CHANNELS
+from radiometer.radiometry import FILTER_FILE, load_filters, band_radiance
+
+LUT_DIR = "Data/lut"
+# default grid, in C
+T_MIN = -50.0
+T_MAX = 150.0
+T_STEP = 0.01
+
+
+# subroutine for linear interpolation of x on an increasing grid xp
+# values outside the grid are NaN rather than clamped to the end points
+def _interp(x, xp, fp):
+    x = np.asarray(x, dtype=np.float64)
+    i = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, xp.size - 2)
+    frac = (x - xp[i]) / (xp[i + 1] - xp[i])
+    y = fp[i] + frac * (fp[i + 1] - fp[i])
+    return np.where((x >= xp[0]) & (x <= xp[-1]), y, np.nan)
+
+
+class RadianceLUT:
+    def __init__(self, temps, radiance, channels):
+        self.temps = temps        # (N,) temperature grid in C
+        self.radiance = radiance  # (N, channel) band radiance
+        self.channels = list(channels)
+        for j, ch in enumerate(self.channels):
+            if not np.all(np.diff(radiance[:, j]) > 0):
+                raise ValueError("Radiance for " + ch + " is not increasing over the temperature grid")
+
+    def _column(self, channel):
+        return self.radiance[:, self.channels.index(channel)]
+
+    # band radiance of a channel at the given temperatures in C
+    def radiance_of(self, temps, channel):
+        return _interp(temps, self.temps, self._column(channel))
+
+    # brightness temperature in C of a channel at the given band radiances
+    def temperature_of(self, radiance, channel):
+        return _interp(radiance, self._column(channel), self.temps)
+
+    # copy of a DataFrame of radiances with every channel column converted to temperature
+    def to_temperature(self, df, channels=None):
+        out = df.copy()
+        for ch in channels if channels is not None else self.channels:
+            out[ch] = self.temperature_of(df[ch].to_numpy(), ch)
+        return out
+
+    # copy of a DataFrame of temperatures with every channel column converted to radiance
+    def to_radiance(self, df, channels=None):
+        out = df.copy()
+        for ch in channels if channels is not None else self.channels:
+            out[ch] = self.radiance_of(df[ch].to_numpy(), ch)
+        return out
+
+
+# subroutine to name the cache file for a filter file and grid
+def lut_key(filter_file, channels, t_min, t_max, t_step):
+    digest = hashlib.sha1()
+    with open(filter_file, "rb") as file:
+        digest.update(file.read())
+    digest.update(repr((list(channels), float(t_min), float(t_max), float(t_step))).encode('ascii'))
+    return digest.hexdigest()[:16]
+
+
+# load the lookup table for a filter file, building and caching it on first use
+def load_lut(filter_file=FILTER_FILE, channels=CHANNELS, t_min=T_MIN, t_max=T_MAX, t_step=T_STEP,
+             cache_dir=LUT_DIR):
+    path = os.path.join(cache_dir, "lut_" + lut_key(filter_file, channels, t_min, t_max, t_step) + ".npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            return RadianceLUT(cached["temps"], cached["radiance"], cached["channels"].tolist())
+
+    n = int(round((t_max - t_min) / t_step)) + 1
+    temps = t_min + t_step * np.arange(n)
+    wavelengths, response = load_filters(filter_file, channels)
+    lut = RadianceLUT(temps, band_radiance(temps, wavelengths, response), channels)
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    # write to a temporary name first so a half written table is never loaded
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, temps=temps, radiance=lut.radiance, channels=np.array(lut.channels))
+    os.replace(tmp, path)
+    return lut
@@ -0,0 +1,400 @@
+# The radiometer_jupyter.ipynb analysis as a set of pipeline stages
+
+# A run is described by a RunConfig holding the values that are edited
+# at the top of the notebook. Configs come from the run name convention
+#   radiometer[unit]_<chamber>_<BB low>-<BB high>_<MMDDYY>_sensor[_n]
+# e.g. radiometer2_40_5-55_080123_sensor, radiometer_noch_12-42_072423_sensor
+# or radiometer5_CH13-43_BB13-43_101323_sensor, with anything the name
+# does not say (cutoffs, window size, chamber temps for weekend runs)
+# taken from the defaults or a manifest.
+#
+# Stages, each a function of the config and the earlier results:
+#   load -> segment -> smooth -> stats -> fit -> convert -> report
+# process() runs them through a cache.StageCache, so only the stages whose
+# inputs or parameters changed are recomputed, then writes the run's
+# artifact (Reports/<run>/<run>.npz, see artifact.py) and figures, and
+# the CSV tables when asked for.
+
+import dataclasses
+import glob
+import json
+import os
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from radiometer import CHANNELS, THERMISTORS
+from radiometer.artifact import write_artifact
+from radiometer.cache import StageCache
+from radiometer.calibration import Calibration, fit_calibration
+from radiometer.loader import load_sensor
+from radiometer.lut import load_lut
+from radiometer.radiometry import FILTER_FILE
+from radiometer.report import Renderer, plot_data, submit_figures
+from radiometer.segment import segment, step_schedule, chamber_schedule, schedule_from_events, chamber_schedule_from_events
+from radiometer.smooth import smooth_labelled
+from radiometer.stats import step_stats, wide
+
+DATA_DIR = "Data"
+REPORTS_DIR = "Reports"
+STAMP = "pipeline_stamp.json"
+# chamber temp used for runs without the chamber, matches the folders in Reports
+NO_CHAMBER_TEMP = 25
+# sample of the chamber window the thermistor drift is measured from (30 minutes at 1 Hz)
+DRIFT_REFERENCE = 30 * 60
+
+_NAME = re.compile(r"^radiometer(?P<unit>\d*)_(?P<chamber>[^_]+)_(?:BB)?(?P<bb>\d+(?:-\d+)?)_"
+                   r"(?P<date>\d{6})_sensor(?:_(?P<capture>\d+))?$")
+
+
+@dataclass
+class RunConfig:
+    name: str
+    high_temp: float
+    low_temp: float
+    temp_interval: float = -5
+    chamber_temps: list = field(default_factory=lambda: [NO_CHAMBER_TEMP])
+    have_chamber_data: bool = False
+    time_interval: float = 5           # minutes each BB temp is held
+    begin_cutoff: float = 2            # minutes cut off from the beginning of each temp
+    end_cutoff: float = 1              # minutes cut off from the end of each temp
+    offset: float = 0                  # minutes the sensor was on before the sweep
+    chamb_time_interval: float = 720   # minutes each chamber temp is held
+    window_size: int = 60              # samples in the rolling window
+    fit_degree: int = 1                # degree of the voltage -> temperature fit, 2 for quadratic_fit
+    sensor_file: str = None
+    session_file: str = None           # session_log .ses file with the exact step times
+    unit: int = None
+    date: str = None
+    capture: int = None
+
+    def __post_init__(self):
+        if self.sensor_file is None:
+            self.sensor_file = os.path.join(DATA_DIR, self.name + ".csv")
+
+    @property
+    def temp_ranges(self):
+        return np.arange(self.high_temp, self.low_temp - abs(self.temp_interval), self.temp_interval)
+
+    @property
+    def time_interval_ms(self):
+        return 60000 * self.time_interval
+
+    @property
+    def out_dir(self):
+        return os.path.join(REPORTS_DIR, self.name)
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+
+# subroutine to pull the run parameters out of a run name, raises ValueError if it does not follow the convention
+def parse_run_name(name):
+    match = _NAME.match(name)
+    if match is None:
+        raise ValueError("Run name " + name + " does not follow the naming convention, add it to a manifest")
+    params = {"name": name, "date": match.group("date")}
+    if match.group("unit"):
+        params["unit"] = int(match.group("unit"))
+    if match.group("capture"):
+        params["capture"] = int(match.group("capture"))
+
+    bb = [float(t) for t in match.group("bb").split("-")]
+    params["low_temp"], params["high_temp"] = min(bb), max(bb)
+
+    chamber = match.group("chamber")
+    if chamber in ("noch", "nochamber"):
+        params["chamber_temps"] = [NO_CHAMBER_TEMP]
+    elif re.match(r"^\d+$", chamber):
+        params["chamber_temps"] = [int(chamber)]
+    elif re.match(r"^CH\d+-\d+$", chamber):
+        low, high = [int(t) for t in chamber[2:].split("-")]
+        params["chamber_temps"] = list(range(low, high + 1, 5))
+    else:
+        raise ValueError("Chamber temps for " + name + " (" + chamber + ") must be given in a manifest")
+    return params
+
+
+def run_config(name, **overrides):
+    try:
+        params = parse_run_name(name)
+    except ValueError:
+        if "high_temp" not in overrides or "chamber_temps" not in overrides:
+            raise
+        params = {"name": name}
+    params.update(overrides)
+    return RunConfig(**params)
+
+
+# read a manifest, a JSON list of {"name": ..., overrides...}
+def load_manifest(path):
+    with open(path) as file:
+        entries = json.load(file)
+    return [run_config(**entry) for entry in entries]
+
+
+# True if the folder in Reports belongs to a run: its name follows the naming
+# convention or it holds the run's stamp, artifact or statistics csv files
+def is_run_dir(path):
+    name = os.path.basename(os.path.normpath(path))
+    try:
+        parse_run_name(name)
+        return True
+    except ValueError:
+        pass
+    if os.path.exists(os.path.join(path, STAMP)) or os.path.exists(os.path.join(path, name + ".npz")):
+        return True
+    return bool(glob.glob(os.path.join(path, "voltage_avg_" + name + ".csv")) or
+                glob.glob(os.path.join(path, "*", "*_voltage_avg_" + name + ".csv")))
+
+
+# names of every run with a folder in Reports, other folders such as sensor_log are left out
+def report_runs(reports_dir=REPORTS_DIR):
+    return sorted(os.path.basename(os.path.dirname(p)) for p in glob.glob(os.path.join(reports_dir, "*", ""))
+                  if is_run_dir(p))
+
+
+# ---------------------------------------------------------------- stages
+
+def _session_events(config):
+    from session_log import load_session
+    return load_session(config.session_file)[3]
+
+
+# chamber windows from the session's chamber steps, None without a session or chamber steps in it
+def _session_chamber(config):
+    if config.session_file is None:
+        return None
+    chamber = chamber_schedule_from_events(_session_events(config), 60000 * config.offset)
+    return chamber if len(chamber) else None
+
+
+def stage_load(config):
+    t_end = 60000 * (config.offset + len(config.chamber_temps) * config.chamb_time_interval)
+    chamber = _session_chamber(config)
+    if chamber is not None:
+        # the last window ends with the program, or runs to the end of the log
+        t_end = chamber["End(ms)"].max()
+        t_end = t_end if np.isfinite(t_end) else None
+    return load_sensor(config.sensor_file, t_end=t_end)
+
+
+def build_schedule(config):
+    if config.session_file is not None:
+        return schedule_from_events(_session_events(config), 60000 * config.begin_cutoff, 60000 * config.end_cutoff,
+                                    60000 * config.offset)
+    return step_schedule(config.temp_ranges, config.chamber_temps, config.time_interval_ms,
+                         60000 * config.begin_cutoff, 60000 * config.end_cutoff, 60000 * config.offset)
+
+
+# one window per chamber temp, from the session when it has the chamber steps, otherwise chamb_time_interval each
+def build_chamber_schedule(config):
+    chamber = _session_chamber(config)
+    if chamber is not None:
+        return chamber
+    return chamber_schedule(config.chamber_temps, 60000 * config.chamb_time_interval)
+
+
+# samples inside each hold window, labelled with BB Temp, Chamber Temp and Segment
+def stage_segment(config, data, schedule):
+    return segment(data, schedule).labelled()
+
+
+def stage_smooth(config, labelled, columns):
+    return smooth_labelled(labelled, columns, config.window_size)
+
+
+def stage_stats(config, labelled, columns):
+    return step_stats(labelled, columns)
+
+
+# fit of BB temp against average voltage for each chamber temp, every channel at once
+# returns a table of Chamber Temp, Channel, the coefficients (Slope, Intercept for a linear fit),
+# their standard errors and the residual statistics
+def stage_fit(config, stats, channels=CHANNELS):
+    parts = []
+    for chamber_temp in config.chamber_temps:
+        avgs = wide(stats, "mean", chamber_temp)
+        calibration = fit_calibration(avgs[channels], avgs["BB Temp"].to_numpy(), config.fit_degree)
+        table = calibration.table()
+        table.insert(loc = 0, column = "Chamber Temp", value = chamber_temp)
+        parts.append(table)
+    return pd.concat(parts, ignore_index=True)
+
+
+# voltages converted to temperature with each chamber temp's fit, flattened by the thermistor drift
+def stage_convert(config, data, fits, channels=CHANNELS):
+    chamber = build_chamber_schedule(config)
+    windows = segment(data, chamber)
+    # thermistor of the sensor each channel is on
+    internal = [0 if ch.startswith("T1") else 1 for ch in channels]
+    parts = []
+    for chamber_temp, window in zip(chamber["Chamber Temp"], windows):
+        calibration = Calibration.from_table(fits[fits["Chamber Temp"] == chamber_temp], config.fit_degree)
+        converted = window.copy()
+        therm = window[THERMISTORS].to_numpy(dtype=np.float64)
+        drift = therm - therm[min(DRIFT_REFERENCE, len(therm) - 1)] if len(therm) else therm
+        converted[channels] = calibration.apply(window[channels].to_numpy(dtype=np.float64)) + drift[:, internal]
+        parts.append(converted)
+    return pd.concat(parts)
+
+
+# decimated series for the report figures
+def stage_plot_data(config, data, labelled, converted):
+    chamber = build_chamber_schedule(config)
+    return plot_data(labelled, list(segment(data, chamber)), list(segment(converted, chamber)),
+                     config.chamber_temps)
+
+
+# the run's tables and series in one compressed file
+def stage_artifact(config, schedule, tables, series, keys):
+    meta = {
+        "name": config.name,
+        "config": config.to_dict(),
+        "schedule": schedule.to_dict(orient="list"),
+        "stages": keys,
+    }
+    return write_artifact(os.path.join(config.out_dir, config.name + ".npz"), meta, tables, series)
+
+
+# csv files for each chamber temp, named the way the notebook names them
+def stage_csv(config, tables, series, channels=CHANNELS):
+    written = []
+
+    def save(table, chamber_temp, kind):
+        folder = os.path.join(config.out_dir, str(chamber_temp))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, str(chamber_temp) + "_" + kind + "_" + config.name + ".csv")
+        table.to_csv(path)
+        written.append(path)
+
+    voltage_stats = tables["voltage_stats"][tables["voltage_stats"]["Channel"].isin(channels)]
+    smoothed_stats = tables["smoothed_stats"]
+    temp_stats = tables["temp_stats"]
+    for chamber_temp in config.chamber_temps:
+        ch_avgs = wide(voltage_stats, "mean", chamber_temp)
+        sensitivity = ch_avgs[channels].diff().iloc[1:] / config.temp_interval
+        sensitivity.index = [str(a) + "to" + str(b) for a, b in zip(ch_avgs["BB Temp"].iloc[:-1], ch_avgs["BB Temp"].iloc[1:])]
+        save(ch_avgs, chamber_temp, "voltage_avg")
+        save(wide(voltage_stats, "std", chamber_temp), chamber_temp, "voltage_std_dev")
+        save(wide(smoothed_stats, "std", chamber_temp), chamber_temp, "voltage_averaged_std_dev")
+        save(sensitivity, chamber_temp, "voltage_sens")
+        save(wide(temp_stats, "mean", chamber_temp, label="Temp"), chamber_temp, "temp_avg")
+        save(wide(temp_stats, "std", chamber_temp, label="Temp"), chamber_temp, "temp_std_dev")
+        for stage, kind in (("raw", "raw_cleaned"), ("smoothed", "raw_averaged_cleaned"), ("converted", "temp_cleaned")):
+            frame = series[stage]
+            save(frame[frame["Chamber Temp"] == chamber_temp], chamber_temp, kind)
+
+    path = os.path.join(config.out_dir, "fits_" + config.name + ".csv")
+    tables["fits"].to_csv(path, index=False)
+    written.append(path)
+    return written
+
+
+# run every stage for one run, returns the list of files written
+# stages are looked up in cache first, by default results are kept for this call only
+# figures are rendered by `workers` processes, or in this one when workers is 1
+# csv=True also writes the tables and cleaned series as csv files
+def process(config, cache=None, plots=True, workers=1, csv=False):
+    if cache is None:
+        cache = StageCache(None)
+    inputs = [cache.file_digest(config.sensor_file)]
+    if config.session_file is not None:
+        inputs.append(cache.file_digest(config.session_file))
+    # everything the hold windows depend on
+    windows = [inputs, config.temp_ranges.tolist(), config.chamber_temps, config.time_interval,
+               config.begin_cutoff, config.end_cutoff, config.offset]
+    chamber = [config.chamber_temps, config.chamb_time_interval]
+
+    load_key = cache.key("load", inputs, config.offset, chamber)
+    # the loader keeps its own memory-mapped cache, so the raw data is never pickled
+    data = cache.lazy("load", load_key, lambda: stage_load(config), store=False)
+    schedule = build_schedule(config)
+
+    segment_key = cache.key("segment", load_key, windows)
+    labelled = cache.lazy("segment", segment_key, lambda: stage_segment(config, data(), schedule))
+    smooth_key = cache.key("smooth", segment_key, config.window_size)
+    smoothed = cache.lazy("smooth", smooth_key, lambda: stage_smooth(config, labelled(), CHANNELS))
+
+    stats_key = cache.key("stats", segment_key)
+    voltage_stats = cache.lazy("stats", stats_key, lambda: stage_stats(config, labelled(), CHANNELS + THERMISTORS))
+    smoothed_stats_key = cache.key("smoothed_stats", smooth_key)
+    smoothed_stats = cache.lazy("smoothed_stats", smoothed_stats_key, lambda: stage_stats(config, smoothed(), CHANNELS))
+
+    fit_key = cache.key("fit", stats_key, config.chamber_temps, config.fit_degree)
+    fits = cache.lazy("fit", fit_key, lambda: stage_fit(config, voltage_stats()))
+    convert_key = cache.key("convert", load_key, fit_key, chamber)
+    converted = cache.lazy("convert", convert_key, lambda: stage_convert(config, data(), fits()))
+    convert_segment_key = cache.key("convert_segment", convert_key, windows)
+    converted_labelled = cache.lazy("convert_segment", convert_segment_key,
+                                    lambda: stage_segment(config, converted(), schedule))
+    temp_stats_key = cache.key("temp_stats", convert_segment_key)
+    temp_stats = cache.lazy("temp_stats", temp_stats_key, lambda: stage_stats(config, converted_labelled(), CHANNELS))
+
+    os.makedirs(config.out_dir, exist_ok=True)
+    tables = {
+        "schedule": schedule,
+        "voltage_stats": voltage_stats(),
+        "smoothed_stats": smoothed_stats(),
+        "temp_stats": temp_stats(),
+        "fits": fits(),
+    }
+    series = {"raw": labelled(), "smoothed": smoothed(), "converted": converted_labelled()}
+    keys = {"segment": segment_key, "smooth": smooth_key, "fit": fit_key, "convert": convert_key}
+    written = [stage_artifact(config, schedule, tables, series, keys)]
+    if csv:
+        written += stage_csv(config, tables, series)
+    if plots:
+        plot_key = cache.key("plot_data", segment_key, convert_key)
+        plot_series = cache.run("plot_data", plot_key, lambda: stage_plot_data(config, data(), labelled(), converted()))
+        with Renderer(workers) as renderer:
+            submit_figures(renderer, config.out_dir, config.name, config.chamber_temps, plot_series,
+                           config.temp_ranges, load_lut(FILTER_FILE, CHANNELS))
+        written += renderer.paths
+    return written
+
+
+# ---------------------------------------------------------------- change detection
+
+# everything a run's outputs depend on
+def run_stamp(config, cache, plots=True, csv=False):
+    inputs = {}
+    for path in (config.sensor_file, config.session_file, FILTER_FILE):
+        if path is not None:
+            inputs[path] = cache.file_digest(path)
+    return {
+        "config": config.to_dict(),
+        "inputs": inputs,
+        "code": cache.version,
+        "plots": plots,
+        "csv": csv,
+    }
+
+
+def read_stamp(config):
+    path = os.path.join(config.out_dir, STAMP)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_stamp(config, stamp):
+    with open(os.path.join(config.out_dir, STAMP), "w") as file:
+        json.dump(stamp, file, indent=1, default=str)
+
+
+# process a run unless its stamp is unchanged, returns "skipped" or "processed"
+# cache_dir=None turns the stage cache off, figures are rendered by `workers` processes
+def process_if_changed(config, force=False, version=None, cache_dir=None, plots=True, csv=False, workers=1):
+    cache = StageCache(cache_dir, version)
+    stamp = json.loads(json.dumps(run_stamp(config, cache, plots, csv), default=str))
+    if not force and read_stamp(config) == stamp:
+        return "skipped"
+    process(config, cache, plots, workers, csv)
+    write_stamp(config, stamp)
+    if cache_dir is None:
+        return "processed"
+    return "processed, " + str(cache.hits()) + " of " + str(len(cache.log)) + " stages cached"
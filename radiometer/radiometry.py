@@ -0,0 +1,60 @@
+# Band-integrated Planck radiance for the radiometer channels
+
+# Radiance is evaluated on a (temperature x wavelength) grid in one
+# broadcast and integrated against the (wavelength x channel) filter
+# response with a single matrix product. Temperatures are processed in
+# blocks so very dense grids do not need one huge intermediate array.
+
+import numpy as np
+import pandas as pd
+
+from radiometer import CHANNELS
+
+H = 6.62607015e-34  # Planck's constant
+C = 299792458  # Speed of light
+K = 1.38064852e-23  # Boltzmann constant
+
+FILTER_FILE = "Data/dexter_filters.csv"
+# temperatures evaluated per block in band_radiance
+BLOCK = 2048
+
+
+# Planck spectral radiance for wavelengths in m and temperatures in C
+# wavelength and temperature broadcast against each other
+def planck_radiance(wavelength, temperature):
+    wavelength = np.asarray(wavelength, dtype=np.float64)
+    temperature = np.asarray(temperature, dtype=np.float64) + 273.15  # convert celsius to Kelvin
+    numerator = 2 * H * C ** 2
+    denominator = wavelength ** 5 * np.expm1((H * C) / (wavelength * K * temperature))
+    return numerator / denominator
+
+
+# read the filter response curves
+# returns wavelengths in m and a (wavelength x channel) response, each channel divided by its max
+def load_filters(filter_file=FILTER_FILE, channels=CHANNELS):
+    dex = pd.read_csv(filter_file)
+    wavelengths = dex["Wavelength"].to_numpy(dtype=np.float64) * 1e-6
+    response = dex[channels].to_numpy(dtype=np.float64)
+    response = response / np.abs(response).max(axis=0)
+    return wavelengths, response
+
+
+# band-averaged radiance for every temperature and channel, returns a (temperature x channel) array
+# the wavelength spacing is uniform, so the integral reduces to a weighted sum
+def band_radiance(temps, wavelengths, response, block=BLOCK):
+    temps = np.atleast_1d(np.asarray(temps, dtype=np.float64))
+    weights = response / response.sum(axis=0)
+    radiance = np.empty((temps.size, response.shape[1]))
+    for start in range(0, temps.size, block):
+        stop = start + block
+        planck = planck_radiance(wavelengths[np.newaxis, :], temps[start:stop, np.newaxis])
+        radiance[start:stop] = planck @ weights
+    return radiance
+
+
+# band radiance as a table with a Temperature column followed by one column per channel
+def band_radiance_table(temps, filter_file=FILTER_FILE, channels=CHANNELS):
+    wavelengths, response = load_filters(filter_file, channels)
+    table = pd.DataFrame(band_radiance(temps, wavelengths, response), columns=channels)
+    table.insert(loc = 0, column = "Temperature", value = temps)
+    return table
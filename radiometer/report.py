@@ -0,0 +1,216 @@
+# Report figures for a processed run
+
+# Figures are built with matplotlib's object oriented API on the Agg
+# canvas, so they never touch pyplot state or need a display, and can be
+# rendered in worker processes while the analysis carries on. Time
+# series are reduced to a min/max envelope at about the output's pixel
+# width before they are sent to a worker or plotted, so a multi-million
+# sample log draws the same picture from a few thousand points. Each
+# figure is saved exactly once, after it is complete.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from radiometer import CHANNELS, THERMISTORS, TIME
+
+# horizontal resolution the envelope keeps, about the width of a saved figure in pixels
+PIXELS = 1000
+DPI = 100
+
+
+# min/max envelope of y against sorted x with about `points` bins
+# returns x and y with two points per bin, y may be (samples,) or (samples x columns)
+def envelope(x, y, points=PIXELS):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(x)
+    if n <= 2 * points:
+        return x, y
+    edges = np.linspace(0, n, points + 1).astype(int)
+    starts = edges[:-1]
+    lo = np.minimum.reduceat(y, starts, axis=0)
+    hi = np.maximum.reduceat(y, starts, axis=0)
+    xs = np.repeat(x[(starts + edges[1:] - 1) // 2], 2)
+    ys = np.empty((2 * points,) + y.shape[1:], dtype=y.dtype)
+    ys[0::2] = lo
+    ys[1::2] = hi
+    return xs, ys
+
+
+# subroutine to decimate the time and columns of a frame for plotting
+def series(frame, columns, points=PIXELS, time_col=TIME):
+    x, y = envelope(frame[time_col].to_numpy(), frame[columns].to_numpy(), points)
+    return {"time": x, "values": y, "columns": list(columns)}
+
+
+def save(fig, path):
+    FigureCanvasAgg(fig)
+    fig.savefig(path, dpi=DPI, bbox_inches='tight')
+
+
+# ---------------------------------------------------------------- figures
+
+# channel voltages for each chamber temp, side by side
+def raw_data_figure(windows, titles):
+    fig = Figure(figsize=(6 * len(windows), 4))
+    for i, (window, title) in enumerate(zip(windows, titles)):
+        ax = fig.add_subplot(1, len(windows), i + 1)
+        ax.plot(window["time"], window["values"])
+        ax.legend(window["columns"], fontsize = 10)
+        ax.set_title("Radiometer Channels Raw Data (Chamber Temp: " + str(title) + "\N{DEGREE CELSIUS})")
+        ax.set_ylim([0, 3.4])
+        ax.set_ylabel("Voltage (V)")
+        ax.set_xlabel("Time(ms)")
+    return fig
+
+
+# grid of the channel voltages in each hold window
+def segmented_figure(segments, titles, ylabel="Voltage (V)", ylim=(0, 3.3)):
+    rows = max(3, int(np.ceil(len(segments) / 4.0)))
+    fig = Figure(figsize=(16, 3.2 * rows))
+    fig.subplots_adjust(wspace=0.3, hspace=0.6)
+    for i, (seg, title) in enumerate(zip(segments, titles)):
+        ax = fig.add_subplot(rows, 4, i + 1)
+        ax.plot(seg["time"], seg["values"])
+        ax.set_title("BB Temp at " + str(title))
+        ax.set_ylabel(ylabel)
+        if ylim is not None:
+            ax.set_ylim(ylim)
+        ax.set_xlabel("Time(ms)")
+        ax.legend(seg["columns"], fontsize = 5)
+    return fig
+
+
+# one panel per channel of converted temperature
+def channel_temps_figure(window, ylim=None):
+    rows = int(np.ceil(len(window["columns"]) / 4.0))
+    fig = Figure(figsize=(16, 3.2 * rows))
+    fig.subplots_adjust(wspace=0.3, hspace=0.6)
+    for i, ch in enumerate(window["columns"]):
+        ax = fig.add_subplot(rows, 4, i + 1)
+        ax.plot(window["time"], window["values"][:, i])
+        ax.set_xlabel("Time (ms)")
+        ax.set_ylabel("Temp (\N{DEGREE CELSIUS})")
+        ax.set_title(ch)
+        ax.grid(color='gray', linestyle='-', linewidth=0.3)
+        if ylim is not None:
+            ax.set_ylim(ylim)
+    return fig
+
+
+# converted temperatures of every channel with the internal temperatures for the whole capture
+def temps_figure(temps, ylim=None):
+    fig = Figure(figsize=(10, 5))
+    ax = fig.add_subplot(1, 1, 1)
+    ax.plot(temps["time"], temps["values"])
+    ax.set_xlabel("Time (ms)")
+    ax.set_ylabel("Temp (\N{DEGREE CELSIUS})")
+    ax.set_title("Temperature vs. Time")
+    ax.grid(color='gray', linestyle='-', linewidth=0.3)
+    if ylim is not None:
+        ax.set_ylim(ylim)
+    ax.legend(temps["columns"], fontsize = 5)
+    return fig
+
+
+# band radiance of each channel against temperature
+def radiance_figure(temps, radiance, channels):
+    fig = Figure(figsize=(8, 5))
+    ax = fig.add_subplot(1, 1, 1)
+    ax.plot(temps, radiance)
+    ax.set_title("Band Radiance vs. Temperature")
+    ax.set_xlabel("Temp (\N{DEGREE CELSIUS})")
+    ax.set_ylabel("Radiance")
+    ax.legend(channels, fontsize = 5)
+    return fig
+
+
+# build a figure with one of the functions above and save it, run in the worker
+def render(builder, path, *args, **kwargs):
+    save(builder(*args, **kwargs), path)
+    return path
+
+
+class Renderer:
+    # workers=1 renders in the calling process as each figure is submitted
+    def __init__(self, workers=1):
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.futures = []
+        self.paths = []
+
+    def submit(self, builder, path, *args, **kwargs):
+        if self.pool is None:
+            self.paths.append(render(builder, path, *args, **kwargs))
+        else:
+            self.futures.append(self.pool.submit(render, builder, path, *args, **kwargs))
+
+    # wait for every figure, returns the saved paths
+    def close(self):
+        if self.pool is not None:
+            try:
+                self.paths.extend(future.result() for future in self.futures)
+            finally:
+                self.pool.shutdown()
+                self.pool = None
+        return self.paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------------- pipeline
+
+# decimated series for the report figures, small enough to cache and send to workers
+# windows are the chamber-temp windows of the raw data and of the converted temperatures
+def plot_data(labelled, raw_windows, converted_windows, chamber_temps, channels=CHANNELS):
+    segments = {}
+    for chamber_temp in chamber_temps:
+        rows = labelled[labelled["Chamber Temp"] == chamber_temp]
+        ids = rows["Segment"].to_numpy()
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(ids)) + 1, [len(ids)]])
+        segments[chamber_temp] = [(rows["BB Temp"].iloc[a], series(rows.iloc[a:b], channels, PIXELS // 4))
+                                  for a, b in zip(starts[:-1], starts[1:]) if b > a]
+    return {
+        "raw": [series(w, channels) for w in raw_windows],
+        "segments": segments,
+        "converted": [series(w, channels) for w in converted_windows],
+        "temps": [series(w, channels + THERMISTORS) for w in converted_windows],
+    }
+
+
+# submit every report figure of a run to the renderer
+def submit_figures(renderer, out_dir, name, chamber_temps, plots, temp_ranges=None, lut=None):
+    def path(chamber_temp, kind):
+        if chamber_temp is None:
+            return os.path.join(out_dir, kind + "_" + name + ".png")
+        folder = os.path.join(out_dir, str(chamber_temp))
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, str(chamber_temp) + "_" + kind + "_" + name + ".png")
+
+    os.makedirs(out_dir, exist_ok=True)
+    ylim = None
+    if temp_ranges is not None and len(temp_ranges):
+        ylim = (min(temp_ranges) - 5, max(temp_ranges) + 25)
+
+    renderer.submit(raw_data_figure, path(None, "raw_data"), plots["raw"], chamber_temps)
+    for chamber_temp, converted in zip(chamber_temps, plots["converted"]):
+        segs = plots["segments"][chamber_temp]
+        renderer.submit(segmented_figure, path(chamber_temp, "segmented_temp_voltages"),
+                        [s for _, s in segs], [t for t, _ in segs])
+        renderer.submit(channel_temps_figure, path(chamber_temp, "indiv_channel_temps"), converted, ylim)
+    if plots["temps"]:
+        temps = {"time": np.concatenate([t["time"] for t in plots["temps"]]),
+                 "values": np.concatenate([t["values"] for t in plots["temps"]]),
+                 "columns": plots["temps"][0]["columns"]}
+        renderer.submit(temps_figure, path(None, "temps"), temps, ylim)
+    if lut is not None and temp_ranges is not None and len(temp_ranges):
+        grid = np.linspace(min(temp_ranges), max(temp_ranges), 200)
+        radiance = np.column_stack([lut.radiance_of(grid, ch) for ch in lut.channels])
+        renderer.submit(radiance_figure, path(None, "radiance"), grid, radiance, lut.channels)
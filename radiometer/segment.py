@@ -0,0 +1,150 @@
+# Segmentation of sensor logs into blackbody hold windows
+
+# A schedule is a DataFrame with one row per hold window:
+#   Chamber Temp, BB Temp, Start(ms), End(ms)
+# where Start and End already include the begin/end cutoffs. Samples
+# strictly between Start and End belong to the window. The time column of
+# a sensor log is sorted, so every window boundary is found with a single
+# searchsorted call and each window is a slice of the log rather than a
+# boolean mask over the whole thing.
+
+import numpy as np
+import pandas as pd
+
+from radiometer import TIME
+
+SCHEDULE_COLUMNS = ["Chamber Temp", "BB Temp", "Start(ms)", "End(ms)"]
+# events that end a blackbody hold in a session file
+_STEP_END = ["bb_step", "bb_sweep_end", "chamber_step", "chamber_program_end"]
+
+
+# hold windows for a fixed-length sweep, laid out the same way as the notebook parameters:
+# for each chamber temp the BB steps through temp_ranges, holding each for time_interval_ms.
+# With several chamber temps the first interval of each chamber step is skipped
+# (the BB sits at 25C before its sweep) unless skip_first says otherwise
+def step_schedule(temp_ranges, chamber_temps, time_interval_ms, begin_cutoff=0, end_cutoff=0, offset=0,
+                  skip_first=None):
+    if skip_first is None:
+        skip_first = len(chamber_temps) > 1
+    rows = []
+    lower_bound = offset
+    for chamber_temp in chamber_temps:
+        if skip_first:
+            lower_bound += time_interval_ms
+        for bb_temp in temp_ranges:
+            rows.append((chamber_temp, bb_temp, lower_bound + begin_cutoff,
+                         lower_bound + time_interval_ms - end_cutoff))
+            lower_bound += time_interval_ms
+    return pd.DataFrame(rows, columns=SCHEDULE_COLUMNS)
+
+
+# one window per chamber temp, each chamb_time_interval long
+def chamber_schedule(chamber_temps, chamb_time_interval, start=0):
+    rows = [(cham, np.nan, start + i * chamb_time_interval, start + (i + 1) * chamb_time_interval)
+            for i, cham in enumerate(chamber_temps)]
+    return pd.DataFrame(rows, columns=SCHEDULE_COLUMNS)
+
+
+# hold windows from the step events of a session file (the events frame from session_log.load_session)
+# each bb_step holds until the next step or end event, offset is the sensor log time of session t = 0
+# a step with a bb_stable event (adaptive dwell) starts where the blackbody settled instead of after begin_cutoff
+def schedule_from_events(events, begin_cutoff=0, end_cutoff=0, offset=0):
+    events = events.sort_values("Time(ms)")
+    times = events["Time(ms)"].to_numpy() + offset
+    names = events["Event"].to_numpy()
+    values = events["Value"].to_numpy()
+
+    rows = []
+    chamber_temp = np.nan
+    for i in range(len(events)):
+        if names[i] == "chamber_step":
+            chamber_temp = values[i]
+        if names[i] != "bb_step":
+            continue
+        later = np.flatnonzero(np.isin(names[i + 1:], _STEP_END))
+        last = i + 1 + later[0] if later.size else len(events)
+        end = times[last] if later.size else np.inf
+        stable = np.flatnonzero(names[i + 1:last] == "bb_stable")
+        start = times[i + 1 + stable[0]] if stable.size else times[i] + begin_cutoff
+        rows.append((chamber_temp, values[i], start, end - end_cutoff))
+    return pd.DataFrame(rows, columns=SCHEDULE_COLUMNS)
+
+
+# one window per chamber_step event of a session file, held until the next chamber step or the end of the program
+# empty when the session has no chamber steps
+def chamber_schedule_from_events(events, offset=0):
+    events = events.sort_values("Time(ms)")
+    times = events["Time(ms)"].to_numpy() + offset
+    names = events["Event"].to_numpy()
+    values = events["Value"].to_numpy()
+
+    rows = []
+    for i in np.flatnonzero(names == "chamber_step"):
+        later = np.flatnonzero(np.isin(names[i + 1:], ["chamber_step", "chamber_program_end"]))
+        end = times[i + 1 + later[0]] if later.size else np.inf
+        rows.append((values[i], np.nan, times[i], end))
+    return pd.DataFrame(rows, columns=SCHEDULE_COLUMNS)
+
+
+class Segments:
+    def __init__(self, data, schedule, time_col=TIME):
+        times = data[time_col].to_numpy()
+        if np.any(np.diff(times) < 0):
+            raise ValueError(time_col + " must be sorted to segment the log")
+        self.data = data
+        self.schedule = schedule.reset_index(drop=True)
+        # first sample after Start and first sample at or after End
+        self.lo = np.searchsorted(times, self.schedule["Start(ms)"].to_numpy(), side='right')
+        self.hi = np.maximum(self.lo, np.searchsorted(times, self.schedule["End(ms)"].to_numpy(), side='left'))
+
+    def __len__(self):
+        return len(self.schedule)
+
+    # rows of window k, a slice of the log
+    def __getitem__(self, k):
+        return self.data.iloc[self.lo[k]:self.hi[k]]
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def sizes(self):
+        return self.hi - self.lo
+
+    # window number of every sample, -1 for samples outside every window
+    def ids(self):
+        ids = np.full(len(self.data), -1)
+        for k in range(len(self)):
+            ids[self.lo[k]:self.hi[k]] = k
+        return ids
+
+    # the samples inside windows with BB Temp, Chamber Temp and Segment columns added,
+    # windows stay contiguous and in schedule order
+    def labelled(self):
+        sizes = self.sizes()
+        rows = np.concatenate([np.arange(a, b) for a, b in zip(self.lo, self.hi)] + [np.zeros(0, dtype=int)])
+        ids = np.repeat(np.arange(len(self)), sizes)
+        out = self.data.iloc[rows].copy()
+        out.insert(loc = 1, column = "BB Temp", value = self.schedule["BB Temp"].to_numpy()[ids])
+        out["Chamber Temp"] = self.schedule["Chamber Temp"].to_numpy()[ids]
+        out["Segment"] = ids
+        return out
+
+    # {str(BB temp): window} for each chamber temp, the layout the notebook cells use
+    # windows are slices of labelled, so they carry the BB Temp column
+    def step_dicts(self, labelled=None):
+        if labelled is None:
+            labelled = self.labelled()
+        ends = np.cumsum(self.sizes())
+        starts = ends - self.sizes()
+        dicts = []
+        chamber_temps = self.schedule["Chamber Temp"].to_numpy()
+        for k in range(len(self)):
+            if k == 0 or not (chamber_temps[k] == chamber_temps[k - 1]):
+                dicts.append({})
+            dicts[-1][str(self.schedule["BB Temp"].iloc[k])] = labelled.iloc[starts[k]:ends[k]]
+        return dicts
+
+
+def segment(data, schedule, time_col=TIME):
+    return Segments(data, schedule, time_col)
@@ -0,0 +1,120 @@
+# Streaming rolling-window smoothing for sensor logs
+
+# StreamingSmoother takes a log one block of rows at a time and keeps
+# only the last window - 1 samples between blocks, so a log of any length
+# is smoothed with a fixed amount of extra memory. The moving average is
+# a difference of cumulative sums, the gaussian kernel (the same weights
+# as scipy.signal.gaussian) is a weighted sum over a sliding window view.
+# Outputs line up with pandas rolling(window): a row is NaN until a full
+# window has been seen since the last reset. The smoother is reset at
+# every hold window boundary so steps never bleed into each other.
+
+import numpy as np
+import pandas as pd
+
+from radiometer import TIME
+from radiometer.segment import segment
+
+KERNELS = ["mean", "gaussian"]
+
+
+# symmetric gaussian window of m points
+def gaussian_window(m, std):
+    n = np.arange(m) - (m - 1) / 2.0
+    return np.exp(-0.5 * (n / std) ** 2)
+
+
+class StreamingSmoother:
+    def __init__(self, window, kernel="mean", std=None):
+        if kernel not in KERNELS:
+            raise ValueError("Kernel must be one of " + ", ".join(KERNELS))
+        self.window = int(window)
+        self.kernel = kernel
+        self.weights = None
+        if kernel == "gaussian":
+            weights = gaussian_window(self.window, std if std is not None else self.window / 5.0)
+            self.weights = weights / weights.sum()
+        self._tail = None  # last window - 1 samples seen
+
+    def reset(self):
+        self._tail = None
+
+    # smooth the next (samples x columns) block, returns an array of the same shape
+    def __call__(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        if self._tail is None:
+            self._tail = block[:0]
+        buf = np.concatenate([self._tail, block])
+        out = np.full(block.shape, np.nan)
+        full = buf.shape[0] - self.window + 1  # windows that end inside this block
+        if full > 0:
+            if self.weights is None:
+                c = np.cumsum(buf, axis=0)
+                c = np.concatenate([np.zeros((1, buf.shape[1])), c])
+                out[block.shape[0] - full:] = (c[self.window:] - c[:-self.window]) / self.window
+            else:
+                view = np.lib.stride_tricks.sliding_window_view(buf, self.window, axis=0)
+                out[block.shape[0] - full:] = view @ self.weights
+        self._tail = buf[buf.shape[0] - (self.window - 1):].copy() if self.window > 1 else buf[:0]
+        return out
+
+
+# subroutine to build the smoothed frame for the rows of one block
+def _frame(rows, smoothed, columns, keep):
+    out = pd.DataFrame(smoothed[keep], columns=columns, index=rows.index[keep])
+    labels = [col for col in (TIME, "BB Temp") if col in rows.columns]
+    for loc, col in enumerate(labels):
+        out.insert(loc = loc, column = col, value = rows[col].to_numpy()[keep])
+    for col in ("Chamber Temp", "Segment"):
+        if col in rows.columns:
+            out[col] = rows[col].to_numpy()[keep]
+    return out
+
+
+# smooth the columns of a labelled log (segment.Segments.labelled), restarting at every window
+# rows before each window fills are dropped
+def smooth_labelled(labelled, columns, window, kernel="mean", std=None):
+    smoother = StreamingSmoother(window, kernel, std)
+    values = labelled[columns].to_numpy()
+    smoothed = np.empty(values.shape)
+    ids = labelled["Segment"].to_numpy()
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(ids)) + 1, [len(ids)]])
+    for a, b in zip(starts[:-1], starts[1:]):
+        smoother.reset()
+        smoothed[a:b] = smoother(values[a:b])
+    return _frame(labelled, smoothed, columns, ~np.isnan(smoothed).any(axis=1))
+
+
+# smooth a log read in chunks, e.g. pd.read_csv(sensor_file, chunksize=1000000)
+# yields one frame of smoothed in-window rows per chunk, state carries across chunks
+def stream_smooth(chunks, schedule, columns, window, kernel="mean", std=None, time_col=TIME):
+    smoother = StreamingSmoother(window, kernel, std)
+    current = None
+    for chunk in chunks:
+        segments = segment(chunk, schedule, time_col)
+        values = chunk[columns].to_numpy()
+        for k in np.flatnonzero(segments.sizes()):
+            if k != current:
+                smoother.reset()
+                current = k
+            a, b = segments.lo[k], segments.hi[k]
+            smoothed = smoother(values[a:b])
+            keep = ~np.isnan(smoothed).any(axis=1)
+            if keep.any():
+                rows = chunk.iloc[a:b]
+                out = _frame(rows, smoothed, columns, keep)
+                out.insert(loc = 1, column = "BB Temp", value = schedule["BB Temp"].iloc[k])
+                out["Chamber Temp"] = schedule["Chamber Temp"].iloc[k]
+                out["Segment"] = k
+                yield out
+
+
+# stream_smooth written straight to a csv file, returns the number of rows written
+def smooth_to_csv(chunks, schedule, columns, path, window, kernel="mean", std=None, time_col=TIME):
+    rows = 0
+    for out in stream_smooth(chunks, schedule, columns, window, kernel, std, time_col):
+        out.to_csv(path, mode="w" if rows == 0 else "a", header=(rows == 0))
+        rows += len(out)
+    return rows
@@ -0,0 +1,161 @@
+# Per-step statistics for segmented sensor logs
+
+# step_stats computes every statistic for every channel and every hold
+# window in one grouped pass over a labelled log (segment.Segments.labelled)
+# and returns a long table with one row per window, channel and statistic:
+#   Segment, Chamber Temp, BB Temp, Channel, Stat, Value
+# wide() turns it back into the BB Temp x channel tables the notebook
+# writes to Reports. For logs too big to load at once, RunningStats keeps
+# count, mean and variance (Welford, merged per chunk with Chan's
+# formula) plus sum of squares, max and min, and stream_step_stats feeds
+# it chunk by chunk.
+
+import numpy as np
+import pandas as pd
+
+from radiometer import TIME
+from radiometer.segment import segment
+
+STATS = ["mean", "std", "rms", "max", "min", "ptp"]
+LABELS = ["Segment", "Chamber Temp", "BB Temp"]
+
+
+# subroutine to turn {stat: (segment x channel) frame} into the long table
+def _long(per_stat, labels):
+    parts = []
+    for stat, frame in per_stat.items():
+        part = frame.rename_axis("Segment").reset_index().melt(
+            id_vars="Segment", var_name="Channel", value_name="Value")
+        part.insert(loc = 2, column = "Stat", value = stat)
+        parts.append(part)
+    long = pd.concat(parts, ignore_index=True)
+    long = labels.merge(long, on="Segment")
+    # order by window, then channel and statistic in the order given
+    long["Stat"] = pd.Categorical(long["Stat"], categories=list(per_stat))
+    long["Channel"] = pd.Categorical(long["Channel"], categories=list(next(iter(per_stat.values())).columns))
+    long = long.sort_values(["Segment", "Channel", "Stat"], kind="stable").reset_index(drop=True)
+    long["Stat"] = long["Stat"].astype(str)
+    long["Channel"] = long["Channel"].astype(str)
+    return long
+
+
+# statistics of columns for every window of a labelled log, as a long table
+def step_stats(labelled, columns, stats=STATS):
+    grouped = labelled.groupby("Segment", sort=True)
+    values = grouped[columns]
+    per_stat = {}
+    for stat in stats:
+        if stat == "mean":
+            per_stat[stat] = values.mean()
+        elif stat == "std":
+            per_stat[stat] = values.std()
+        elif stat == "rms":
+            per_stat[stat] = np.sqrt((labelled[columns] ** 2).groupby(labelled["Segment"]).mean())
+        elif stat == "max":
+            per_stat[stat] = values.max()
+        elif stat == "min":
+            per_stat[stat] = values.min()
+        elif stat == "ptp":
+            per_stat[stat] = values.max() - values.min()
+        else:
+            raise ValueError("Unknown statistic " + stat)
+    labels = grouped[["Chamber Temp", "BB Temp"]].first().reset_index()
+    return _long(per_stat, labels)
+
+
+# one statistic as a table of BB Temp x channel, optionally for one chamber temp
+# rows are in window order and indexed by str(BB Temp), like the notebook's dictionaries
+def wide(stats, stat, chamber_temp=None, label="BB Temp"):
+    rows = stats[stats["Stat"] == stat]
+    if chamber_temp is not None:
+        rows = rows[rows["Chamber Temp"] == chamber_temp]
+    table = rows.pivot(index="Segment", columns="Channel", values="Value")
+    table = table[list(pd.unique(rows["Channel"]))]
+    bb = rows.groupby("Segment")["BB Temp"].first()
+    table.index = [str(t) for t in bb.to_numpy()]
+    table.columns.name = None
+    table.insert(loc = 0, column = label, value = bb.to_numpy())
+    return table
+
+
+class RunningStats:
+    def __init__(self, width):
+        self.count = 0
+        self._mean = np.zeros(width)
+        self._m2 = np.zeros(width)  # sum of squared differences from the mean
+        self._sumsq = np.zeros(width)
+        self.max = np.full(width, -np.inf)
+        self.min = np.full(width, np.inf)
+
+    # add a (samples x width) block
+    def update(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        n = block.shape[0]
+        if n == 0:
+            return
+        mean = block.mean(axis=0)
+        m2 = ((block - mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = mean - self._mean
+        self._mean = self._mean + delta * (n / total)
+        self._m2 = self._m2 + m2 + delta ** 2 * (self.count * n / total)
+        self._sumsq += (block ** 2).sum(axis=0)
+        self.max = np.maximum(self.max, block.max(axis=0))
+        self.min = np.minimum(self.min, block.min(axis=0))
+        self.count = total
+
+    # combine with the statistics of another part of the same data
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        delta = other._mean - self._mean
+        self._mean = self._mean + delta * (other.count / total)
+        self._m2 = self._m2 + other._m2 + delta ** 2 * (self.count * other.count / total)
+        self._sumsq = self._sumsq + other._sumsq
+        self.max = np.maximum(self.max, other.max)
+        self.min = np.minimum(self.min, other.min)
+        self.count = total
+        return self
+
+    @property
+    def mean(self):
+        return self._mean if self.count else np.full(self._mean.shape, np.nan)
+
+    # sample standard deviation, same as pandas std()
+    @property
+    def std(self):
+        if self.count < 2:
+            return np.full(self._mean.shape, np.nan)
+        return np.sqrt(self._m2 / (self.count - 1))
+
+    @property
+    def rms(self):
+        return np.sqrt(self._sumsq / self.count) if self.count else np.full(self._mean.shape, np.nan)
+
+    @property
+    def ptp(self):
+        return self.max - self.min
+
+    def get(self, stat):
+        return getattr(self, stat)
+
+
+# step_stats for a log read in chunks, e.g. pd.read_csv(sensor_file, chunksize=1000000)
+# only one chunk is in memory at a time
+def stream_step_stats(chunks, schedule, columns, stats=STATS, time_col=TIME):
+    running = [RunningStats(len(columns)) for _ in range(len(schedule))]
+    for chunk in chunks:
+        segments = segment(chunk, schedule, time_col)
+        values = chunk[columns].to_numpy()
+        for k in np.flatnonzero(segments.sizes()):
+            running[k].update(values[segments.lo[k]:segments.hi[k]])
+
+    seen = [k for k in range(len(schedule)) if running[k].count]
+    per_stat = {stat: pd.DataFrame([running[k].get(stat) for k in seen], index=seen, columns=columns)
+                for stat in stats}
+    labels = schedule.iloc[seen][["Chamber Temp", "BB Temp"]].copy()
+    labels.insert(loc = 0, column = "Segment", value = seen)
+    return _long(per_stat, labels.reset_index(drop=True))
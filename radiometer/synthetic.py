@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+# Synthetic sensor logs shaped like the sensor board's CSV
+#
+#   python -m radiometer.synthetic [-o Data/file.csv] [-H hours] [-r rate] [-c chamber temps] [-b BB range] [-s seed]
+#
+# The blackbody steps through a RunConfig's sweep at the start of each
+# chamber temp window, laid out exactly as segment.step_schedule expects,
+# and sits at 25 C otherwise. Blackbody and chamber follow their set
+# points with first-order lags. The thermistors follow the chamber plus
+# the board's warm-up, and each channel's voltage follows the band
+# radiance of the blackbody minus that of its detector (the channel's
+# filter curve from dexter_filters.csv), with its own gain and offset,
+# slow drift and white noise. Rows are generated in chunks, so a
+# week-long capture at a high rate never has to fit in memory.
+
+import getopt
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from radiometer import CHANNELS, THERMISTORS, TIME
+from radiometer.pipeline import RunConfig
+from radiometer.radiometry import FILTER_FILE, load_filters, band_radiance, planck_radiance
+from radiometer.segment import step_schedule, chamber_schedule
+
+# column order of the sensor board's CSV
+SENSOR_COLUMNS = [TIME] + CHANNELS[:4] + [THERMISTORS[0]] + CHANNELS[4:] + [THERMISTORS[1]]
+BB_IDLE = 25.0        # blackbody temp outside a sweep
+BB_TAU = 45.0         # seconds for the blackbody to cover 63% of a step
+CHAMBER_TAU = 1200.0  # seconds for the chamber air
+WARM_UP = 3.0         # C the board warms above the chamber
+WARM_UP_TAU = 1800.0  # seconds
+CHUNK_ROWS = 500000
+
+
+# subroutine to evaluate a first-order lag following piecewise constant targets
+# targets[k] applies from starts[k] (seconds, starts[0] = 0) until starts[k + 1]
+def _first_order(t, starts, targets, tau, initial):
+    starts = np.asarray(starts, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    values = np.empty(len(starts))
+    values[0] = initial
+    for k in range(1, len(starts)):
+        values[k] = targets[k - 1] + (values[k - 1] - targets[k - 1]) * math.exp(-(starts[k] - starts[k - 1]) / tau)
+    k = np.maximum(np.searchsorted(starts, t, side='right') - 1, 0)
+    return targets[k] + (values[k] - targets[k]) * np.exp(-(t - starts[k]) / tau)
+
+
+# a config for about `hours` of capture, cycling through chamber_temps every chamb_time_interval
+def synthetic_config(hours=12, chamber_temps=(25,), low_temp=5, high_temp=55, name="synthetic", **overrides):
+    params = {"chamb_time_interval": 720}
+    params.update(overrides)
+    minutes = hours * 60
+    count = max(1, int(math.ceil(minutes / params["chamb_time_interval"])))
+    if count == 1:
+        params["chamb_time_interval"] = minutes
+    temps = [chamber_temps[i % len(chamber_temps)] for i in range(count)]
+    return RunConfig(name=name, low_temp=low_temp, high_temp=high_temp, chamber_temps=temps, **params)
+
+
+class SyntheticSensor:
+    def __init__(self, config, rate=1.0, seed=0, noise=0.012, drift=0.004, filter_file=FILTER_FILE, duration_ms=None):
+        self.config = config
+        self.rate = rate                # samples per second
+        self.noise = noise              # std. dev of the white noise in V
+        self.random = np.random.default_rng(seed)
+        if duration_ms is None:
+            duration_ms = 60000 * (config.offset + len(config.chamber_temps) * config.chamb_time_interval)
+        self.duration_ms = duration_ms
+        self.rows = int(duration_ms * rate / 1000)
+
+        # set points as piecewise constant (start s, temp)
+        schedule = step_schedule(config.temp_ranges, config.chamber_temps, config.time_interval_ms,
+                                 offset=60000 * config.offset)
+        bb = [(0.0, BB_IDLE)]
+        for start, end, temp in zip(schedule["Start(ms)"], schedule["End(ms)"], schedule["BB Temp"]):
+            # back to back holds replace the idle set point at the end of the last one
+            if bb[-1][0] == start / 1000:
+                bb[-1] = (start / 1000, temp)
+            else:
+                bb.append((start / 1000, temp))
+            bb.append((end / 1000, BB_IDLE))
+        self.bb_starts, self.bb_targets = np.array(bb).T
+        windows = chamber_schedule(config.chamber_temps, 60000 * config.chamb_time_interval, 60000 * config.offset)
+        self.chamber_starts = np.concatenate([[0.0], windows["Start(ms)"].to_numpy()[1:] / 1000])
+        self.chamber_targets = windows["Chamber Temp"].to_numpy(dtype=np.float64)
+
+        # band radiance against temperature, from the filter curves when they are available
+        self.grid = np.arange(-60.0, 200.0, 0.05)
+        if filter_file is not None and os.path.exists(filter_file):
+            wavelengths, response = load_filters(filter_file, CHANNELS)
+            self.radiance = band_radiance(self.grid, wavelengths, response)
+        else:
+            self.radiance = np.repeat(planck_radiance(10e-6, self.grid)[:, None], len(CHANNELS), axis=1)
+        # volts per degree near 25 C, so the gains below are sensitivities
+        slope = np.gradient(self.radiance, self.grid, axis=0)[np.searchsorted(self.grid, 25.0)]
+        self.scale = 1.0 / slope
+        n = len(CHANNELS)
+        self.gain = self.random.uniform(0.02, 0.035, n)      # V/C
+        self.offset = self.random.uniform(1.4, 1.8, n)       # V with the blackbody at the detector temp
+        self.drift = self.random.normal(0, drift, n)         # V per hour
+        self.wander = self.random.uniform(0.002, 0.006, n)   # V amplitude of a slow oscillation
+        self.phase = self.random.uniform(0, 2 * np.pi, n)
+        self.therm_offset = np.array([0.0, 0.3])
+        self.sensor = np.array([0 if ch.startswith("T1") else 1 for ch in CHANNELS])
+
+    def _band(self, temps):
+        return np.column_stack([np.interp(temps[:, i], self.grid, self.radiance[:, i]) for i in range(temps.shape[1])])
+
+    # rows lo to hi of the log as a frame in SENSOR_COLUMNS order
+    def frame(self, lo, hi):
+        period = 1000.0 / self.rate
+        t_ms = (np.arange(lo, hi) + self.random.uniform(0, 0.1, hi - lo)) * period
+        t = t_ms / 1000
+        bb = _first_order(t, self.bb_starts, self.bb_targets, BB_TAU, BB_IDLE)
+        chamber = _first_order(t, self.chamber_starts, self.chamber_targets, CHAMBER_TAU, self.chamber_targets[0])
+        warm = WARM_UP * (1 - np.exp(-t / WARM_UP_TAU))
+        therms = (chamber + warm)[:, None] + self.therm_offset + self.random.normal(0, 0.02, (len(t), 2))
+
+        detector = therms[:, self.sensor]
+        signal = (self._band(np.repeat(bb[:, None], len(CHANNELS), axis=1)) - self._band(detector)) * self.scale
+        hours = t[:, None] / 3600
+        volts = (self.offset + self.gain * signal + self.drift * hours + self.wander * np.sin(2 * np.pi * hours / 6 + self.phase)
+                 + self.random.normal(0, self.noise, signal.shape))
+        volts = np.clip(volts, 0, 3.3)
+
+        data = {TIME: np.round(t_ms).astype(np.int64)}
+        for i, ch in enumerate(CHANNELS):
+            data[ch] = volts[:, i]
+        for i, name in enumerate(THERMISTORS):
+            data[name] = therms[:, i]
+        return pd.DataFrame(data)[SENSOR_COLUMNS]
+
+    def chunks(self, chunk_rows=CHUNK_ROWS):
+        for lo in range(0, self.rows, chunk_rows):
+            yield self.frame(lo, min(lo + chunk_rows, self.rows))
+
+    # write the whole log as a sensor csv, returns the path
+    def write(self, path, chunk_rows=CHUNK_ROWS):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        header = True
+        with open(path, "w", newline="") as file:
+            for chunk in self.chunks(chunk_rows):
+                chunk.to_csv(file, index=False, header=header, float_format="%.6f")
+                header = False
+        return path
+
+
+# write a synthetic capture for a config, returns the path of the csv
+def write_synthetic(config, path=None, rate=1.0, seed=0, **kwargs):
+    if path is None:
+        path = config.sensor_file
+    return SyntheticSensor(config, rate, seed, **kwargs).write(path)
+
+
+def main():
+    out = None
+    hours = 12.0
+    rate = 1.0
+    chamber_temps = [25]
+    low_temp, high_temp = 5, 55
+    seed = 0
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "ho:H:r:c:b:s:",
+                                   ["help", "output=", "hours=", "rate=", "chamber=", "bb=", "seed="])
+    except getopt.GetoptError as err:
+        print(err)
+        helpexit()
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            helpexit()
+        elif o in ("-o", "--output"):
+            out = a
+        elif o in ("-H", "--hours"):
+            hours = float(a)
+        elif o in ("-r", "--rate"):
+            rate = float(a)
+        elif o in ("-c", "--chamber"):
+            chamber_temps = [float(t) for t in a.split(",")]
+        elif o in ("-b", "--bb"):
+            low_temp, high_temp = sorted(float(t) for t in a.split("-"))
+        elif o in ("-s", "--seed"):
+            seed = int(a)
+        else:
+            assert False, "unhandled option"
+
+    name = os.path.splitext(os.path.basename(out))[0] if out else "synthetic"
+    config = synthetic_config(hours, chamber_temps, low_temp, high_temp, name=name)
+    sensor = SyntheticSensor(config, rate, seed, duration_ms=hours * 3600000)
+    print("Writing " + str(sensor.rows) + " rows, chamber temps " + str(config.chamber_temps))
+    print("Wrote " + sensor.write(out or config.sensor_file))
+    return 0
+
+
+def helpexit():
+    print("-h --help                        : display help message")
+    print("-o --output     [file.csv]       : output file (default Data/synthetic.csv)")
+    print("-H --hours      [float value]    : length of the capture (default 12)")
+    print("-r --rate       [Hz]             : samples per second (default 1)")
+    print("-c --chamber    [t1,t2,...]      : chamber temps, cycled every 12 hours (default 25)")
+    print("-b --bb         [low-high]       : blackbody sweep range (default 5-55)")
+    print("-s --seed       [int value]      : random seed (default 0)")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+# Session recording shared by the chamber and blackbody controllers
+
+# Chamber snapshots, blackbody readings and step-change events are all
+# written to one append-only file, stamped with the same monotonic
+# clock. The file starts with a JSON header line holding the wall clock
+# time of t = 0, followed by fixed-size records, so a whole session is
+# loaded with a single read.
+#
+# Record fields by kind:
+#   kind       t (s)   a            b           c          d
+#   chamber    t       temperature  set point   humidity   chamber time of day (s)
+#   blackbody  t       temperature  set point   -          -
+#   event      t       value        -           -          event code
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+MAGIC = "SESSION1"
+CHAMBER = 1
+BLACKBODY = 2
+EVENT = 3
+
+# event codes, stored in the header so old files stay readable if this list grows
+EVENTS = ["session_start", "chamber_step", "chamber_program_start", "chamber_program_end",
+          "bb_step", "bb_sweep_start", "bb_sweep_end", "marker", "chamber_stable",
+          "bb_stable"]
+
+RECORD_DTYPE = np.dtype([("kind", "u1"), ("t", "<f8"), ("a", "<f4"), ("b", "<f4"),
+                         ("c", "<f4"), ("d", "<i4")])
+
+
+#subroutine to replace None with NaN for float fields
+def _f(value):
+    return np.nan if value is None else value
+
+
+class SessionRecorder:
+    def __init__(self, path, flush_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval  # seconds between writes to disk
+        # records come from the chamber worker, the GUI and the telemetry thread
+        self.lock = threading.Lock()
+        self._buffer = []
+        self.file = None
+        self.origin = None
+        self._next_flush = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.file = open(self.path, "wb")
+        self.origin = time.monotonic()
+        header = {
+            "format": MAGIC,
+            "start": time.ctime(),
+            "start_epoch": time.time(),  # wall clock at t = 0
+            "events": EVENTS,
+        }
+        self.file.write((json.dumps(header) + "\n").encode('ascii'))
+        self._next_flush = self.origin + self.flush_interval
+        self.event("session_start")
+        return self
+
+    # seconds since the session started
+    def clock(self):
+        return time.monotonic() - self.origin
+
+    def _add(self, kind, a=None, b=None, c=None, d=0):
+        with self.lock:
+            if self.file is None:
+                return
+            now = time.monotonic()
+            self._buffer.append((kind, now - self.origin, _f(a), _f(b), _f(c), d))
+            if now >= self._next_flush:
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self.file.write(np.array(self._buffer, dtype=RECORD_DTYPE).tobytes())
+            self.file.flush()
+            del self._buffer[:]
+        self._next_flush = time.monotonic() + self.flush_interval
+
+    def chamber(self, snap):
+        self._add(CHAMBER, snap.temperature, snap.set_point, snap.humidity,
+                  snap.time_of_day if snap.time_of_day is not None else -1)
+
+    def blackbody(self, temp, set_point=None):
+        self._add(BLACKBODY, temp, set_point)
+
+    # step changes are flushed right away so a crash never loses a boundary
+    def event(self, name, value=None):
+        self._add(EVENT, value, d=EVENTS.index(name))
+        with self.lock:
+            if self.file is not None:
+                self._flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self._flush()
+                self.file.close()
+                self.file = None
+
+
+# subroutine to name a new session file in the given folder
+def session_path(folder="Sessions", prefix="session"):
+    return os.path.join(folder, prefix + "_" + time.strftime("%m%d%y_%H%M%S") + ".ses")
+
+
+# subroutine to load a session file
+# returns the header and DataFrames of chamber readings, blackbody readings and events,
+# each with a Time(ms) column on the shared clock and an Epoch column of wall clock seconds
+def load_session(path):
+    import pandas as pd
+
+    with open(path, "rb") as file:
+        header = json.loads(file.readline().decode('ascii'))
+        offset = file.tell()
+    records = np.fromfile(path, dtype=RECORD_DTYPE, offset=offset)
+
+    def frame(kind, columns):
+        rows = records[records["kind"] == kind]
+        df = pd.DataFrame({"Time(ms)": rows["t"] * 1000, "Epoch": header["start_epoch"] + rows["t"]})
+        for field, name in columns.items():
+            df[name] = rows[field]
+        return df
+
+    chamber = frame(CHAMBER, {"a": "Temperature", "b": "Set Point", "c": "Humidity", "d": "Time of Day"})
+    blackbody = frame(BLACKBODY, {"a": "BB Temp", "b": "Set Point"})
+    events = frame(EVENT, {"a": "Value"})
+    names = np.array(header["events"], dtype=object)
+    events.insert(loc = 2, column = "Event", value = names[records[records["kind"] == EVENT]["d"]])
+    return header, chamber, blackbody, events
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# Stability checks for adaptive dwell times
+
+# A Dwell decides when a set point has been reached instead of holding
+# it for a fixed number of minutes. The instrument's readings (chamber
+# temperature, blackbody M2/MDA) have to stay within a tolerance band of
+# the set point for a whole window, and, when the radiometer's log is
+# given, every radiometer channel has to have flattened: the means of
+# the two halves of the last window must agree within the noise, which
+# fails while the signal still drifts or ramps after a step, and the
+# noise left in each half once its trend is removed must have variances
+# within a factor of `flatness` of each other. A set point that never
+# settles is given up on after max_dwell seconds.
+
+import os
+
+import numpy as np
+
+
+# new rows of a capture that is still being written, such as the sensor board's CSV
+class SensorTail:
+    def __init__(self, path, time_col="Time(ms)"):
+        self.path = path
+        self.time_col = time_col
+        self.offset = 0        # bytes already read
+        self.partial = ""      # line still being written
+        self.columns = None    # indices of the time column and the voltage channels
+
+    # rows added since the last call, returns times in s and a (rows x channels) array
+    def read(self):
+        empty = np.empty(0), np.empty((0, 0))
+        if not os.path.exists(self.path):
+            return empty
+        if os.path.getsize(self.path) < self.offset:
+            # a new capture replaced the file
+            self.offset, self.partial, self.columns = 0, "", None
+        with open(self.path) as file:
+            file.seek(self.offset)
+            data = self.partial + file.read()
+            self.offset = file.tell()
+        lines = data.split("\n")
+        self.partial = lines.pop()
+        if self.columns is None and lines:
+            header = lines.pop(0).strip().split(",")
+            if self.time_col not in header:
+                return empty
+            self.columns = [header.index(self.time_col)] + [i for i, name in enumerate(header) if name.endswith("(v)")]
+        rows = []
+        for line in lines:
+            fields = line.strip().split(",")
+            try:
+                rows.append([float(fields[i]) for i in self.columns])
+            except (IndexError, ValueError):
+                continue  # blank or cut off line
+        if not rows:
+            return empty
+        rows = np.array(rows)
+        return rows[:, 0] / 1000, rows[:, 1:]
+
+
+# subroutine to get the mean and the variance around a straight line fit of every channel
+def _detrended(times, values):
+    t = times - times.mean()
+    mean = values.mean(axis=0)
+    slope = t @ (values - mean) / max(t @ t, 1e-12)
+    residual = values - mean - np.outer(t, slope)
+    return mean, residual.var(axis=0)
+
+
+class Dwell:
+    def __init__(self, tolerance, window, max_dwell, hold=0, flatness=None, signal=None):
+        self.tolerance = tolerance  # C the readings have to stay within of the set point
+        self.window = window        # seconds they have to stay there, and of radiometer signal checked
+        self.max_dwell = max_dwell  # seconds before giving up on settling
+        self.hold = hold            # seconds the set point is held once settled
+        self.flatness = flatness    # largest variance ratio between the halves of the window, None to skip
+        self.signal = signal        # optional SensorTail of the radiometer log
+
+        self.target = None
+        self.start = None
+        self.in_band_since = None
+        self.settled_at = None
+        self._times = np.empty(0)
+        self._values = None
+
+    # start on a new set point
+    def reset(self, now, target):
+        self.target = target
+        self.start = now
+        self.in_band_since = None
+        self.settled_at = None
+        self._times = np.empty(0)
+        self._values = None
+        if self.signal is not None:
+            self.signal.read()  # only what is logged from now on counts
+
+    # add a reading of the instrument, None for a missed one
+    def add(self, now, value):
+        if value is None or abs(value - self.target) > self.tolerance:
+            self.in_band_since = None
+        elif self.in_band_since is None:
+            self.in_band_since = now
+
+    def _read_signal(self):
+        times, values = self.signal.read()
+        if not len(times):
+            return
+        if self._values is None:
+            self._times, self._values = times, values
+        else:
+            self._times = np.concatenate([self._times, times])
+            self._values = np.concatenate([self._values, values])
+        keep = self._times >= self._times[-1] - self.window
+        self._times, self._values = self._times[keep], self._values[keep]
+
+    # True once the last window of every radiometer channel has a steady level and noise
+    def signal_flat(self):
+        if self.flatness is None or self.signal is None:
+            return True
+        self._read_signal()
+        if self._values is None or self._times[-1] - self._times[0] < 0.9 * self.window:
+            return False
+        middle = self._times[-1] - self.window / 2
+        first = self._times < middle
+        if first.sum() < 3 or (~first).sum() < 3:
+            return False
+        mean1, var1 = _detrended(self._times[first], self._values[first])
+        mean2, var2 = _detrended(self._times[~first], self._values[~first])
+        # a drift or ramp shifts the mean by far more than the noise
+        if np.any(np.abs(mean2 - mean1) > np.sqrt(np.maximum(var1, var2))):
+            return False
+        ratio = np.maximum(var1, var2) / np.maximum(np.minimum(var1, var2), 1e-12)
+        return bool(np.all(ratio <= self.flatness))
+
+    # check at each reading, True the first time the set point counts as settled
+    def check(self, now):
+        if self.settled_at is not None or self.in_band_since is None or now - self.in_band_since < self.window:
+            return False
+        if not self.signal_flat():
+            return False
+        self.settled_at = now
+        return True
+
+    # True once the set point has been held long enough after settling, or max_dwell has passed
+    def done(self, now):
+        if self.settled_at is not None:
+            return now - self.settled_at >= self.hold
+        return now - self.start >= self.max_dwell
+
+    # when done() will next be true if nothing changes
+    def deadline(self):
+        if self.settled_at is not None:
+            return self.settled_at + self.hold
+        return self.start + self.max_dwell
+
+    @property
+    def timed_out(self):
+        return self.settled_at is None